@@ -0,0 +1,431 @@
+#%%
+import time
+import logging
+import threading
+from db_pool import get_connection
+from schema_cache import get_schema_cache
+from typed_fetch import fetch_frame, frame_from_rows
+from db_health import get_breaker, is_unavailable, note_stale
+from registry import database_key, get_or_create
+
+logger = logging.getLogger(__name__)
+
+# database_data rows whose NG_Cause columns contain one of these are left out of the baseline
+BASELINE_KEYWORDS = ('NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI', 'REPAIRED', 'REPAIRED AT')
+
+# Columns the keyword exclusion is applied to
+NG_CAUSE_COLUMNS = tuple(f"Process_{process_num}_NG_Cause" for process_num in range(1, 7))
+
+# Most recent units making up a model's baseline
+BASELINE_LIMIT = 100
+
+# Seconds after which a model's baseline window is reloaded in full, picking
+# up rows edited or deleted since it was loaded
+WINDOW_RELOAD_INTERVAL = 1800.0
+
+# Identifier columns every baseline keeps
+BASELINE_ID_COLUMNS = ('Model_Code', 'DATE', 'PASS_NG')
+
+# database_data columns each material's deviation step reads
+BASELINE_MATERIAL_COLUMNS = {
+    'Frame': lambda column: 'Frame' in column,
+    'Em2p': lambda column: 'Em2p' in column,
+    'Em3p': lambda column: 'Em3p' in column,
+    'Casing_Block': lambda column: 'Casing' in column,
+    'Rod_Blk': lambda column: 'Rod_Blk' in column or 'rod' in column.lower(),
+    'Df_Blk': lambda column: 'Df_Blk' in column,
+}
+
+# Column types holding free text, scanned by the modules' keyword cleaning
+TEXT_TYPES = ('char', 'varchar', 'text', 'tinytext', 'mediumtext', 'longtext', 'enum', 'set')
+
+
+def baseline_columns(table_schema, materials=None):
+    """
+    The database_data columns a baseline needs, in table order.
+
+    Keeps the identifier, S/N and NG_Cause columns, every descriptive text
+    column (so keyword cleaning drops the same rows as on SELECT *) and the
+    columns of the given materials. Measurement columns of other processes
+    are left on the server.
+
+    Args:
+        table_schema: TableSchema of database_data
+        materials: Material names (default: every key of BASELINE_MATERIAL_COLUMNS)
+    """
+    materials = BASELINE_MATERIAL_COLUMNS if materials is None else materials
+    selectors = [BASELINE_MATERIAL_COLUMNS[material] for material in materials]
+    columns = []
+    for column in table_schema.columns:
+        column_type = (table_schema.column_type(column) or '').lower().split('(')[0]
+        if (column in BASELINE_ID_COLUMNS or column in NG_CAUSE_COLUMNS or column.endswith('S_N')
+                or (column_type in TEXT_TYPES and not column.endswith('_Data'))
+                or any(selector(column) for selector in selectors)):
+            columns.append(column)
+    return columns
+
+
+def primary_key(table_schema):
+    """The single integer primary key column of a table, or None"""
+    keys = [row for row in table_schema.rows if row.get('Key') == 'PRI']
+    if len(keys) == 1 and 'int' in (keys[0].get('Type') or '').lower():
+        return keys[0]['Field']
+    return None
+
+
+def _keyword_filter(keywords):
+    return " AND ".join(f"{column} NOT LIKE '%{keyword}%'" for keyword in keywords for column in NG_CAUSE_COLUMNS)
+
+
+def _select_list(columns):
+    return ', '.join(f"`{column}`" for column in columns) if columns else '*'
+
+
+def baseline_query(keywords=BASELINE_KEYWORDS, limit=BASELINE_LIMIT, columns=None, key_column=None):
+    """
+    SELECT of a model's most recent database_data units without the keyword rows.
+
+    Args:
+        columns: Columns to select (default: all)
+        key_column: Primary key breaking DATE ties, so the window is well defined
+    """
+    tie_break = f", `{key_column}` DESC" if key_column else ""
+    return f"""
+        SELECT {_select_list(columns)}
+        FROM database_data
+        WHERE Model_Code = %s AND ({_keyword_filter(keywords)})
+        ORDER BY DATE DESC{tie_break}
+        LIMIT {int(limit)}
+        """
+
+
+def baseline_delta_query(keywords, limit, columns, key_column):
+    """
+    SELECT of the clean units of a model added after a primary key value.
+
+    Fetches at most limit + 1 rows; more than limit new rows means the
+    window cannot be repaired and is reloaded instead.
+    """
+    return f"""
+        SELECT {_select_list(columns)}
+        FROM database_data
+        WHERE Model_Code = %s AND `{key_column}` > %s AND ({_keyword_filter(keywords)})
+        ORDER BY `{key_column}`
+        LIMIT {int(limit) + 1}
+        """
+
+
+class BaselineWindow:
+    """
+    The newest limit clean database_data rows of one model, kept across cycles;
+    only rows above the primary-key high-watermark are fetched again.
+
+    Args:
+        key_column: Integer primary key of database_data
+        limit: Rows in the window
+    """
+
+    def __init__(self, key_column, limit):
+        self.key_column = key_column
+        self.limit = limit
+        self.rows = []
+        self.watermark = None
+        self.newest_date = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def _sort_key(self, row):
+        date = row.get('DATE')
+        return (date is not None, date if date is not None else '', row[self.key_column])
+
+    def _update_marks(self, rows):
+        keys = [row[self.key_column] for row in rows if row.get(self.key_column) is not None]
+        if keys:
+            self.watermark = max(keys + ([self.watermark] if self.watermark is not None else []))
+        dates = [row['DATE'] for row in self.rows if row.get('DATE') is not None]
+        self.newest_date = max(dates) if dates else None
+
+    def replace(self, rows):
+        """Install the result of a full baseline query"""
+        self.rows = list(rows)
+        self.watermark = None
+        self._update_marks(self.rows)
+        self.loaded_at = time.monotonic()
+
+    def merge(self, new_rows):
+        """
+        Add rows newer than the watermark and evict the oldest beyond limit.
+
+        Returns:
+            False if more than limit rows arrived, so the window cannot be repaired
+        """
+        if len(new_rows) > self.limit:
+            return False
+        if new_rows:
+            added = {row[self.key_column] for row in new_rows}
+            rows = list(new_rows) + [row for row in self.rows if row[self.key_column] not in added]
+            self.rows = sorted(rows, key=self._sort_key, reverse=True)[:self.limit]
+            self._update_marks(new_rows)
+        return True
+
+    def stale(self, reload_interval):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > reload_interval
+
+
+# Windows of every model, shared by the providers of all cycles
+_windows = {}
+_windows_lock = threading.Lock()
+
+# Last baseline loaded per (host, database, model, keywords, limit, materials), with
+# the time it was fetched; served while the database is unavailable
+_last_good = {}
+# Baselines with a background refresh scheduled
+_refreshing = set()
+_last_good_lock = threading.Lock()
+
+
+class BaselineProvider:
+    """
+    database_data baselines of one processing cycle: one narrow, typed query per
+    model and keyword set shared by every material module, with a BaselineWindow
+    per model across cycles and the last good baseline served while the database is down.
+
+    Args:
+        config: DB_CONFIG of the database holding database_data
+        connect: Function returning a connection for config (default: the shared pool)
+        schema: SchemaCache of config's database (default: the shared one)
+        materials: Active material names (default: every key of BASELINE_MATERIAL_COLUMNS)
+        windows: Dict holding the BaselineWindows (default: shared by all providers)
+        reload_interval: Seconds after which a window is reloaded in full
+        serve_stale: Fall back to the last loaded baseline when the database is unavailable
+    """
+
+    def __init__(self, config, connect=None, schema=None, materials=None, windows=None,
+                 reload_interval=WINDOW_RELOAD_INTERVAL, serve_stale=True):
+        self.config = config
+        self._connect = connect or get_connection
+        self._schema = schema
+        self.materials = materials
+        self._windows = _windows if windows is None else windows
+        self.reload_interval = reload_interval
+        self.serve_stale = serve_stale
+        self._columns = None
+        self._key_column = None
+        self._table_schema = None
+        self._raw = {}
+        self._views = {}
+        self._lock = threading.RLock()
+
+        self.queries = 0
+        self.hits = 0
+        self.full_loads = 0
+        self.delta_loads = 0
+        self.rows_fetched = 0
+        self.stale_served = 0
+
+    def _load_schema(self):
+        schema = self._schema or get_schema_cache(self.config)
+        table_schema = schema.table('database_data')
+        self._table_schema = table_schema
+        if table_schema is None:
+            self._columns, self._key_column = [], None
+            return
+        self._key_column = primary_key(table_schema)
+        self._columns = baseline_columns(table_schema, self.materials)
+        if self._key_column and self._key_column not in self._columns:
+            self._columns.insert(0, self._key_column)
+        logger.info(f"Baseline selects {len(self._columns)} of {len(table_schema.columns)} database_data columns")
+
+    def columns(self):
+        """Columns the baseline query selects, or None for all"""
+        if self._columns is None:
+            self._load_schema()
+        return self._columns or None
+
+    def key_column(self):
+        """Primary key used as the windows' high-watermark, or None if there is none"""
+        if self._columns is None:
+            self._load_schema()
+        return self._key_column
+
+    def _fetch(self, sql, params):
+        connection = self._connect(self.config)
+        try:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+        self.queries += 1
+        self.rows_fetched += len(rows)
+        return rows
+
+    def _fetch_frame(self, sql, params):
+        """Like _fetch, read column-wise into a typed DataFrame"""
+        connection = self._connect(self.config)
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, params)
+                df = fetch_frame(cursor, self._table_schema)
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+        self.queries += 1
+        self.rows_fetched += len(df)
+        return df
+
+    def _window(self, model_code, keywords, limit):
+        key = (self.config.get('host'), self.config.get('database'), model_code, tuple(keywords), limit,
+               tuple(self.columns() or ()))
+        with _windows_lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = BaselineWindow(self.key_column(), limit)
+                self._windows[key] = window
+            return window
+
+    def _window_rows(self, model_code, keywords, limit):
+        columns, key_column = self.columns(), self.key_column()
+        window = self._window(model_code, keywords, limit)
+        with window.lock:
+            if not window.stale(self.reload_interval):
+                new_rows = self._fetch(baseline_delta_query(keywords, limit, columns, key_column),
+                                       (model_code, window.watermark if window.watermark is not None else 0))
+                self.delta_loads += 1
+                if window.merge(new_rows):
+                    logger.info(f"database_data baseline for {model_code}: {len(new_rows)} new rows")
+                    return list(window.rows)
+                logger.info(f"database_data baseline for {model_code}: {len(new_rows)}+ new rows, reloading")
+            window.replace(self._fetch(baseline_query(keywords, limit, columns, key_column), (model_code,)))
+            self.full_loads += 1
+            logger.info(f"database_data baseline for {model_code}: loaded {len(window.rows)} rows")
+            return list(window.rows)
+
+    def raw(self, model_code, keywords=BASELINE_KEYWORDS, limit=BASELINE_LIMIT):
+        """
+        Uncleaned baseline rows of model_code, queried on first use in the cycle.
+
+        Returns:
+            DataFrame, or None if the model has no rows
+        """
+        key = (model_code, tuple(keywords), limit)
+        with self._lock:
+            if key in self._raw:
+                self.hits += 1
+                return self._raw[key]
+            try:
+                df = self._load(model_code, keywords, limit)
+            except Exception as e:
+                if not self.serve_stale or not is_unavailable(e):
+                    raise
+                df = self._stale(model_code, keywords, limit, e)
+            self._raw[key] = df
+            return df
+
+    def _stale_key(self, model_code, keywords, limit):
+        return (self.config.get('host'), self.config.get('database'), model_code, tuple(keywords), limit,
+                tuple(self.materials or ()))
+
+    def _load(self, model_code, keywords, limit):
+        if self.key_column():
+            # Windows keep rows as dicts to merge them by key; typed once here
+            df = frame_from_rows(self._window_rows(model_code, keywords, limit), self._table_schema)
+        else:
+            df = self._fetch_frame(baseline_query(keywords, limit, self.columns()), (model_code,))
+            self.full_loads += 1
+            logger.info(f"database_data baseline for {model_code}: {len(df)} rows")
+        if df.empty:
+            return None
+        with _last_good_lock:
+            _last_good[self._stale_key(model_code, keywords, limit)] = (df, time.time())
+        return df
+
+    def _stale(self, model_code, keywords, limit, error):
+        """The last baseline loaded for model_code, marked stale; raises error if there is none"""
+        self._revalidate(model_code, keywords, limit)
+        with _last_good_lock:
+            entry = _last_good.get(self._stale_key(model_code, keywords, limit))
+        if entry is None:
+            raise error
+        df, fetched_at = entry
+        df = df.copy()
+        df.attrs['stale'] = True
+        df.attrs['fetched_at'] = fetched_at
+        self.stale_served += 1
+        note_stale(f"database_data baseline for {model_code} ({error})", fetched_at)
+        return df
+
+    def _revalidate(self, model_code, keywords, limit):
+        """Reload the baseline in the background once the database's circuit lets a query through"""
+        key = self._stale_key(model_code, keywords, limit)
+        with _last_good_lock:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+
+        def refresh():
+            try:
+                BaselineProvider(self.config, self._connect, self._schema, self.materials, self._windows,
+                                 self.reload_interval, serve_stale=False).raw(model_code, keywords, limit)
+                logger.info(f"database_data baseline for {model_code} refreshed in the background")
+            except Exception as e:
+                logger.info(f"Background refresh of the database_data baseline for {model_code} failed: {e}")
+            finally:
+                with _last_good_lock:
+                    _refreshing.discard(key)
+
+        timer = threading.Timer(get_breaker(self.config).retry_in(), refresh)
+        timer.daemon = True
+        timer.start()
+
+    def view(self, name, model_code, clean=None, keywords=BASELINE_KEYWORDS, limit=BASELINE_LIMIT):
+        """
+        A material's cleaned copy of the baseline of model_code.
+
+        Args:
+            name: View name, one per material module
+            model_code: Model code of the unit
+            clean: Function applied once to the raw baseline (e.g. clean_database_data)
+            keywords: Keywords excluded by the query
+            limit: Units in the baseline
+
+        Returns:
+            DataFrame, or None if the model has no rows
+        """
+        key = (name, model_code, tuple(keywords), limit)
+        with self._lock:
+            if key not in self._views:
+                df = self.raw(model_code, keywords, limit)
+                if df is not None and clean is not None:
+                    df = clean(df.copy())
+                self._views[key] = df
+            view = self._views[key]
+        return view.copy() if view is not None else None
+
+    def stats(self):
+        return {'baselines': len(self._raw), 'views': len(self._views), 'queries': self.queries,
+                'hits': self.hits, 'full_loads': self.full_loads, 'delta_loads': self.delta_loads,
+                'rows_fetched': self.rows_fetched, 'stale_served': self.stale_served}
+
+
+# Lock serialising the creation of a unit's provider
+_providers_lock = threading.Lock()
+
+
+def get_baseline_provider(config, unit_context):
+    """
+    Return the BaselineProvider of unit_context's cycle for config's database.
+
+    The provider is kept on the UnitContext, so every material module
+    handling the unit shares it and the next cycle starts fresh. It selects
+    the columns of unit_context.materials, the cycle's active materials.
+    """
+    materials = unit_context.materials
+    key = database_key(config) + (tuple(sorted(materials)) if materials is not None else None,)
+    return get_or_create(unit_context.baselines, _providers_lock, key,
+                         lambda: BaselineProvider(config, materials=materials))
@@ -48,7 +48,8 @@ def main():
         # Copy all Python files to temp directory
         python_files = [
             "main.py", "frame.py", "csb_data_output.py", 
-            "rod_blk_output.py", "em_material.py", "df_blk_output.py"
+            "rod_blk_output.py", "em_material.py", "df_blk_output.py",
+            "picompiled_reader.py", "unit_context.py", "keyword_filter.py", "csv_monitor.py", "change_scheduler.py", "unit_stream.py", "picompiled_path.py", "csv_spool.py", "unit_index.py", "ingestion_profile.py", "db_pool.py", "schema_cache.py", "process_routing.py", "date_canonical.py", "unit_traceability.py", "baseline_provider.py", "inspection_lookup.py", "inspection_cache.py", "typed_fetch.py", "query_log.py", "query_fanout.py", "db_health.py", "registry.py"
         ]
         
         for file in python_files:
@@ -70,8 +71,7 @@ def main():
         "pandas",
         "openpyxl", 
         "sqlalchemy",
-        "mysql-connector-python",
-        "watchdog"
+        "mysql-connector-python"
     ]
     
     for package in packages:
@@ -96,11 +96,33 @@ def main():
         "--add-data", "rod_blk_output.py;.",
         "--add-data", "em_material.py;.",
         "--add-data", "df_blk_output.py;.",
+        "--add-data", "picompiled_reader.py;.",
+        "--add-data", "unit_context.py;.",
+        "--add-data", "keyword_filter.py;.",
+        "--add-data", "csv_monitor.py;.",
+        "--add-data", "change_scheduler.py;.",
+        "--add-data", "unit_stream.py;.",
+        "--add-data", "picompiled_path.py;.",
+        "--add-data", "csv_spool.py;.",
+        "--add-data", "unit_index.py;.",
+        "--add-data", "ingestion_profile.py;.",
+        "--add-data", "db_pool.py;.",
+        "--add-data", "schema_cache.py;.",
+        "--add-data", "process_routing.py;.",
+        "--add-data", "date_canonical.py;.",
+        "--add-data", "unit_traceability.py;.",
+        "--add-data", "baseline_provider.py;.",
+        "--add-data", "inspection_lookup.py;.",
+        "--add-data", "inspection_cache.py;.",
+        "--add-data", "typed_fetch.py;.",
+        "--add-data", "query_log.py;.",
+        "--add-data", "query_fanout.py;.",
+        "--add-data", "db_health.py;.",
+        "--add-data", "registry.py;.",
         "--hidden-import", "pandas",
         "--hidden-import", "openpyxl",
         "--hidden-import", "sqlalchemy",
         "--hidden-import", "mysql.connector",
-        "--hidden-import", "watchdog",
         "--exclude-module", "PyQt5",
         "--exclude-module", "PyQt6",
         "--exclude-module", "PySide2",
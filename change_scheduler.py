@@ -0,0 +1,155 @@
+#%%
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds the monitored file must stay quiet before a run starts
+DEBOUNCE_SECONDS = 2.0
+
+# Longest a run is postponed by a continuous stream of triggers
+MAX_DELAY_SECONDS = 10.0
+
+_NO_STATE = object()
+
+
+class SingleFlightScheduler:
+    """
+    Coalesces change triggers into serialized runs of one callable: at most one run
+    in flight and one pending, started after debounce seconds of quiet or max_delay.
+
+    Args:
+        run: Callable taking the state of the latest trigger
+        debounce: Quiet period in seconds before a run starts
+        max_delay: Upper bound in seconds on how long a burst can postpone a run
+        name: Name of the worker thread
+    """
+
+    def __init__(self, run, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS, name="change-scheduler"):
+        self.run = run
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._pending = False
+        self._pending_state = None
+        self._first_trigger_at = None
+        self._last_trigger_at = None
+        self._running = False
+        self._last_run_state = _NO_STATE
+
+        self.triggers = 0
+        self.coalesced = 0
+        self.suppressed = 0
+        self.runs = 0
+        self.failures = 0
+
+    def trigger(self, state=None):
+        """
+        Request a run for state.
+
+        Returns:
+            True if a run was scheduled or an already pending run now uses
+            state, False if the trigger was suppressed
+        """
+        with self._cond:
+            self.triggers += 1
+            if self._stopped:
+                self.suppressed += 1
+                return False
+            if not self._pending and state is not None and state == self._last_run_state:
+                # Same state as the run in flight or just finished: nothing new to process
+                self.suppressed += 1
+                return False
+
+            now = time.monotonic()
+            if self._pending:
+                self.coalesced += 1
+            else:
+                self._pending = True
+                self._first_trigger_at = now
+            self._pending_state = state
+            self._last_trigger_at = now
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._pending:
+                    self._cond.wait()
+                # Debounce: wait for a quiet period, bounded by max_delay
+                while not self._stopped:
+                    due = min(self._last_trigger_at + self.debounce, self._first_trigger_at + self.max_delay)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+
+                state = self._pending_state
+                self._pending = False
+                self._pending_state = None
+                self._running = True
+                self._last_run_state = state
+
+            try:
+                self.run(state)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Scheduled run failed: {e}")
+            finally:
+                with self._cond:
+                    self._running = False
+                    self.runs += 1
+                    self._cond.notify_all()
+
+    def is_busy(self):
+        """True while a run is in flight or pending"""
+        with self._cond:
+            return self._running or self._pending
+
+    def wait_idle(self, timeout=None):
+        """
+        Block until no run is in flight or pending.
+
+        Returns:
+            True if the scheduler became idle before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._running or self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self):
+        """Drop any pending run and stop the worker once the current run finishes"""
+        with self._cond:
+            self._stopped = True
+            self._pending = False
+            self._pending_state = None
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return scheduler counters for status display"""
+        with self._cond:
+            return {
+                'triggers': self.triggers,
+                'coalesced': self.coalesced,
+                'suppressed': self.suppressed,
+                'runs': self.runs,
+                'failures': self.failures,
+                'busy': self._running or self._pending,
+            }
@@ -5,6 +5,18 @@ from sqlalchemy import create_engine
 import mysql.connector
 import re
 import datetime
+from picompiled_reader import get_incremental_reader, UNIT_COLUMNS
+from unit_context import UnitContext, prime_reader_from_tail, UNIT_DTYPES
+from keyword_filter import KeywordFilter
+from picompiled_path import picompiled_path
+from ingestion_profile import IngestionProfile, clean_model_code
+from db_pool import get_connection
+from baseline_provider import BaselineProvider, get_baseline_provider
+from schema_cache import get_schema_cache
+from process_routing import get_process_router, CASING_COLUMN_PATTERNS
+from inspection_lookup import latest_complete_records
+from inspection_cache import get_inspection_cache
+from unit_traceability import get_unit_traceability, DATED, LATEST_DATE
 
 x = datetime.datetime.now()
 
@@ -74,29 +86,39 @@ material_patterns = {
     }
 }
 
+# Keyword row filters for the PICompiled CSV and the database_data baseline
+CSV_ROW_FILTER = KeywordFilter(['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI'])
+# Parse only the unit columns; keyword lines are dropped before parsing
+CSV_PROFILE = IngestionProfile(UNIT_COLUMNS, UNIT_DTYPES, line_filter=CSV_ROW_FILTER)
+DATABASE_ROW_FILTER = KeywordFilter(['NG PRESSURE', 'REPAIRED AT', 'REPAIRED', 'RE PI', 'MASTER PUMP', 'NG AT', 'INSPECTION ONLY'])
+# database_data material columns this module's deviation step reads
+BASELINE_MATERIALS = ('Casing_Block',)
+
 def read_csv_with_pandas(file_path):
 
     try:
-        piCompiled = pd.read_csv(file_path)
-        piCompiled["MODEL CODE"]= piCompiled["MODEL CODE"].astype(str).str.replace('"', '', regex=False)
-        
-        # Filter out rows containing specific keywords
-        keywords_to_remove = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI']
-        print(f"Original CSV rows: {len(piCompiled)}")
-        
-        # Create a mask to filter out rows containing any of the keywords in any column
-        mask = pd.Series([True] * len(piCompiled))
-        for keyword in keywords_to_remove:
-            for col in piCompiled.columns:
-                if piCompiled[col].dtype == 'object':  # Only check string columns
-                    mask = mask & (~piCompiled[col].astype(str).str.contains(keyword, case=False, na=False))
-        
-        piCompiled_filtered = piCompiled[mask]
-        print(f"Filtered CSV rows: {len(piCompiled_filtered)} (removed {len(piCompiled) - len(piCompiled_filtered)} rows)")
+        # Only the rows appended since the previous cycle are parsed
+        reader = get_incremental_reader(file_path, __name__, CSV_PROFILE)
+        if reader.columns is None:
+            # First pass: locate the latest valid unit from the end of the file
+            prime_reader_from_tail(reader, CSV_ROW_FILTER)
+        piCompiled = reader.read_new_rows()
+        if piCompiled is None or reader.columns is None:
+            print(f"CSV not readable yet: {file_path}")
+            return None
+        piCompiled["MODEL CODE"]= clean_model_code(piCompiled["MODEL CODE"])
+        
+        # Rows containing specific keywords were dropped by CSV_PROFILE before parsing
+        keywords_to_remove = CSV_ROW_FILTER.keywords
+        piCompiled_filtered = piCompiled
+        print(f"New filtered CSV rows: {len(piCompiled_filtered)} (total rows kept: {reader.rows_read})")
         print(f"Keywords filtered: {keywords_to_remove}")
         
-        # Take the last row after filtering
-        piCompiled_final = piCompiled_filtered.tail(1)
+        # Remember the last row that survived filtering; if nothing new survived,
+        # the last valid unit from an earlier pass is still the latest one
+        if not piCompiled_filtered.empty:
+            reader.state['last_valid_row'] = piCompiled_filtered.tail(1)
+        piCompiled_final = reader.state.get('last_valid_row', piCompiled_filtered.tail(1))
         print("CSV successfully loaded and filtered!")
         
         # Include S/N column in the return
@@ -108,7 +130,7 @@ def read_csv_with_pandas(file_path):
 def create_db_connection():
     """Create database connection using the DB_CONFIG"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         print("Database connection established successfully!")
         return connection
     except Exception as e:
@@ -116,22 +138,11 @@ def create_db_connection():
         return None
 
 def check_table_structure(table_name):
-    """Check the structure of a table to see available columns"""
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
+    """Check the structure of a table to see available columns (served from the schema cache)"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(f"DESCRIBE {table_name}")
-        columns = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return columns
+        return get_schema_cache(DB_CONFIG).describe(table_name)
     except Exception as e:
         print(f"Error checking table structure for {table_name}: {e}")
-        if connection:
-            connection.close()
         return None
 
 def get_process_data_for_materials(process_sn_list, target_materials, csv_date=None):
@@ -172,10 +183,17 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             for col in columns:
                 print(f"  - {col['Field']} ({col['Type']})")
         
-        # Loop through process1_data to process6_data tables
+        # Only query the process tables that hold these materials' columns
+        routed_process_nums = get_process_router(DB_CONFIG).process_numbers_for(target_materials, CASING_COLUMN_PATTERNS)
+        if not routed_process_nums:
+            # Nothing matched a naming pattern: fall back to column discovery in process3_data
+            routed_process_nums = [3]
+        print(f"Process tables for {target_materials}: {[f'process{n}_data' for n in routed_process_nums]}")
         for process_num in range(1, 7):
+            results[f"process{process_num}_data"] = []
+        
+        for process_num in routed_process_nums:
             table_name = f"process{process_num}_data"
-            results[table_name] = []
             
             print(f"\nProcessing table: {table_name}")
             
@@ -187,40 +205,24 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             
             # Build the query to select the materials and their lot numbers
             material_columns = []
-            material_patterns = [
-                # Try exact match first
-                lambda m: f"Process_{process_num}_{m}",
-                # Try with space instead of underscore
-                lambda m: f"Process {process_num} {m}",
-                # Try with different case
-                lambda m: f"PROCESS_{process_num}_{m.upper()}",
-                # Try with different separators
-                lambda m: f"Process-{process_num}-{m}",
-                # Try with different naming conventions
-                lambda m: f"P{process_num}_{m}",
-                lambda m: f"P{process_num}_{m.replace('_', '')}",
-            ]
+            # Column lookups are served from the schema cache
+            schema = get_schema_cache(DB_CONFIG)
             
             # For each material, try different naming patterns
             for material in target_materials:
                 material_found = False
                 
                 # Try different patterns until we find a match
-                for pattern in material_patterns:
-                    try:
-                        base_col = pattern(material)
-                        lot_col = f"{base_col}_Lot_No"
-                        
-                        # Test if base column exists
-                        test_query = f"SHOW COLUMNS FROM {table_name} LIKE %s"
-                        cursor.execute(test_query, (base_col,))
-                        if cursor.fetchone():
-                            material_columns.extend([base_col, lot_col])
-                            material_found = True
-                            print(f"Found material column: {base_col} in {table_name}")
-                            break
-                    except Exception as e:
-                        print(f"Error checking column pattern {base_col}: {e}")
+                for pattern in CASING_COLUMN_PATTERNS:
+                    base_col = pattern(process_num, material)
+                    lot_col = f"{base_col}_Lot_No"
+                    
+                    # Test if base column exists
+                    if schema.has_column(table_name, base_col):
+                        material_columns.extend([base_col, lot_col])
+                        material_found = True
+                        print(f"Found material column: {base_col} in {table_name}")
+                        break
                 
                 if not material_found:
                     print(f"Warning: Could not find column for material {material} in {table_name}")
@@ -228,19 +230,17 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             # If no material columns found, try to discover them
             if not material_columns and process_num == 3:  # Special handling for process3_data
                 print(f"\nTrying to discover material columns in {table_name}...")
-                cursor.execute(f"SHOW COLUMNS FROM {table_name} LIKE '%Casing%'")
-                casing_cols = cursor.fetchall()
+                casing_cols = schema.find_columns(table_name, '%Casing%')
                 if casing_cols:
-                    print(f"Found potential Casing_Block columns: {[c[0] for c in casing_cols]}")
+                    print(f"Found potential Casing_Block columns: {casing_cols}")
                     for col in casing_cols:
-                        if 'lot' not in col[0].lower():
-                            material_columns.append(col[0])
-                            lot_col = f"{col[0]}_Lot_No"
-                            cursor.execute(f"SHOW COLUMNS FROM {table_name} LIKE %s", (lot_col,))
-                            if cursor.fetchone():
+                        if 'lot' not in col.lower():
+                            material_columns.append(col)
+                            lot_col = f"{col}_Lot_No"
+                            if schema.has_column(table_name, lot_col):
                                 material_columns.append(lot_col)
                             else:
-                                material_columns.append(col[0].replace('_Code', '_Lot_No'))
+                                material_columns.append(col.replace('_Code', '_Lot_No'))
             
             # Add basic columns
             select_columns = [sn_column, f"Process_{process_num}_Model_Code", f"Process_{process_num}_DateTime", f"Process_{process_num}_DATE"]
@@ -249,23 +249,15 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             # Remove duplicates and filter out columns that might not exist
             select_columns = list(set(select_columns))
             
-            # Test which columns actually exist
-            existing_columns = []
+            # Keep the columns that actually exist
+            existing_columns = schema.existing_columns(table_name, select_columns)
             for col in select_columns:
-                try:
-                    # First try with SHOW COLUMNS which is safer
-                    cursor.execute(f"SHOW COLUMNS FROM {table_name} LIKE %s", (col,))
-                    if cursor.fetchone():
-                        existing_columns.append(col)
-                    else:
-                        print(f"Column {col} does not exist in {table_name}")
-                except Exception as e:
-                    print(f"Error checking column {col} in {table_name}: {e}")
+                if col not in existing_columns:
+                    print(f"Column {col} does not exist in {table_name}")
                     
             if not existing_columns and process_num == 3:  # Special case for process3_data
                 print(f"\nNo valid columns found in {table_name}. Trying to find any material columns...")
-                cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-                all_columns = [col[0] for col in cursor.fetchall()]
+                all_columns = schema.columns(table_name)
                 print(f"Available columns in {table_name}: {all_columns}")
                 
                 # Try to find any material-like columns
@@ -288,31 +280,17 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             
             # Build query with date filter if csv_date is provided
             if csv_date:
-                # First, find the most recent date for the given S/N
-                date_find_query = f"""
-                SELECT DISTINCT Process_{process_num}_DATE 
-                FROM {table_name} 
-                WHERE {sn_column} IN ({placeholders})
-                ORDER BY Process_{process_num}_DATE DESC
-                LIMIT 1
-                """
-                cursor.execute(date_find_query, process_sn_list)
-                date_result = cursor.fetchone()
-                
-                if date_result and date_result[f'Process_{process_num}_DATE']:
-                    actual_date = date_result[f'Process_{process_num}_DATE']
-                    print(f"Using date: {actual_date} (most recent date found for S/N {process_sn_list[0]})")
-                else:
-                    actual_date = csv_date
-                    print(f"No dates found for S/N {process_sn_list[0]}, using original date: {csv_date}")
-                
-                # Build the query with the actual date to use
+                # Rows of the most recent date recorded for the given S/N; the
+                # subquery replaces a separate SELECT DISTINCT round trip
+                date_column = f"Process_{process_num}_DATE"
+                print(f"Using the most recent {date_column} recorded for S/N {process_sn_list[0]}")
                 query = f"""
                 SELECT {columns_str}
                 FROM {table_name}
-                WHERE {sn_column} IN ({placeholders}) AND Process_{process_num}_DATE = %s
+                WHERE {sn_column} IN ({placeholders})
+                AND {date_column} = (SELECT MAX({date_column}) FROM {table_name} WHERE {sn_column} IN ({placeholders}))
                 """
-                params = process_sn_list + [actual_date]
+                params = process_sn_list + process_sn_list
                 
                 print(f"\nExecuting query on {table_name}:")
                 print(f"SQL: {query}")
@@ -436,12 +414,13 @@ def get_material_inspection_data(material_results):
     """
     connection = create_db_connection()
     if not connection:
-        return None
+        # Lots seen before are still served from the local inspection cache
+        print("  [WARN] Database unavailable, using cached inspection records")
     
     inspection_results = {}
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor(dictionary=True) if connection else None
         
         # Extract unique material codes and their lot numbers from process results
         material_lots = {}
@@ -499,19 +478,15 @@ def get_material_inspection_data(material_results):
             
             # Check if table exists
             try:
-                cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-                table_exists = cursor.fetchone()
+                # Get table structure to identify date column and exclude ID column
+                columns_info = get_schema_cache(DB_CONFIG).describe(table_name)
                 
-                if not table_exists:
+                if columns_info is None:
                     print(f"  [X] Table {table_name} does not exist")
                     continue
                 
                 print(f"  [OK] Table {table_name} exists")
                 
-                # Get table structure to identify date column and exclude ID column
-                cursor.execute(f"DESCRIBE {table_name}")
-                columns_info = cursor.fetchall()
-                
                 print(f"\n  [DEBUG] DETAILED COLUMN ANALYSIS FOR {table_name}")
                 print(f"  [INFO] Total columns found: {len(columns_info)}")
                 
@@ -606,44 +581,17 @@ def get_material_inspection_data(material_results):
                 print(f"  [INFO] Non-ID columns: {non_id_columns}")
                 print(f"  [DATE] Ordering by column: {date_column}")
                 
-                # Query each lot number
+                # All lots in one query; the newest record without NULLs of each lot
+                # (or its newest record) is picked server-side. Lots already resolved
+                # come from the local inspection cache without a query
+                print(f"\n    [SEARCH] Searching for lot numbers: {list(lot_numbers)}")
+                records = latest_complete_records(cursor, DB_CONFIG, table_name, non_id_columns, date_column, lot_numbers,
+                                                  cache=get_inspection_cache(DB_CONFIG))
+                
                 for lot_number in lot_numbers:
-                    print(f"\n    [SEARCH] Searching for lot number: {lot_number}")
-                    
-                    # Create placeholders for non-ID columns
-                    columns_str = ', '.join(non_id_columns)
-                    
-                    # Query with ORDER BY date DESC and LIMIT 1 to get latest record
-                    # Ensure we're only getting data for the specific lot number
-                    query = f"""
-                    SELECT {columns_str}
-                    FROM {table_name}
-                    WHERE Lot_Number = %s
-                    ORDER BY {date_column} DESC
-                    """
-                    
-                    print(f"    [QUERY] Executing query: {query.strip()} with lot number: {lot_number}")
-                    cursor.execute(query, (lot_number,))
-                    results = cursor.fetchall()
-                    
-                    # Find the first result without NaN values
-                    clean_result = None
-                    if results:
-                        for result in results:
-                            # Check if this result has any NaN values
-                            has_nan = False
-                            for value in result.values():
-                                if value is None or (isinstance(value, float) and str(value).lower() == 'nan'):
-                                    has_nan = True
-                                    break
-                            
-                            if not has_nan:
-                                clean_result = result
-                                break
-                        
-                        # If no clean result found, use the first one (latest by date)
-                        if clean_result is None:
-                            clean_result = results[0]
+                    clean_result = records.get(lot_number)
+                    if clean_result is not None:
+                        if any(value is None for value in clean_result.values()):
                             print(f"    [WARN] No clean result found for lot {lot_number}, using latest record")
                         
                         inspection_results[material_code][lot_number] = clean_result
@@ -660,8 +608,9 @@ def get_material_inspection_data(material_results):
         
         
         
-        cursor.close()
-        connection.close()
+        if connection:
+            cursor.close()
+            connection.close()
         
         return inspection_results
         
@@ -671,99 +620,42 @@ def get_material_inspection_data(material_results):
             connection.close()
         return None
 
-def get_database_data_for_model(model_code, limit=100):
+def get_database_data_for_model(model_code, limit=100, unit_context=None):
     """
     Query database_data table for all columns based on Model Code
     
     Args:
         model_code: The model code to filter by
-        limit: Number of records to retrieve after cleaning (default 300)
+        limit: Number of records to retrieve (default 100)
+        unit_context: Unit of this cycle; its baseline is shared with the other material modules
     
     Returns:
         DataFrame with all database data columns
     """
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        
         print(f"\n=== QUERYING DATABASE_DATA TABLE FOR MODEL {model_code} ===")
+        # One query per model and cycle serves every material module; this module
+        # gets its own cleaned copy
+        provider = get_baseline_provider(DB_CONFIG, unit_context) if unit_context is not None else BaselineProvider(DB_CONFIG, materials=BASELINE_MATERIALS)
+        df_cleaned = provider.view(__name__, model_code, clean_database_data, limit=limit)
         
-        # Use the exact limit requested for consistency with other scripts
-        query_limit = limit
-        
-        # Keywords to filter out before querying
-        keywords_to_filter = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI', 'REPAIRED', 'REPAIRED AT']
-        
-        # Build keyword filtering conditions for NG_Cause columns
-        ng_cause_columns = [
-            'Process_1_NG_Cause', 'Process_2_NG_Cause', 'Process_3_NG_Cause',
-            'Process_4_NG_Cause', 'Process_5_NG_Cause', 'Process_6_NG_Cause'
-        ]
-        
-        # Create WHERE conditions to exclude records with problematic keywords
-        keyword_conditions = []
-        for keyword in keywords_to_filter:
-            for column in ng_cause_columns:
-                keyword_conditions.append(f"{column} NOT LIKE '%{keyword}%'")
-        
-        keyword_filter = " AND ".join(keyword_conditions)
-        
-        # Query for all columns with the specific model code and keyword filtering (keep all PASS_NG values)
-        # Order by DATE DESC to get the most recent records consistently
-        query = f"""
-        SELECT *
-        FROM database_data
-        WHERE Model_Code = %s AND ({keyword_filter})
-        ORDER BY DATE DESC
-        LIMIT %s
-        """
-        
-        print(f"Executing query to retrieve all columns for model {model_code} (limit: {query_limit})")
-        cursor.execute(query, (model_code, query_limit))
-        results = cursor.fetchall()
-        
-        if results:
-            print(f"Retrieved {len(results)} raw records from database_data for model {model_code}")
-            df = pd.DataFrame(results)
-            print(f"Database DataFrame shape before cleaning: {df.shape}")
-            print(f"Total columns retrieved: {len(df.columns)}")
-            
-            cursor.close()
-            connection.close()
-            
-            # Clean the database data before returning
-            print("Cleaning database data...")
-            df_cleaned = clean_database_data(df)
-            print(f"Database DataFrame shape after cleaning: {df_cleaned.shape}")
-            print(f"Columns after cleaning: {len(df_cleaned.columns)}")
-            
-            # If we still don't have enough records after cleaning, provide detailed feedback
-            if len(df_cleaned) < limit:
-                print(f"WARNING: After cleaning, only {len(df_cleaned)} records remain (target was {limit})")
-                print(f"Raw records retrieved: {len(results)}")
-                print(f"Records lost during cleaning: {len(results) - len(df_cleaned)} ({((len(results) - len(df_cleaned))/len(results)*100):.1f}%)")
-                print(f"To get {limit} clean records, you may need to query {int(limit * len(results) / len(df_cleaned))} raw records")
-                print(f"Consider:")
-                print(f"  1. Increasing the limit parameter to {int(limit * len(results) / len(df_cleaned))}")
-                print(f"  2. Reviewing the cleaning criteria in clean_database_data()")
-                print(f"  3. Using the current {len(df_cleaned)} records if acceptable")
-            else:
-                print(f"SUCCESS: Retrieved {len(df_cleaned)} clean records (target was {limit})")
-            
-            return df_cleaned
-        else:
+        if df_cleaned is None:
             print(f"No records found in database_data for model {model_code}")
-            cursor.close()
-            connection.close()
             return None
+        
+        print(f"Database DataFrame shape after cleaning: {df_cleaned.shape}")
+        
+        # If we still don't have enough records after cleaning, provide detailed feedback
+        if len(df_cleaned) < limit:
+            print(f"WARNING: After cleaning, only {len(df_cleaned)} records remain (target was {limit})")
+            print(f"  Consider reviewing the cleaning criteria in clean_database_data()")
+        else:
+            print(f"SUCCESS: Retrieved {len(df_cleaned)} clean records (target was {limit})")
+        
+        return df_cleaned
             
     except Exception as e:
         print(f"Error querying database_data table: {e}")
-        if connection:
-            connection.close()
         return None
 
 def clean_database_data(df):
@@ -780,30 +672,19 @@ def clean_database_data(df):
         return df
     
     # Keywords to filter out
-    keywords = [
-        "NG PRESSURE",
-        "REPAIRED AT",
-        "REPAIRED",
-        "RE PI",
-        "MASTER PUMP",
-        "NG AT",
-        "INSPECTION ONLY"
-    ]
+    keywords = DATABASE_ROW_FILTER.keywords
     
     print(f"Cleaning database data with {len(df)} rows and {len(df.columns)} columns")
     print(f"Filtering out rows and columns containing: {keywords}")
     
     # Filter out rows that contain any of the keywords in any column
-    rows_to_keep = pd.Series([True] * len(df))
-    for keyword in keywords:
-        for col in df.columns:
-            if df[col].dtype == 'object':  # Only check string columns
-                rows_to_keep = rows_to_keep & (~df[col].astype(str).str.contains(keyword, case=False, na=False))
+    rows_to_keep = DATABASE_ROW_FILTER.row_mask(df)
     
     df_filtered = df[rows_to_keep]
     print(f"Filtered rows from {len(df)} to {len(df_filtered)}")
     
     # Filter out columns that contain any of the keywords in their names or values
+    columns_with_keyword_values = set(DATABASE_ROW_FILTER.columns_with_matches(df_filtered))
     columns_to_keep = []
     for col in df_filtered.columns:
         # Check if column name contains any of the keywords
@@ -815,14 +696,9 @@ def clean_database_data(df):
                 break
         
         # If column name is okay, check if any values in the column contain keywords
-        if keep_column:
-            if df_filtered[col].dtype == 'object':  # Only check string columns
-                # Check if any value in the column contains any of the keywords
-                for keyword in keywords:
-                    if df_filtered[col].astype(str).str.contains(keyword, case=False, na=False).any():
-                        keep_column = False
-                        print(f"  Removing column '{col}' because values contain keyword '{keyword}'")
-                        break
+        if keep_column and col in columns_with_keyword_values:
+            keep_column = False
+            print(f"  Removing column '{col}' because values contain one of the keywords")
         
         if keep_column:
             columns_to_keep.append(col)
@@ -1370,19 +1246,34 @@ def perform_deviation_calculations(database_df, inspection_df, process_sn_list=N
 
 def process_material_data():
     """
-    Main function to process material data from CSV and database tables.
-    Processes all materials and their respective inspection tables.
+    Read the latest unit from today's PICompiled file and process it.
+    Kept for callers that do not build a UnitContext themselves.
     """
     print("=== Starting Material Data Processing ===")
     
     # Step 1: Get Process S/N from CSV
     print("\n1. Reading CSV data...")
-    csv_data = read_csv_with_pandas(FILEPATH)
+    # Resolved per call so a long-running process follows the daily file
+    file_path = picompiled_path(directory=NETWORK_DIR)
+    unit_context = UnitContext.from_csv_data(read_csv_with_pandas(file_path), file_path)
     
-    if csv_data is None or csv_data.empty:
+    if unit_context is None:
         print("Failed to read CSV data or no data found")
         return None
     
+    return process_material_data_for_unit(unit_context)
+
+def process_material_data_for_unit(unit_context):
+    """
+    Main function to process material data for one unit from the CSV.
+    Processes all materials and their respective inspection tables.
+    
+    Args:
+        unit_context: UnitContext built once per cycle from the PICompiled CSV
+    """
+    print(f"\n=== Processing {unit_context} ===")
+    csv_data = unit_context.to_frame()
+    
     # Extract Process S/N values and actual S/N values
     process_sn_list = csv_data['PROCESS S/N'].tolist()
     sn_list = csv_data['S/N'].tolist()
@@ -1398,7 +1289,14 @@ def process_material_data():
     # Extract date from CSV data (assuming it's in the first row)
     csv_date = csv_data['DATE'].iloc[0] if not csv_data.empty and 'DATE' in csv_data.columns else None
     print(f"Date from CSV: {csv_date}")
-    results = get_process_data_for_materials(process_sn_list, target_materials, csv_date)
+    # Rows of the most recent date come from the unit's process table fetch
+    # shared by every material module. Without a routed casing column the
+    # column discovery below is still needed.
+    traceability = get_unit_traceability(DB_CONFIG, unit_context)
+    if traceability is not None and traceability.tables_for('Casing_Block'):
+        results = traceability.process_results(target_materials, LATEST_DATE if csv_date else DATED)
+    else:
+        results = get_process_data_for_materials(process_sn_list, target_materials, csv_date)
     
     if results:
         print("\n=== SUMMARY OF RESULTS ===")
@@ -1501,7 +1399,7 @@ def process_material_data():
                 # If we have a model code, query database_data table
                 database_df = None
                 if model_code:
-                    database_df = get_database_data_for_model(model_code, 100)
+                    database_df = get_database_data_for_model(model_code, 100, unit_context)
                 
                 # Perform deviation calculations if we have both database and inspection data
                 deviation_df = None
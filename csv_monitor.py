@@ -0,0 +1,214 @@
+#%%
+import os
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes at the end of the file hashed into the fingerprint. New
+# PICompiled rows are always appended, so the tail is where changes show up.
+TAIL_HASH_BYTES = 64 * 1024
+
+# Polling intervals in seconds. The poller drops to the minimum as soon as the
+# file changes and backs off towards the maximum while the line is idle.
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 10.0
+POLL_BACKOFF = 1.5
+
+# While size and mtime look unchanged, still hash the tail every this many
+# polls in case the file share reports stale metadata
+VERIFY_EVERY = 10
+
+FileFingerprint = namedtuple('FileFingerprint', ['size', 'mtime_ns', 'tail_hash'])
+
+
+def file_fingerprint(file_path, tail_bytes=TAIL_HASH_BYTES):
+    """
+    Cheap change fingerprint of a file: its size, modification time and a hash
+    of its last tail_bytes bytes. Unlike a full-file hash this costs one stat
+    and one small read regardless of how large the file has grown.
+
+    Args:
+        file_path: Path of the file
+        tail_bytes: Number of bytes at the end of the file to hash
+
+    Returns:
+        FileFingerprint(size, mtime_ns, tail_hash)
+
+    Raises:
+        OSError: If the file cannot be opened or read
+    """
+    with open(file_path, 'rb') as handle:
+        stat = os.fstat(handle.fileno())
+        handle.seek(max(0, stat.st_size - tail_bytes))
+        tail = handle.read(tail_bytes)
+    return FileFingerprint(stat.st_size, stat.st_mtime_ns, hashlib.md5(tail).hexdigest())
+
+
+class AdaptivePoller:
+    """
+    Polls a file's fingerprint and calls on_change when it changes, backing off
+    from min_interval to max_interval while the file is idle.
+
+    Args:
+        file_path: Path of the file to watch
+        on_change: Callable taking the new FileFingerprint, called from the poller thread
+        min_interval: Seconds between polls right after a change
+        max_interval: Longest wait between polls while the file is idle
+        backoff: Factor the interval grows by after each unchanged poll
+        verify_every: Hash the tail at least every this many polls
+        tail_bytes: Number of bytes hashed at the end of the file
+        path_resolver: Optional callable taking the watched path and returning
+                       a path to switch to (e.g. the next day's file) or None
+        on_rotate: Callable taking (old_path, new_path), called after a final
+                   check of the old file and before the new file is polled
+    """
+
+    def __init__(self, file_path, on_change, min_interval=MIN_POLL_INTERVAL,
+                 max_interval=MAX_POLL_INTERVAL, backoff=POLL_BACKOFF,
+                 verify_every=VERIFY_EVERY, tail_bytes=TAIL_HASH_BYTES,
+                 path_resolver=None, on_rotate=None):
+        self.file_path = file_path
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.verify_every = verify_every
+        self.tail_bytes = tail_bytes
+        self.path_resolver = path_resolver
+        self.on_rotate = on_rotate
+
+        self.fingerprint = None
+        self.interval = min_interval
+        self.checks = 0
+        self.tail_reads = 0
+        self.changes = 0
+        self.rotations = 0
+        self._polls_since_verify = 0
+        self._missing_logged = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Take the current fingerprint as the baseline and start polling in a daemon thread"""
+        if self.is_running():
+            return
+        try:
+            self.fingerprint = file_fingerprint(self.file_path, self.tail_bytes)
+        except OSError as e:
+            logger.warning(f"Cannot fingerprint {self.file_path} yet: {e}")
+            self.fingerprint = None
+        self.interval = self.min_interval
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="csv-poller", daemon=True)
+        self._thread.start()
+        logger.info(f"Polling {self.file_path} every {self.min_interval}-{self.max_interval}s")
+
+    def stop(self, timeout=5.0):
+        """Stop polling and wait for the poller thread to finish"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check_once()
+            except Exception as e:
+                logger.error(f"Error polling {self.file_path}: {e}")
+
+    def _back_off(self):
+        self.interval = min(self.max_interval, self.interval * self.backoff)
+
+    def _check_rotation(self):
+        """Switch to the path returned by path_resolver, draining the old file first"""
+        new_path = self.path_resolver(self.file_path)
+        if not new_path or new_path == self.file_path:
+            return
+
+        # Last look at the old file so changes written just before the switch are reported
+        self._polls_since_verify = self.verify_every
+        self._check_file()
+
+        old_path = self.file_path
+        logger.info(f"Switching from {os.path.basename(old_path)} to {os.path.basename(new_path)}")
+        if self.on_rotate is not None:
+            try:
+                self.on_rotate(old_path, new_path)
+            except Exception as e:
+                logger.error(f"Rotation handler failed for {new_path}: {e}")
+        self.file_path = new_path
+        self.fingerprint = None
+        self.interval = self.min_interval
+        self.rotations += 1
+
+    def check_once(self):
+        """
+        Poll the file once and call on_change if its fingerprint changed.
+        If a path_resolver is set and returns a new path, switch to it first.
+
+        Returns:
+            True if a change was detected
+        """
+        if self.path_resolver is not None:
+            self._check_rotation()
+        return self._check_file()
+
+    def _check_file(self):
+        self.checks += 1
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            if not self._missing_logged:
+                logger.warning(f"Monitored file not found: {self.file_path}")
+                self._missing_logged = True
+            self.fingerprint = None
+            self.interval = self.max_interval
+            return False
+        self._missing_logged = False
+
+        previous = self.fingerprint
+        self._polls_since_verify += 1
+        stat_unchanged = previous is not None and (stat.st_size, stat.st_mtime_ns) == (previous.size, previous.mtime_ns)
+        if stat_unchanged and self._polls_since_verify < self.verify_every:
+            self._back_off()
+            return False
+
+        try:
+            current = file_fingerprint(self.file_path, self.tail_bytes)
+        except OSError as e:
+            logger.warning(f"Cannot read {self.file_path}: {e}")
+            self._back_off()
+            return False
+        self.tail_reads += 1
+        self._polls_since_verify = 0
+
+        if current == previous:
+            self._back_off()
+            return False
+
+        self.fingerprint = current
+        self.changes += 1
+        self.interval = self.min_interval
+        try:
+            self.on_change(current)
+        except Exception as e:
+            logger.error(f"Change handler failed for {self.file_path}: {e}")
+        return True
+
+    def stats(self):
+        """Return polling counters for status display"""
+        return {
+            'checks': self.checks,
+            'tail_reads': self.tail_reads,
+            'changes': self.changes,
+            'rotations': self.rotations,
+            'interval': round(self.interval, 2),
+        }
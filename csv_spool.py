@@ -0,0 +1,221 @@
+#%%
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Local directory holding the mirrored CSV files
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "material_anomaly_spool")
+
+# Bytes before the local end that are re-read from the share on every sync.
+# If they differ the source was replaced and the copy starts over.
+OVERLAP_BYTES = 4096
+
+# Bytes at the end of both files compared after each sync
+VERIFY_BYTES = 64 * 1024
+
+# Attempts per sync and the delays between them (doubling, capped)
+SYNC_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 8.0
+
+
+def spool_name(source_path):
+    """Local file name for source_path: its file name tagged with a hash of the full path,
+    so files of the same name on different shares never share a copy"""
+    stem, ext = os.path.splitext(os.path.basename(source_path))
+    digest = hashlib.md5(os.path.normcase(os.path.abspath(source_path)).encode('utf-8')).hexdigest()[:12]
+    return f"{stem}.{digest}{ext}"
+
+
+def _tail_hash(handle, end, size):
+    handle.seek(max(0, end - size))
+    return hashlib.md5(handle.read(end - max(0, end - size))).hexdigest()
+
+
+class SpoolMirror:
+    """
+    Local append-only copy of a CSV file on the network share, synced by copying
+    only appended bytes and copied again when the source was replaced.
+
+    Args:
+        source_path: Path of the file on the share
+        spool_dir: Local directory for the copy
+        attempts: Tries per sync() call
+        backoff: Delay in seconds after the first failed try, doubled per failure
+        max_backoff: Upper bound for the delay
+    """
+
+    def __init__(self, source_path, spool_dir=SPOOL_DIR, attempts=SYNC_ATTEMPTS,
+                 backoff=RETRY_BACKOFF, max_backoff=MAX_RETRY_BACKOFF):
+        self.source_path = source_path
+        self.spool_dir = spool_dir
+        self.local_path = os.path.join(spool_dir, spool_name(source_path))
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+
+        self.source_size = None
+        self.local_size = 0
+        self.bytes_copied = 0
+        self.syncs = 0
+        self.recopies = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success = None
+        self._next_attempt_at = 0.0
+
+    def has_copy(self):
+        """True once at least one sync has succeeded"""
+        return self.last_success is not None and os.path.exists(self.local_path)
+
+    def sync(self, max_age=None):
+        """
+        Bring the local copy up to date with the source.
+
+        Args:
+            max_age: Skip the share entirely if the last successful sync is
+                     younger than this many seconds
+
+        Returns:
+            True if the local copy matches the source, False if the share
+            could not be read (the previous copy is left in place)
+        """
+        with self._lock:
+            if max_age is not None and self.last_success is not None and time.time() - self.last_success < max_age:
+                return True
+            if time.monotonic() < self._next_attempt_at:
+                return False
+
+            delay = self.backoff
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    self._sync_once()
+                    self.syncs += 1
+                    self.consecutive_failures = 0
+                    self.last_error = None
+                    self.last_success = time.time()
+                    self._next_attempt_at = 0.0
+                    return True
+                except OSError as e:
+                    self.failures += 1
+                    self.last_error = str(e)
+                    logger.warning(f"Spool sync of {self.source_path} failed (attempt {attempt}/{self.attempts}): {e}")
+                    if attempt < self.attempts:
+                        time.sleep(delay)
+                        delay = min(self.max_backoff, delay * 2)
+
+            self.consecutive_failures += 1
+            cooldown = min(self.max_backoff, self.backoff * 2 ** self.consecutive_failures)
+            self._next_attempt_at = time.monotonic() + cooldown
+            logger.error(f"Serving stale spool copy of {os.path.basename(self.source_path)}, "
+                         f"next attempt in {cooldown:.1f}s")
+            return False
+
+    def _sync_once(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        local_size = os.path.getsize(self.local_path) if os.path.exists(self.local_path) else 0
+
+        with open(self.source_path, 'rb') as source:
+            source_size = os.fstat(source.fileno()).st_size
+            self.source_size = source_size
+
+            start = local_size
+            if local_size > source_size:
+                start = 0
+            elif local_size:
+                # Re-read a little of what we already have to make sure it is the same file
+                overlap_start = max(0, local_size - OVERLAP_BYTES)
+                source.seek(overlap_start)
+                source_overlap = source.read(local_size - overlap_start)
+                with open(self.local_path, 'rb') as local:
+                    local.seek(overlap_start)
+                    if local.read(local_size - overlap_start) != source_overlap:
+                        start = 0
+
+            if start == 0 and local_size:
+                logger.info(f"{os.path.basename(self.source_path)} was replaced on the share, copying it again")
+                self.recopies += 1
+
+            source.seek(start)
+            new_bytes = source.read(source_size - start)
+            with open(self.local_path, 'r+b' if start else 'wb') as local:
+                local.seek(start)
+                local.write(new_bytes)
+                local.truncate()
+            self.bytes_copied += len(new_bytes)
+
+            # Verify: same size, and the tail matches the source
+            with open(self.local_path, 'rb') as local:
+                local_size = os.fstat(local.fileno()).st_size
+                tail_matches = (local_size == source_size and
+                                _tail_hash(local, local_size, VERIFY_BYTES) == _tail_hash(source, source_size, VERIFY_BYTES))
+        if not tail_matches:
+            # Force a full copy on the next attempt
+            os.remove(self.local_path)
+            self.local_size = 0
+            raise OSError(f"spool copy ({local_size} bytes) does not match the source ({source_size} bytes)")
+        self.local_size = local_size
+
+    def lag(self, source_size=None):
+        """
+        Return how far the local copy is behind the share.
+
+        Args:
+            source_size: Latest known size of the source (e.g. from the
+                         poller's fingerprint). Defaults to the size seen at
+                         the last read of the share.
+
+        seconds_since_sync is None before the first successful sync.
+        """
+        if source_size is None:
+            source_size = self.source_size if self.source_size is not None else self.local_size
+        return {
+            'bytes_behind': max(0, source_size - self.local_size),
+            'seconds_since_sync': None if self.last_success is None else time.time() - self.last_success,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+        }
+
+    def discard(self):
+        """Delete the local copy, e.g. once the day's file is no longer monitored"""
+        with self._lock:
+            try:
+                if os.path.exists(self.local_path):
+                    os.remove(self.local_path)
+            except OSError as e:
+                logger.warning(f"Could not remove spool copy {self.local_path}: {e}")
+            self.local_size = 0
+            self.last_success = None
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_spool_mirror(source_path, spool_dir=SPOOL_DIR):
+    """Return the SpoolMirror for source_path, creating it on first use"""
+    key = (os.path.normcase(os.path.abspath(source_path)), spool_dir)
+    with _mirrors_lock:
+        mirror = _mirrors.get(key)
+        if mirror is None:
+            mirror = SpoolMirror(source_path, spool_dir)
+            _mirrors[key] = mirror
+        return mirror
+
+
+def release_spool_mirror(source_path, spool_dir=SPOOL_DIR):
+    """Forget the mirror of source_path and delete its local copy"""
+    key = (os.path.normcase(os.path.abspath(source_path)), spool_dir)
+    with _mirrors_lock:
+        mirror = _mirrors.pop(key, None)
+    if mirror is not None:
+        mirror.discard()
+        return mirror.local_path
+    return None
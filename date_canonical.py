@@ -0,0 +1,287 @@
+#%%
+import re
+import logging
+import datetime
+import threading
+from collections import namedtuple
+from db_pool import get_connection
+from schema_cache import get_schema_cache
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# Stored values sampled to detect a text DATE column's layout
+DATE_SAMPLE_SIZE = 20
+
+# Separators a text DATE column may use between year, month and day
+DATE_SEPARATORS = ('-', '/', '.')
+
+# YYYY?MM?DD with '-', '/' or '.' and an optional time part
+_YMD = re.compile(r'^\s*(\d{4})([-/.])(\d{1,2})\2(\d{1,2})(.*)$')
+
+# How a table stores its DATE column:
+#   kind 'date' or 'datetime' for native columns, 'text' for strings
+#   separator / padded / has_time describe text values
+DateRepresentation = namedtuple('DateRepresentation', ['kind', 'separator', 'padded', 'has_time'])
+
+# Used when a text column has no parseable sample (empty table): YYYY-MM-DD
+DEFAULT_TEXT = DateRepresentation('text', '-', True, False)
+
+
+def parse_date(value):
+    """
+    Return value (CSV string, date, datetime or Timestamp) as a datetime.date,
+    or None if it is not a year-month-day date.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    match = _YMD.match(str(value))
+    if not match:
+        return None
+    try:
+        return datetime.date(int(match.group(1)), int(match.group(3)), int(match.group(4)))
+    except ValueError:
+        return None
+
+
+def detect_text_representation(samples):
+    """
+    Infer separator, zero padding and time part from stored text dates.
+
+    Returns:
+        DateRepresentation, or None if no sample looks like a date
+    """
+    separator = None
+    padded = None
+    has_time = False
+    for sample in samples:
+        if isinstance(sample, (bytes, bytearray)):
+            sample = sample.decode('utf-8', 'replace')
+        match = _YMD.match(str(sample))
+        if not match:
+            continue
+        separator = separator or match.group(2)
+        has_time = has_time or bool(match.group(5).strip())
+        for part in (match.group(3), match.group(4)):
+            if len(part) == 2 and part.startswith('0'):
+                padded = True
+            elif len(part) == 1:
+                padded = False if padded is None else padded
+    if separator is None:
+        return None
+    # Months and days >= 10 look the same either way; assume zero padding
+    return DateRepresentation('text', separator, padded is not False, has_time)
+
+
+def format_date(day, representation):
+    """Render day the way a text column stores it (without the time part)"""
+    if representation.padded:
+        return f"{day.year}{representation.separator}{day.month:02d}{representation.separator}{day.day:02d}"
+    return f"{day.year}{representation.separator}{day.month}{representation.separator}{day.day}"
+
+
+def _prefix(text, representation):
+    """LIKE pattern for a text date followed by a time; '2025/9/1%' would also match 2025/9/10"""
+    return text + ('%' if representation.padded else ' %')
+
+
+def _sort_column(table_schema, column):
+    """Column ordering table newest first: its primary key, a DateTime column, else column itself"""
+    rows = getattr(table_schema, 'rows', None) or []
+    primary = [row['Field'] for row in rows if row.get('Key') == 'PRI']
+    if len(primary) == 1:
+        return primary[0]
+    for row in rows:
+        if row['Field'].lower().endswith('_datetime'):
+            return row['Field']
+    return column
+
+
+class DateFormatCache:
+    """
+    Per-table knowledge of how DATE columns are stored, so a lookup by the CSV
+    DATE needs exactly one correctly formatted query.
+
+    Args:
+        config: DB_CONFIG of the database
+        connect: Function returning a connection for config (default: the shared pool)
+        schema: SchemaCache to read column types from (default: the shared one)
+    """
+
+    def __init__(self, config, connect=None, schema=None):
+        self.config = config
+        self._connect = connect or get_connection
+        self._schema = schema
+        self._representations = {}
+        self._lock = threading.Lock()
+
+        self.detections = 0
+        self.conditions = 0
+        self.retries = 0
+        self.relearned = 0
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._schema = get_schema_cache(self.config)
+        return self._schema
+
+    def _sample(self, table, column, sort_column):
+        connection = self._connect(self.config)
+        try:
+            cursor = connection.cursor()
+            try:
+                # Newest rows: the layout the table is written in now
+                cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL AND {column} <> '' "
+                               f"ORDER BY {sort_column} DESC LIMIT {DATE_SAMPLE_SIZE}")
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    def representation(self, table, column):
+        """Return the DateRepresentation of table.column, detecting it on first use"""
+        table_schema = self.schema.table(table)
+        column_type = table_schema.column_type(column) if table_schema is not None else None
+        key = (table.lower(), column.lower())
+        layout = table_schema.column_hash if table_schema is not None else None
+        with self._lock:
+            cached = self._representations.get(key)
+            if cached is not None and cached[0] == layout:
+                return cached[1]
+
+        column_type = (column_type or '').lower()
+        if column_type == 'date':
+            representation = DateRepresentation('date', None, None, False)
+        elif column_type.startswith(('datetime', 'timestamp')):
+            representation = DateRepresentation('datetime', None, None, True)
+        else:
+            self.detections += 1
+            representation = detect_text_representation(
+                self._sample(table, column, _sort_column(table_schema, column)))
+            if representation is None:
+                logger.warning(f"No parseable dates in {table}.{column}; assuming YYYY-MM-DD")
+                representation = DEFAULT_TEXT
+        logger.info(f"{table}.{column} stores dates as {representation}")
+        with self._lock:
+            self._representations[key] = (layout, representation)
+        return representation
+
+    def condition(self, table, column, value):
+        """
+        SQL condition matching rows of table whose column holds the date value.
+
+        Args:
+            table: Table name
+            column: DATE column name
+            value: CSV DATE (any of the formats parse_date accepts)
+
+        Returns:
+            (sql, params) such as ("Process_1_DATE = %s", ['2025/09/10']).
+            A value that is not a date is compared as given.
+        """
+        self.conditions += 1
+        day = parse_date(value)
+        if day is None:
+            return f"{column} = %s", [value]
+        representation = self.representation(table, column)
+        if representation.kind == 'date':
+            return f"{column} = %s", [day]
+        if representation.kind == 'datetime':
+            start = datetime.datetime.combine(day, datetime.time())
+            return f"{column} >= %s AND {column} < %s", [start, start + datetime.timedelta(days=1)]
+        text = format_date(day, representation)
+        if representation.has_time:
+            # Prefix match keeps an index on the column usable
+            return f"{column} LIKE %s", [_prefix(text, representation)]
+        return f"{column} = %s", [text]
+
+    def any_layout_condition(self, table, column, value):
+        """
+        SQL condition matching the date value in every text layout, to retry a
+        dated lookup that found nothing with the detected one.
+
+        Returns:
+            (sql, params), or None if value is not a date or the column is not text
+        """
+        day = parse_date(value)
+        if day is None or self.representation(table, column).kind != 'text':
+            return None
+        texts, prefixes = [], []
+        for separator in DATE_SEPARATORS:
+            for padded in (True, False):
+                representation = DateRepresentation('text', separator, padded, True)
+                text = format_date(day, representation)
+                if text not in texts:
+                    texts.append(text)
+                    prefixes.append(_prefix(text, representation))
+        sql = f"{column} IN ({', '.join(['%s'] * len(texts))})" + f" OR {column} LIKE %s" * len(prefixes)
+        return f"({sql})", texts + prefixes
+
+    def relearn(self, table, column, values):
+        """
+        Replace the detected layout of table.column with the one of values
+        (stored dates of rows that matched), if they show a different one.
+
+        Returns:
+            The DateRepresentation now in use
+        """
+        current = self.representation(table, column)
+        if current.kind != 'text':
+            return current
+        learned = detect_text_representation(values)
+        if learned is None or learned == current:
+            return current
+        logger.warning(f"{table}.{column} now stores dates as {learned} (was {current})")
+        table_schema = self.schema.table(table)
+        layout = table_schema.column_hash if table_schema is not None else None
+        with self._lock:
+            self._representations[(table.lower(), column.lower())] = (layout, learned)
+        self.relearned += 1
+        return learned
+
+    def retry(self, table, column, value, run):
+        """
+        Repeat a dated lookup that found nothing, matching value in every text layout.
+
+        Args:
+            run: Function (date_sql, date_params) -> rows as dicts holding column
+
+        Returns:
+            The rows found; their layout replaces the detected one
+        """
+        condition = self.any_layout_condition(table, column, value)
+        if condition is None:
+            return []
+        self.retries += 1
+        rows = run(*condition)
+        if rows:
+            self.relearn(table, column, [row.get(column) for row in rows])
+        return rows
+
+    def stats(self):
+        return {'columns': len(self._representations), 'detections': self.detections,
+                'conditions': self.conditions, 'retries': self.retries, 'relearned': self.relearned}
+
+
+_caches = KeyedRegistry(DateFormatCache)
+
+
+def get_date_formats(config):
+    """Return the shared DateFormatCache for config's database"""
+    return _caches.get(config)
+
+
+def date_condition(config, table, column, value):
+    """Shortcut for get_date_formats(config).condition(table, column, value)"""
+    return get_date_formats(config).condition(table, column, value)
+
+
+def retry_date_formats(config, table, column, value, run):
+    """Shortcut for get_date_formats(config).retry(table, column, value, run)"""
+    return get_date_formats(config).retry(table, column, value, run)
@@ -0,0 +1,219 @@
+#%%
+import time
+import socket
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# Consecutive timeouts after which a database's circuit opens
+BREAKER_THRESHOLD = 3
+
+# Seconds an open circuit rejects queries before one probe query is let through
+BREAKER_COOLDOWN = 30.0
+
+# Server-side limit for one SELECT (MAX_EXECUTION_TIME), set on every pooled connection
+QUERY_TIMEOUT = 20.0
+
+# Budget for all database work of one unit
+CYCLE_DEADLINE = 60.0
+
+# MySQL errors meaning the server is slow or unreachable rather than the query being wrong:
+# can't connect, server gone away, lost connection during query, lock wait timeout,
+# MAX_EXECUTION_TIME exceeded
+TIMEOUT_ERRNOS = {2003, 2006, 2013, 1205, 3024}
+
+
+class DatabaseUnavailable(Exception):
+    """The database was not queried or did not answer in time"""
+
+
+class CircuitOpenError(DatabaseUnavailable):
+    """The database's circuit is open; queries are rejected without contacting it"""
+
+
+class DeadlineExceeded(DatabaseUnavailable, TimeoutError):
+    """The unit's database budget is used up"""
+
+
+def is_unavailable(error):
+    """True if error means the database is slow or unreachable (as opposed to a bad query)"""
+    if isinstance(error, (DatabaseUnavailable, socket.timeout, TimeoutError)):
+        return True
+    if type(error).__name__ == 'PoolError':
+        # Every pooled connection is stuck on a slow server
+        return True
+    return getattr(error, 'errno', None) in TIMEOUT_ERRNOS
+
+
+class CircuitBreaker:
+    """
+    Stops sending queries to a database that keeps timing out: threshold timeouts
+    open the circuit for cooldown seconds, then one probe query may close it again.
+
+    Args:
+        name: Database name used in log messages
+        threshold: Consecutive timeouts that open the circuit
+        cooldown: Seconds the circuit stays open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Raise CircuitOpenError unless a query may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_at = None
+            if self.state == self.HALF_OPEN and (self._probe_at is None or now - self._probe_at >= self.cooldown):
+                self._probe_at = now
+                return
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is not answering, retrying in {self._retry_in():.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"{self.name} is answering again, closing its circuit")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_at = None
+
+    def record_failure(self, error):
+        """Count error if the server timed out; any other server error still means it answered"""
+        if isinstance(error, DatabaseUnavailable) or type(error).__name__ == 'PoolError':
+            # Raised here or by a full local pool, not by the server
+            return
+        if not is_unavailable(error):
+            self.record_success()
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"{self.name} timed out {self.failures} time(s) ({error}), "
+                                   f"opening its circuit for {self.cooldown:.0f}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_at = None
+
+    def _retry_in(self):
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def retry_in(self):
+        """Seconds until a probe query will be let through (0 if queries pass now)"""
+        with self._lock:
+            return self._retry_in()
+
+    def is_open(self):
+        with self._lock:
+            return self.state != self.CLOSED
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'retry_in': self._retry_in(),
+            }
+
+
+_breakers = KeyedRegistry(lambda config: CircuitBreaker(f"{config.get('host')}/{config.get('database')}"))
+
+
+def get_breaker(config):
+    """Return the shared CircuitBreaker for config's database, creating it on first use"""
+    return _breakers.get(config)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def deadline_at(deadline):
+    """Limit the calling thread's database work to the monotonic time deadline (None: no limit)"""
+    previous = getattr(_local, 'deadline', None)
+    if previous is not None and deadline is not None:
+        deadline = min(previous, deadline)
+    _local.deadline = deadline if deadline is not None else previous
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def cycle_deadline(seconds=CYCLE_DEADLINE):
+    """Limit the calling thread's database work to seconds from now"""
+    return deadline_at(time.monotonic() + seconds)
+
+
+def current_deadline():
+    """Monotonic deadline of the calling thread, or None"""
+    return getattr(_local, 'deadline', None)
+
+
+def remaining(default=None):
+    """Seconds left before the calling thread's deadline, or default without one"""
+    deadline = current_deadline()
+    return deadline - time.monotonic() if deadline is not None else default
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the calling thread's deadline has passed"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Database budget of this unit used up ({-left:.1f}s over)")
+
+
+_stale_notes = []
+_stale_lock = threading.Lock()
+
+
+def note_stale(source, as_of):
+    """
+    Record that source was served from a cached copy because the database
+    was unavailable; the GUI shows the notes of each cycle.
+
+    Args:
+        source: What was served, e.g. 'database_data baseline for 60CAT0212P'
+        as_of: time.time() the cached copy was fetched
+    """
+    fetched = datetime.datetime.fromtimestamp(as_of).strftime('%Y-%m-%d %H:%M:%S') if as_of else 'unknown'
+    message = f"{source} served from cache (stale, fetched {fetched})"
+    logger.warning(message)
+    with _stale_lock:
+        _stale_notes.append(message)
+
+
+def take_stale_notes():
+    """Return and clear the stale-data notes recorded since the last call"""
+    with _stale_lock:
+        notes = list(_stale_notes)
+        _stale_notes.clear()
+    return notes
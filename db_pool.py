@@ -0,0 +1,421 @@
+#%%
+import time
+import logging
+import threading
+from collections import deque
+import mysql.connector
+from mysql.connector.errors import PoolError
+from query_log import get_query_log
+from db_health import QUERY_TIMEOUT, check_deadline, get_breaker, remaining
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per database
+POOL_SIZE = 4
+
+# Seconds to wait for a free connection before giving up
+CHECKOUT_TIMEOUT = 30.0
+
+# Connections idle longer than this are pinged before they are handed out
+HEALTH_CHECK_IDLE = 5.0
+
+# Seconds to wait when opening a new connection
+CONNECT_TIMEOUT = 10
+
+
+class CountingCursor:
+    """Cursor wrapper counting statements as round trips and recording each in the pool's QueryLog"""
+
+    def __init__(self, pool, cursor):
+        self._pool = pool
+        self._cursor = cursor
+        self._record = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _finish(self):
+        record, self._record = self._record, None
+        if record is not None:
+            self._pool.query_log.finish(record)
+
+    def _run(self, method, operation, params, args, kwargs):
+        self._finish()
+        check_deadline()
+        self._pool._count_round_trip()
+        self._record = self._pool.query_log.begin(operation, params, self._pool.config.get('database'))
+        start = time.perf_counter()
+        try:
+            result = method(operation, params, *args, **kwargs)
+        except Exception as e:
+            self._pool.breaker.record_failure(e)
+            raise
+        finally:
+            self._record.add(time.perf_counter() - start)
+        self._pool.breaker.record_success()
+        return result
+
+    def _fetched(self, start, rows):
+        if self._record is not None:
+            self._record.add(time.perf_counter() - start, rows)
+
+    def _fetch(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self._pool.breaker.record_failure(e)
+            raise
+        return start, result
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._run(self._cursor.execute, operation, params, args, kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._run(self._cursor.executemany, operation, seq_params, args, kwargs)
+
+    def fetchone(self):
+        start, row = self._fetch(self._cursor.fetchone)
+        self._fetched(start, [row] if row is not None else None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start, rows = self._fetch(self._cursor.fetchmany, *args, **kwargs)
+        self._fetched(start, rows)
+        return rows
+
+    def fetchall(self):
+        start, rows = self._fetch(self._cursor.fetchall)
+        self._fetched(start, rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool; close() hands it back to the pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._cursors = []
+        self._owner = threading.get_ident()
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError(f"Connection already returned to the pool (accessing {name})")
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError("Connection already returned to the pool (accessing cursor)")
+        cursor = CountingCursor(self._pool, raw.cursor(*args, **kwargs))
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        """Return the connection to the pool"""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            # Cursors left open still finish their query records
+            for cursor in self.__dict__.get('_cursors', []):
+                cursor._finish()
+            self._cursors = []
+            self._pool._release(raw, self.__dict__.get('_owner'))
+
+    def __del__(self):
+        # A connection dropped without close() still goes back to the pool
+        if self.__dict__.get('_raw') is not None:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool of MySQL connections shared by all material modules, with deadlines and a
+    circuit breaker; a thread already holding a connection gets an overflow one
+    instead of waiting on a full pool.
+
+    Args:
+        config: mysql.connector.connect() keyword arguments
+        size: Maximum number of open connections
+        timeout: Seconds get_connection() waits for a free connection
+        health_check_idle: Idle seconds after which a connection is pinged
+        connect: Function opening a raw connection (default mysql.connector.connect)
+        query_log: QueryLog recording the statements (default: the shared one)
+        breaker: CircuitBreaker of the database (default: the shared one for config)
+        query_timeout: Seconds a SELECT may run on the server; None leaves the server default
+    """
+
+    def __init__(self, config, size=POOL_SIZE, timeout=CHECKOUT_TIMEOUT,
+                 health_check_idle=HEALTH_CHECK_IDLE, connect=None, query_log=None, breaker=None,
+                 query_timeout=QUERY_TIMEOUT):
+        self.config = dict(config)
+        self.config.setdefault('connection_timeout', CONNECT_TIMEOUT)
+        self.config.setdefault('autocommit', True)
+        self.size = size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._connect = connect or mysql.connector.connect
+        self.query_log = query_log or get_query_log()
+        self.breaker = breaker or get_breaker(self.config)
+        self.query_timeout = query_timeout
+        self._idle = deque()  # (raw connection, monotonic time it was returned)
+        self._open = 0
+        # Connections checked out per thread ident
+        self._holders = {}
+        self._condition = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.created = 0
+        self.reconnects = 0
+        self.discarded = 0
+        self.failures = 0
+        self.overflows = 0
+        # Statements executed on pooled connections
+        self.round_trips = 0
+
+    def _new_raw(self):
+        config = self.config
+        left = remaining()
+        if left is not None and left < config['connection_timeout']:
+            config = dict(config, connection_timeout=max(1, int(left)))
+        try:
+            raw = self._connect(**config)
+        except Exception as e:
+            self.breaker.record_failure(e)
+            raise
+        if self.query_timeout:
+            try:
+                cursor = raw.cursor()
+                cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(self.query_timeout * 1000)}")
+                cursor.close()
+            except Exception as e:
+                logger.info(f"Could not limit query time on {self.config.get('host')}: {e}")
+        with self._condition:
+            self.created += 1
+        return raw
+
+    def _count_round_trip(self):
+        with self._condition:
+            self.round_trips += 1
+
+    def _healthy(self, raw):
+        try:
+            raw.ping()
+            return True
+        except Exception as e:
+            logger.info(f"Pooled connection to {self.config.get('host')} dropped ({e}), reconnecting")
+            return False
+
+    def get_connection(self, timeout=None):
+        """
+        Check out a connection, waiting up to timeout seconds for a free one.
+
+        Returns:
+            PooledConnection; call close() to return it
+
+        Raises:
+            PoolError if no connection became free in time; connection
+            errors from mysql.connector if a new connection cannot be opened
+        """
+        self.breaker.allow()
+        check_deadline()
+        timeout = self.timeout if timeout is None else timeout
+        timeout = min(timeout, remaining(timeout))
+        start = time.monotonic()
+        raw = idle_since = None
+        owner = threading.get_ident()
+        with self._condition:
+            while True:
+                if self._idle:
+                    raw, idle_since = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                if self._holders.get(owner):
+                    # Nested checkout: waiting could block on this thread's own connection
+                    self._open += 1
+                    self.overflows += 1
+                    break
+                left = start + timeout - time.monotonic()
+                if left <= 0:
+                    self.failures += 1
+                    raise PoolError(f"No free database connection after {timeout:.1f}s "
+                                    f"({self.size} in use)")
+                self._condition.wait(left)
+
+        try:
+            if raw is None:
+                raw = self._new_raw()
+            elif time.monotonic() - idle_since > self.health_check_idle and not self._healthy(raw):
+                _close_quietly(raw)
+                raw = self._new_raw()
+                with self._condition:
+                    self.reconnects += 1
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self.failures += 1
+                self._condition.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._condition:
+            self._holders[owner] = self._holders.get(owner, 0) + 1
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            if waited > 0.01:
+                self.waits += 1
+        return PooledConnection(self, raw)
+
+    def _release(self, raw, owner=None):
+        # A result set left unread (e.g. fetchone() on a multi-row query) must be
+        # drained before the next query; a connection that cannot be drained is closed
+        reusable = True
+        if getattr(raw, 'unread_result', False):
+            try:
+                raw.consume_results()
+            except Exception:
+                pass
+            reusable = not getattr(raw, 'unread_result', False)
+        with self._condition:
+            held = self._holders.get(owner, 0) - 1
+            if held > 0:
+                self._holders[owner] = held
+            else:
+                self._holders.pop(owner, None)
+            overflow = self._open > self.size
+            if reusable and not overflow:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._open -= 1
+                if not reusable:
+                    self.discarded += 1
+            self._condition.notify()
+        if not reusable or overflow:
+            _close_quietly(raw)
+
+    def warm_up(self, count=None):
+        """
+        Open connections ahead of the first cycle.
+
+        Args:
+            count: Connections to have open (default: size)
+
+        Returns:
+            Number of connections opened
+        """
+        count = self.size if count is None else min(count, self.size)
+        opened = 0
+        while True:
+            with self._condition:
+                if self._open >= count:
+                    break
+                self._open += 1
+            try:
+                raw = self._new_raw()
+            except Exception as e:
+                with self._condition:
+                    self._open -= 1
+                    self.failures += 1
+                logger.warning(f"Could not warm up database pool for {self.config.get('host')}: {e}")
+                break
+            self._release(raw)
+            opened += 1
+        if opened:
+            logger.info(f"Opened {opened} pooled connection(s) to {self.config.get('host')}")
+        return opened
+
+    def close_idle(self):
+        """Disconnect the idle connections; checked-out ones close when returned"""
+        with self._condition:
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw in idle:
+            _close_quietly(raw)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'max_wait': self.max_wait,
+                'created': self.created,
+                'reconnects': self.reconnects,
+                'discarded': self.discarded,
+                'failures': self.failures,
+                'overflows': self.overflows,
+                'round_trips': self.round_trips,
+                'circuit': self.breaker.stats()['state'],
+            }
+
+
+def _pool_key(config):
+    return tuple(sorted((key, str(value)) for key, value in config.items()))
+
+
+_pools = KeyedRegistry(ConnectionPool, key=_pool_key)
+
+
+def get_pool(config, size=POOL_SIZE):
+    """
+    Return the shared ConnectionPool for config, creating it on first use.
+
+    Modules with identical DB_CONFIG dicts share one pool; size only applies
+    when the pool is created.
+    """
+    return _pools.get(config, size)
+
+
+def get_connection(config, timeout=None):
+    """Drop-in replacement for mysql.connector.connect(**config) backed by the shared pool"""
+    return get_pool(config).get_connection(timeout)
+
+
+def round_trips(config):
+    """Statements executed so far on config's pool; diff two readings to count a step's round trips"""
+    return get_pool(config).stats()['round_trips']
+
+
+def pool_stats():
+    """Statistics of every pool, keyed by 'host/database'"""
+    return {f"{pool.config.get('host')}/{pool.config.get('database')}": pool.stats() for pool in _pools.values()}
+
+
+def close_pools():
+    """Disconnect the idle connections of every pool (at shutdown)"""
+    for pool in _pools.values():
+        pool.close_idle()
@@ -5,6 +5,20 @@ from sqlalchemy import create_engine
 import mysql.connector
 import re
 import datetime
+from picompiled_reader import get_incremental_reader, UNIT_COLUMNS
+from unit_context import UnitContext, prime_reader_from_tail, UNIT_DTYPES
+from keyword_filter import KeywordFilter, get_keyword_filter
+from picompiled_path import picompiled_path
+from ingestion_profile import IngestionProfile, clean_model_code
+from db_pool import get_connection
+from baseline_provider import BASELINE_KEYWORDS, BaselineProvider, get_baseline_provider
+from schema_cache import get_schema_cache
+from inspection_cache import get_inspection_cache
+from inspection_lookup import rows_complete
+from typed_fetch import frame_from_rows
+from query_fanout import run_concurrently
+from date_canonical import date_condition
+from unit_traceability import get_unit_traceability, DATED_OR_ANY
 
 x = datetime.datetime.now()
 
@@ -49,26 +63,44 @@ material_patterns = {
     }
 }
 
+# Keyword row filter for the PICompiled CSV (case-sensitive, every spelling listed)
+CSV_ROW_FILTER = KeywordFilter(['test', 'Test', 'TEST', 'dummy', 'Dummy', 'DUMMY'], case=True)
+# Parse only the unit columns; keyword lines are dropped before parsing
+CSV_PROFILE = IngestionProfile(UNIT_COLUMNS, UNIT_DTYPES, line_filter=CSV_ROW_FILTER)
+# database_data material columns this module's deviation step reads
+BASELINE_MATERIALS = ('Df_Blk',)
+
 def read_csv_with_pandas(file_path):
     """
     Read CSV file and extract relevant data from the last row
     Returns: DATE, MODEL CODE, PROCESS S/N, and S/N from the last row
     """
     try:
-        piCompiled = pd.read_csv(file_path)
-        piCompiled["MODEL CODE"] = piCompiled["MODEL CODE"].astype(str).str.replace('"', '', regex=False)
+        # Only the rows appended since the previous cycle are parsed
+        reader = get_incremental_reader(file_path, __name__, CSV_PROFILE)
+        if reader.columns is None:
+            # First pass: locate the latest valid unit from the end of the file
+            last_unit = prime_reader_from_tail(reader, CSV_ROW_FILTER)
+            if last_unit is not None:
+                reader.state['last_valid_row'] = last_unit.iloc[-1]
+        piCompiled = reader.read_new_rows()
+        if piCompiled is None or reader.columns is None:
+            print(f"CSV not readable yet: {file_path}")
+            return None, None, None, None
+        # Rows with unwanted keywords were dropped by CSV_PROFILE
+        piCompiled["MODEL CODE"] = clean_model_code(piCompiled["MODEL CODE"])
         
-        # Filter out rows with unwanted keywords
-        unwanted_keywords = ['test', 'Test', 'TEST', 'dummy', 'Dummy', 'DUMMY']
-        for keyword in unwanted_keywords:
-            piCompiled = piCompiled[~piCompiled.astype(str).apply(lambda x: x.str.contains(keyword, na=False)).any(axis=1)]
+        # Keep the last valid row across passes so a cycle with no new valid rows
+        # still reports the latest unit
+        if not piCompiled.empty:
+            reader.state['last_valid_row'] = piCompiled.iloc[-1]
         
-        if piCompiled.empty:
+        if 'last_valid_row' not in reader.state:
             print("No valid data found in CSV after filtering.")
             return None, None, None, None
         
         # Get the last row
-        last_row = piCompiled.iloc[-1]
+        last_row = reader.state['last_valid_row']
         
         # Extract required fields
         date = last_row.get('DATE', None)
@@ -91,34 +123,23 @@ def get_process2_data(process_sn, date):
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         cursor = connection.cursor(dictionary=True)
         
         # Debug: Print the input parameters
         print(f"DEBUG: Searching process2_data with Process_2_S_N: {process_sn}, Process_2_DATE: {date}")
         
-        # First try with exact date match (YYYY-MM-DD)
-        query = """
-        SELECT Process_2_Df_Blk, Process_2_Df_Blk_Lot_No, Process_2_DATE, Process_2_S_N
-        FROM process2_data 
-        WHERE Process_2_S_N = %s AND Process_2_DATE = %s
-        """
-        
-        cursor.execute(query, (process_sn, date))
-        result = cursor.fetchone()
-        
-        # If no result, try with date in YYYY/MM/DD format
-        if not result and date and '-' in date:
-            alt_date = date.replace('-', '/')
-            print(f"No results with date format YYYY-MM-DD, trying YYYY/MM/DD format: {alt_date}")
-            cursor.execute(query, (process_sn, alt_date))
-            result = cursor.fetchone()
-            
-        # If still no result, try with just the date part (in case of timestamp)
-        if not result and date and ' ' in date:
-            date_part = date.split(' ')[0]
-            print(f"No results with timestamp, trying date part only: {date_part}")
-            cursor.execute(query, (process_sn, date_part))
+        # One query with the date written the way process2_data stores it
+        result = None
+        if date:
+            date_sql, date_params = date_condition(DB_CONFIG, 'process2_data', 'Process_2_DATE', date)
+            query = f"""
+            SELECT Process_2_Df_Blk, Process_2_Df_Blk_Lot_No, Process_2_DATE, Process_2_S_N
+            FROM process2_data 
+            WHERE Process_2_S_N = %s AND {date_sql}
+            LIMIT 1
+            """
+            cursor.execute(query, [process_sn] + date_params)
             result = cursor.fetchone()
             
         # If still no result, try just matching by S/N
@@ -181,7 +202,7 @@ def get_dfb_snap_data(df_blk_value, df_blk_lot_no):
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         cursor = connection.cursor(dictionary=True)
         
         # First, let's see what ITEM_BLOCK_CODE and DATE values are available in dfb_snap_data
@@ -261,7 +282,16 @@ def get_dfb_tensile_data(cleaned_df_rubber):
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        # Rows of a lot do not change once written; lots seen before skip the query
+        cache = get_inspection_cache(DB_CONFIG)
+        table_schema = get_schema_cache(DB_CONFIG).table('dfb_tensile_data')
+        variant = table_schema.column_hash if table_schema is not None else None
+        results = cache.get('dfb_tensile_data', cleaned_df_rubber, variant)
+        if results is not None:
+            print(f"Found {len(results)} cached rows in dfb_tensile_data for DF_LOT_NO: {cleaned_df_rubber}")
+            return frame_from_rows(results, table_schema)
+        
+        connection = get_connection(DB_CONFIG)
         cursor = connection.cursor(dictionary=True)
         
         query = "SELECT * FROM dfb_tensile_data WHERE DF_LOT_NO = %s"
@@ -273,7 +303,10 @@ def get_dfb_tensile_data(cleaned_df_rubber):
             pass
         
         if results:
-            df = pd.DataFrame(results)
+            # Lots with missing values are queried again until they are complete
+            cache.store('dfb_tensile_data', cleaned_df_rubber, results, variant, final=rows_complete(results))
+            cache.save()
+            df = frame_from_rows(results, table_schema)
             print(f"Found {len(df)} rows in dfb_tensile_data for DF_LOT_NO: {cleaned_df_rubber}")
             return df
         else:
@@ -297,7 +330,16 @@ def get_df06600600_inspection_data(cleaned_df_rubber):
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        # Rows of a lot do not change once written; lots seen before skip the query
+        cache = get_inspection_cache(DB_CONFIG)
+        table_schema = get_schema_cache(DB_CONFIG).table('df06600600_inspection')
+        variant = table_schema.column_hash if table_schema is not None else None
+        results = cache.get('df06600600_inspection', cleaned_df_rubber, variant)
+        if results is not None:
+            print(f"Found {len(results)} cached rows in df06600600_inspection for Lot_Number: {cleaned_df_rubber}")
+            return frame_from_rows(results, table_schema)
+        
+        connection = get_connection(DB_CONFIG)
         cursor = connection.cursor(dictionary=True)
         
         query = "SELECT * FROM df06600600_inspection WHERE Lot_Number = %s"
@@ -309,7 +351,10 @@ def get_df06600600_inspection_data(cleaned_df_rubber):
             pass
         
         if results:
-            df = pd.DataFrame(results)
+            # Lots with missing values are queried again until they are complete
+            cache.store('df06600600_inspection', cleaned_df_rubber, results, variant, final=rows_complete(results))
+            cache.save()
+            df = frame_from_rows(results, table_schema)
             print(f"Found {len(df)} rows in df06600600_inspection for Lot_Number: {cleaned_df_rubber}")
             return df
         else:
@@ -360,60 +405,28 @@ def combine_inspection_data(dfb_tensile_df, df06600600_inspection_df):
         print(f"Error combining inspection data: {e}")
         return pd.DataFrame()
 
-def get_database_data_for_df_blk(model_code):
+def get_database_data_for_df_blk(model_code, unit_context=None):
     """
     Query database_data table for Df_Blk related columns and calculate averages.
     Applies keyword filtering before PASS_NG filter to ensure clean data.
     
     Args:
         model_code: The model code to filter by (e.g., '60CAT0212P')
+        unit_context: Unit of this cycle; its baseline is shared with the other material modules
     """
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor(dictionary=True)
-        
         # Keywords to filter out before applying PASS_NG filter
-        keywords_to_filter = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI', 'REPAIRED', 'REPAIRED AT']
-        
-        # Build keyword filtering conditions for NG_Cause columns
-        ng_cause_columns = [
-            'Process_1_NG_Cause', 'Process_2_NG_Cause', 'Process_3_NG_Cause',
-            'Process_4_NG_Cause', 'Process_5_NG_Cause', 'Process_6_NG_Cause'
-        ]
-        
-        # Create WHERE conditions to exclude records with problematic keywords
-        keyword_conditions = []
-        for keyword in keywords_to_filter:
-            for column in ng_cause_columns:
-                keyword_conditions.append(f"{column} NOT LIKE '%{keyword}%'")
-        
-        keyword_filter = " AND ".join(keyword_conditions)
-        
-        # Query with keyword filtering and MODEL_CODE filter, then order by DATE DESC
-        query = f"""
-        SELECT *
-        FROM database_data
-        WHERE ({keyword_filter})
-        AND Model_Code = %s
-        ORDER BY DATE DESC
-        LIMIT 100
-        """
+        keywords_to_filter = list(BASELINE_KEYWORDS)
         
         print(f"Executing query with keyword filtering for: {keywords_to_filter}")
         print(f"Filtering by MODEL_CODE: {model_code}")
-        cursor.execute(query, (model_code,))
-        results = cursor.fetchall()
+        # One query per model and cycle serves every material module; the
+        # DataFrame-level filtering below runs once on this module's copy
+        provider = get_baseline_provider(DB_CONFIG, unit_context) if unit_context is not None else BaselineProvider(DB_CONFIG, materials=BASELINE_MATERIALS)
+        df_cleaned = provider.view(__name__, model_code, lambda df: clean_database_data_df(df, keywords_to_filter))
         
-        cursor.close()
-        connection.close()
-        
-        if results:
-            df = pd.DataFrame(results)
-            print(f"Retrieved {len(df)} clean rows from database_data table after keyword filtering.")
-            
-            # Additional DataFrame-level filtering for any remaining problematic data
-            print("Applying additional DataFrame-level keyword filtering...")
-            df_cleaned = clean_database_data_df(df, keywords_to_filter)
+        if df_cleaned is not None:
+            print(f"Retrieved {len(df_cleaned)} clean rows from database_data table after keyword filtering.")
             
             # Filter for Df_Blk related columns
             df_blk_columns = [col for col in df_cleaned.columns if 'Df_Blk' in col or 'df_blk' in col.lower()]
@@ -432,6 +445,10 @@ def get_database_data_for_df_blk(model_code):
         print(f"Error querying database_data: {e}")
         return pd.DataFrame()
 
+def is_ng_cause_column(col):
+    """Only NG_Cause columns are scanned when cleaning database_data for Df_Blk"""
+    return 'NG_Cause' in col
+
 def clean_database_data_df(df, keywords_to_filter):
     """
     Clean DataFrame by filtering out rows and columns containing specified keywords.
@@ -454,18 +471,14 @@ def clean_database_data_df(df, keywords_to_filter):
     critical_columns = ['PASS_NG', 'DATE', 'Model_Code', 'Process_SN', 'SN']
     
     # Filter out rows that contain any of the keywords in NG_Cause columns only
-    ng_cause_columns = [col for col in df.columns if 'NG_Cause' in col]
-    rows_to_keep = pd.Series([True] * len(df))
-    
-    for keyword in keywords_to_filter:
-        for col in ng_cause_columns:  # Only check NG_Cause columns for row filtering
-            if col in df.columns and df[col].dtype == 'object':
-                rows_to_keep = rows_to_keep & (~df[col].astype(str).str.contains(keyword, case=False, na=False))
+    ng_cause_filter = get_keyword_filter(keywords_to_filter, columns=is_ng_cause_column)
+    rows_to_keep = ng_cause_filter.row_mask(df)
     
     df_filtered = df[rows_to_keep]
     print(f"Filtered rows from {len(df)} to {len(df_filtered)}")
     
     # Filter out columns that contain keywords, but preserve critical columns
+    columns_with_keyword_values = set(ng_cause_filter.columns_with_matches(df_filtered))
     columns_to_keep = []
     for col in df_filtered.columns:
         # Always keep critical columns
@@ -484,14 +497,9 @@ def clean_database_data_df(df, keywords_to_filter):
         
         # If column name is okay, check if any values in the column contain keywords
         # But only for NG_Cause columns to avoid over-filtering
-        if keep_column and 'NG_Cause' in col:
-            if df_filtered[col].dtype == 'object':  # Only check string columns
-                # Check if any value in the column contains any of the keywords
-                for keyword in keywords_to_filter:
-                    if df_filtered[col].astype(str).str.contains(keyword, case=False, na=False).any():
-                        keep_column = False
-                        print(f"  Removing column '{col}' because values contain keyword '{keyword}'")
-                        break
+        if keep_column and col in columns_with_keyword_values:
+            keep_column = False
+            print(f"  Removing column '{col}' because values contain one of the keywords")
         
         if keep_column:
             columns_to_keep.append(col)
@@ -746,14 +754,30 @@ def create_excel_output(database_df, combined_df, deviation_df, process_sn, sn):
 def process_material_data():
     """
     GUI-compatible function to process Df_Blk material data
+    Reads the latest unit from today's PICompiled file; kept for callers that do not build a UnitContext themselves.
+    Returns: dict with 'deviation_data' key containing the deviation DataFrame
+    """
+    print("Starting Df_Blk material processing workflow...")
+    
+    # Step 1: Read CSV data
+    print("\n1. Reading CSV data...")
+    # Resolved per call so a long-running process follows the daily file
+    file_path = picompiled_path(directory=NETWORK_DIR)
+    date, model_code, process_sn, sn = read_csv_with_pandas(file_path)
+    return process_material_data_for_unit(UnitContext(date, model_code, process_sn, sn, file_path))
+
+def process_material_data_for_unit(unit_context):
+    """
+    Process Df_Blk material data for one unit from the CSV
+    
+    Args:
+        unit_context: UnitContext built once per cycle from the PICompiled CSV
+    
     Returns: dict with 'deviation_data' key containing the deviation DataFrame
     """
     try:
-        print("Starting Df_Blk material processing workflow...")
-        
-        # Step 1: Read CSV data
-        print("\n1. Reading CSV data...")
-        date, model_code, process_sn, sn = read_csv_with_pandas(FILEPATH)
+        print(f"\n=== Processing {unit_context} ===")
+        date, model_code, process_sn, sn = unit_context.date, unit_context.model_code, unit_context.process_sn, unit_context.sn
         
         if not all([date, model_code, process_sn]):
             print(f"DEBUG: Missing CSV data - DATE: {date}, MODEL CODE: {model_code}, PROCESS S/N: {process_sn}")
@@ -771,30 +795,13 @@ def process_material_data():
         print("\n2. Querying process2_data table...")
         print(f"Searching for Process_2_S_N: {process_sn} with DATE: {date}")
         
-        # Try different date formats if needed
-        date_formats = [
-            date,  # Original format
-            date.replace('-', '/') if date and '-' in date else date,  # YYYY/MM/DD
-            date.split(' ')[0] if date and ' ' in date else date,  # Just date part if timestamp
-        ]
-        
-        df_blk_value = None
-        df_blk_lot_no = None
-        
-        for date_fmt in date_formats:
-            if not date_fmt:
-                continue
-                
-            print(f"Trying date format: {date_fmt}")
-            df_blk_value, df_blk_lot_no = get_process2_data(process_sn, date_fmt)
-            
-            if df_blk_value is not None and df_blk_lot_no is not None:
-                print(f"Successfully found data with date format: {date_fmt}")
-                break
-                
-        if df_blk_value is None or df_blk_lot_no is None:
-            print("WARNING: Could not find matching data with any date format. Trying without date filter...")
-            df_blk_value, df_blk_lot_no = get_process2_data(process_sn, None)
+        # The unit's process table fetch is shared by every material module; the
+        # date is matched in the table's stored format, falling back to the S/N alone
+        traceability = get_unit_traceability(DB_CONFIG, unit_context)
+        if traceability is not None:
+            df_blk_value, df_blk_lot_no = traceability.material_entry('Df_Blk', process_sn, DATED_OR_ANY)
+        else:
+            df_blk_value, df_blk_lot_no = get_process2_data(process_sn, date)
         
         if not df_blk_value and not df_blk_lot_no:
             print(f"DEBUG: No Df_Blk data found in process2_data for PROCESS S/N: {process_sn}, DATE: {date}")
@@ -819,26 +826,28 @@ def process_material_data():
         cleaned_df_rubber = clean_df_rubber_value(df_rubber)
         print(f"DEBUG: Cleaned DF_RUBBER: {cleaned_df_rubber}")
         
-        # Step 5: Query dfb_tensile_data table
+        # Steps 5, 6 and 8 only need the cleaned DF_RUBBER lot or the model code,
+        # so they run side by side, each on its own pooled connection
         print("\n5. Querying dfb_tensile_data table...")
-        dfb_tensile_df = get_dfb_tensile_data(cleaned_df_rubber)
-        print(f"DEBUG: dfb_tensile_data rows: {len(dfb_tensile_df)}")
-        
-        # Step 6: Query df06600600_inspection table
         print("\n6. Querying df06600600_inspection table...")
-        df06600600_inspection_df = get_df06600600_inspection_data(cleaned_df_rubber)
+        print("\n8. Querying database_data table...")
+        lookups = run_concurrently({
+            'dfb_tensile_data': lambda: get_dfb_tensile_data(cleaned_df_rubber),
+            'df06600600_inspection': lambda: get_df06600600_inspection_data(cleaned_df_rubber),
+            'database_data': lambda: get_database_data_for_df_blk(model_code, unit_context),
+        })
+        dfb_tensile_df = lookups['dfb_tensile_data']
+        df06600600_inspection_df = lookups['df06600600_inspection']
+        database_df = lookups['database_data']
+        print(f"DEBUG: dfb_tensile_data rows: {len(dfb_tensile_df)}")
         print(f"DEBUG: df06600600_inspection rows: {len(df06600600_inspection_df)}")
+        print(f"DEBUG: Database data rows: {len(database_df)}")
         
         # Step 7: Combine inspection data
         print("\n7. Combining inspection data...")
         combined_df = combine_inspection_data(dfb_tensile_df, df06600600_inspection_df)
         print(f"DEBUG: Combined inspection data rows: {len(combined_df)}")
         
-        # Step 8: Query database_data table
-        print("\n8. Querying database_data table...")
-        database_df = get_database_data_for_df_blk(model_code)
-        print(f"DEBUG: Database data rows: {len(database_df)}")
-        
         # Step 9: Calculate deviations
         print("\n9. Calculating deviations...")
         deviation_df = calculate_df_blk_deviations(database_df, combined_df, [process_sn], [sn])
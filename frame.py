@@ -5,6 +5,19 @@ from sqlalchemy import create_engine
 import mysql.connector
 import re
 import datetime
+from picompiled_reader import get_incremental_reader, UNIT_COLUMNS
+from unit_context import UnitContext, prime_reader_from_tail, UNIT_DTYPES
+from keyword_filter import KeywordFilter
+from picompiled_path import picompiled_path
+from ingestion_profile import IngestionProfile, clean_model_code
+from db_pool import get_connection
+from baseline_provider import BaselineProvider, get_baseline_provider
+from schema_cache import get_schema_cache
+from process_routing import get_process_router
+from date_canonical import date_condition
+from inspection_lookup import latest_complete_records
+from inspection_cache import get_inspection_cache
+from unit_traceability import get_unit_traceability, DATED_OR_ANY
 
 x = datetime.datetime.now()
 
@@ -74,29 +87,39 @@ material_patterns = {
     }
 }
 
+# Keyword row filters for the PICompiled CSV and the database_data baseline
+CSV_ROW_FILTER = KeywordFilter(['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI'])
+# Parse only the unit columns; keyword lines are dropped before parsing
+CSV_PROFILE = IngestionProfile(UNIT_COLUMNS, UNIT_DTYPES, line_filter=CSV_ROW_FILTER)
+DATABASE_ROW_FILTER = KeywordFilter(['NG PRESSURE', 'REPAIRED AT', 'RE PI', 'MASTER PUMP', 'NG AT', 'INSPECTION ONLY'])
+# database_data material columns this module's deviation step reads
+BASELINE_MATERIALS = ('Frame',)
+
 def read_csv_with_pandas(file_path):
 
     try:
-        piCompiled = pd.read_csv(file_path)
-        piCompiled["MODEL CODE"]= piCompiled["MODEL CODE"].astype(str).str.replace('"', '', regex=False)
-        
-        # Filter out rows containing specific keywords
-        keywords_to_remove = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI']
-        print(f"Original CSV rows: {len(piCompiled)}")
-        
-        # Create a mask to filter out rows containing any of the keywords in any column
-        mask = pd.Series([True] * len(piCompiled))
-        for keyword in keywords_to_remove:
-            for col in piCompiled.columns:
-                if piCompiled[col].dtype == 'object':  # Only check string columns
-                    mask = mask & (~piCompiled[col].astype(str).str.contains(keyword, case=False, na=False))
-        
-        piCompiled_filtered = piCompiled[mask]
-        print(f"Filtered CSV rows: {len(piCompiled_filtered)} (removed {len(piCompiled) - len(piCompiled_filtered)} rows)")
+        # Only the rows appended since the previous cycle are parsed
+        reader = get_incremental_reader(file_path, __name__, CSV_PROFILE)
+        if reader.columns is None:
+            # First pass: locate the latest valid unit from the end of the file
+            prime_reader_from_tail(reader, CSV_ROW_FILTER)
+        piCompiled = reader.read_new_rows()
+        if piCompiled is None or reader.columns is None:
+            print(f"CSV not readable yet: {file_path}")
+            return None
+        piCompiled["MODEL CODE"]= clean_model_code(piCompiled["MODEL CODE"])
+        
+        # Rows containing specific keywords were dropped by CSV_PROFILE before parsing
+        keywords_to_remove = CSV_ROW_FILTER.keywords
+        piCompiled_filtered = piCompiled
+        print(f"New filtered CSV rows: {len(piCompiled_filtered)} (total rows kept: {reader.rows_read})")
         print(f"Keywords filtered: {keywords_to_remove}")
         
-        # Take the last row after filtering
-        piCompiled_final = piCompiled_filtered.tail(1)
+        # Remember the last row that survived filtering; if nothing new survived,
+        # the last valid unit from an earlier pass is still the latest one
+        if not piCompiled_filtered.empty:
+            reader.state['last_valid_row'] = piCompiled_filtered.tail(1)
+        piCompiled_final = reader.state.get('last_valid_row', piCompiled_filtered.tail(1))
         print("CSV successfully loaded and filtered!")
         
         # Include S/N column in the return
@@ -108,7 +131,7 @@ def read_csv_with_pandas(file_path):
 def create_db_connection():
     """Create database connection using the DB_CONFIG"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         print("Database connection established successfully!")
         return connection
     except Exception as e:
@@ -116,22 +139,11 @@ def create_db_connection():
         return None
 
 def check_table_structure(table_name):
-    """Check the structure of a table to see available columns"""
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
+    """Check the structure of a table to see available columns (served from the schema cache)"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(f"DESCRIBE {table_name}")
-        columns = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return columns
+        return get_schema_cache(DB_CONFIG).describe(table_name)
     except Exception as e:
         print(f"Error checking table structure for {table_name}: {e}")
-        if connection:
-            connection.close()
         return None
 
 def get_process_data_for_materials(process_sn_list, target_materials, csv_date=None):
@@ -164,10 +176,14 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             for col in columns:
                 print(f"  - {col['Field']} ({col['Type']})")
         
-        # Loop through process1_data to process6_data tables
+        # Only query the process tables that hold these materials' columns
+        routed_process_nums = get_process_router(DB_CONFIG).process_numbers_for(target_materials)
+        print(f"Process tables for {target_materials}: {[f'process{n}_data' for n in routed_process_nums]}")
         for process_num in range(1, 7):
+            results[f"process{process_num}_data"] = []
+        
+        for process_num in routed_process_nums:
             table_name = f"process{process_num}_data"
-            results[table_name] = []
             
             print(f"\nProcessing table: {table_name}")
             
@@ -193,17 +209,11 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             # Remove duplicates and filter out columns that might not exist
             select_columns = list(set(select_columns))
             
-            # Test which columns actually exist
-            existing_columns = []
+            # Keep the columns that actually exist
+            existing_columns = get_schema_cache(DB_CONFIG).existing_columns(table_name, select_columns)
             for col in select_columns:
-                try:
-                    test_query = f"SELECT {col} FROM {table_name} LIMIT 1"
-                    cursor.execute(test_query)
-                    cursor.fetchall()
-                    existing_columns.append(col)
-                except:
+                if col not in existing_columns:
                     print(f"Column {col} does not exist in {table_name}")
-                    continue
             
             if not existing_columns:
                 print(f"No valid columns found in {table_name}")
@@ -212,33 +222,21 @@ def get_process_data_for_materials(process_sn_list, target_materials, csv_date=N
             # Build the final query with existing columns
             columns_str = ', '.join(existing_columns)
             
-            # Try different date formats if csv_date is provided
-            date_formats = []
-            if csv_date:
-                # Add original format
-                date_formats.append(csv_date)
-                # Add YYYY/MM/DD format if different
-                if '-' in csv_date:
-                    date_formats.append(csv_date.replace('-', '/'))
-                # Add just date part if it's a timestamp
-                if ' ' in csv_date:
-                    date_formats.append(csv_date.split(' ')[0])
-            
-            # Try each date format until we get results
+            # One query with the date written the way this table stores it
             rows = []
-            for date_fmt in date_formats:
+            if csv_date:
+                date_sql, date_params = date_condition(DB_CONFIG, table_name, f"Process_{process_num}_DATE", csv_date)
                 query = f"""
                 SELECT {columns_str}
                 FROM {table_name}
-                WHERE {sn_column} IN ({placeholders}) AND Process_{process_num}_DATE = %s
+                WHERE {sn_column} IN ({placeholders}) AND {date_sql}
                 """
-                params = process_sn_list + [date_fmt]
-                print(f"Trying query with date format: {date_fmt}")
+                params = process_sn_list + date_params
+                print(f"Querying with date: {date_params}")
                 cursor.execute(query, params)
                 rows = cursor.fetchall()
                 if rows:
-                    print(f"Found {len(rows)} rows with date format: {date_fmt}")
-                    break
+                    print(f"Found {len(rows)} rows for date: {date_params}")
             
             # If no rows found with date filter, try without date
             if not rows:
@@ -356,12 +354,13 @@ def get_material_inspection_data(material_results):
     """
     connection = create_db_connection()
     if not connection:
-        return None
+        # Lots seen before are still served from the local inspection cache
+        print("  [WARN] Database unavailable, using cached inspection records")
     
     inspection_results = {}
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor(dictionary=True) if connection else None
         
         # Extract unique material codes and their lot numbers from process results
         material_lots = {}
@@ -419,19 +418,15 @@ def get_material_inspection_data(material_results):
             
             # Check if table exists
             try:
-                cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-                table_exists = cursor.fetchone()
+                # Get table structure to identify date column and exclude ID column
+                columns_info = get_schema_cache(DB_CONFIG).describe(table_name)
                 
-                if not table_exists:
+                if columns_info is None:
                     print(f"  [X] Table {table_name} does not exist")
                     continue
                 
                 print(f"  [OK] Table {table_name} exists")
                 
-                # Get table structure to identify date column and exclude ID column
-                cursor.execute(f"DESCRIBE {table_name}")
-                columns_info = cursor.fetchall()
-                
                 print(f"\n  [DEBUG] DETAILED COLUMN ANALYSIS FOR {table_name}")
                 print(f"  [INFO] Total columns found: {len(columns_info)}")
                 
@@ -526,44 +521,17 @@ def get_material_inspection_data(material_results):
                 print(f"  [INFO] Non-ID columns: {non_id_columns}")
                 print(f"  [DATE] Ordering by column: {date_column}")
                 
-                # Query each lot number
+                # All lots in one query; the newest record without NULLs of each lot
+                # (or its newest record) is picked server-side. Lots already resolved
+                # come from the local inspection cache without a query
+                print(f"\n    [SEARCH] Searching for lot numbers: {list(lot_numbers)}")
+                records = latest_complete_records(cursor, DB_CONFIG, table_name, non_id_columns, date_column, lot_numbers,
+                                                  cache=get_inspection_cache(DB_CONFIG))
+                
                 for lot_number in lot_numbers:
-                    print(f"\n    [SEARCH] Searching for lot number: {lot_number}")
-                    
-                    # Create placeholders for non-ID columns
-                    columns_str = ', '.join(non_id_columns)
-                    
-                    # Query with ORDER BY date DESC and LIMIT 1 to get latest record
-                    # Ensure we're only getting data for the specific lot number
-                    query = f"""
-                    SELECT {columns_str}
-                    FROM {table_name}
-                    WHERE Lot_Number = %s
-                    ORDER BY {date_column} DESC
-                    """
-                    
-                    print(f"    [QUERY] Executing query: {query.strip()} with lot number: {lot_number}")
-                    cursor.execute(query, (lot_number,))
-                    results = cursor.fetchall()
-                    
-                    # Find the first result without NaN values
-                    clean_result = None
-                    if results:
-                        for result in results:
-                            # Check if this result has any NaN values
-                            has_nan = False
-                            for value in result.values():
-                                if value is None or (isinstance(value, float) and str(value).lower() == 'nan'):
-                                    has_nan = True
-                                    break
-                            
-                            if not has_nan:
-                                clean_result = result
-                                break
-                        
-                        # If no clean result found, use the first one (latest by date)
-                        if clean_result is None:
-                            clean_result = results[0]
+                    clean_result = records.get(lot_number)
+                    if clean_result is not None:
+                        if any(value is None for value in clean_result.values()):
                             print(f"    [WARN] No clean result found for lot {lot_number}, using latest record")
                         
                         inspection_results[material_code][lot_number] = clean_result
@@ -580,8 +548,9 @@ def get_material_inspection_data(material_results):
         
         
         
-        cursor.close()
-        connection.close()
+        if connection:
+            cursor.close()
+            connection.close()
         
         return inspection_results
         
@@ -590,93 +559,36 @@ def get_material_inspection_data(material_results):
         if connection:
             connection.close()
         return None
-def get_database_data_for_model(model_code, limit=100):
+def get_database_data_for_model(model_code, limit=100, unit_context=None):
     """
-    Query database_data table for at least 200 units of data based on Model Code
+    Query database_data table for the most recent units based on Model Code
     
     Args:
         model_code: The model code to filter by
-        limit: Number of records to retrieve (default 200)
+        limit: Number of records to retrieve (default 100)
+        unit_context: Unit of this cycle; its baseline is shared with the other material modules
     
     Returns:
-        DataFrame with database data
+        DataFrame with cleaned database data
     """
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        # First, check the structure of database_data table
         print(f"\n=== QUERYING DATABASE_DATA TABLE FOR MODEL {model_code} ===")
-        columns = check_table_structure("database_data")
-        if not columns:
-            print("Failed to get table structure for database_data")
-            return None
+        # One query per model and cycle serves every material module; this module
+        # gets its own cleaned copy
+        provider = get_baseline_provider(DB_CONFIG, unit_context) if unit_context is not None else BaselineProvider(DB_CONFIG, materials=BASELINE_MATERIALS)
+        df_cleaned = provider.view(__name__, model_code, clean_database_data, limit=limit)
         
-        # Select ALL columns from database_data table
-        print(f"Found {len(columns)} total columns in database_data table")
-        print(f"All columns: {[col['Field'] for col in columns[:10]]}...")  # Show first 10 columns
-        
-        # Use * to select all columns
-        columns_str = '*'
-        
-        # Keywords to filter out before querying
-        keywords_to_filter = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI', 'REPAIRED', 'REPAIRED AT']
-        
-        # Build keyword filtering conditions for NG_Cause columns
-        ng_cause_columns = [
-            'Process_1_NG_Cause', 'Process_2_NG_Cause', 'Process_3_NG_Cause',
-            'Process_4_NG_Cause', 'Process_5_NG_Cause', 'Process_6_NG_Cause'
-        ]
-        
-        # Create WHERE conditions to exclude records with problematic keywords
-        keyword_conditions = []
-        for keyword in keywords_to_filter:
-            for column in ng_cause_columns:
-                keyword_conditions.append(f"{column} NOT LIKE '%{keyword}%'")
-        
-        keyword_filter = " AND ".join(keyword_conditions)
-        
-        # Query for data with the specific model code and keyword filtering (keep all PASS_NG values)
-        # Order by DATE DESC to get the most recent records consistently
-        query = f"""
-        SELECT {columns_str}
-        FROM database_data
-        WHERE Model_Code = %s AND ({keyword_filter})
-        ORDER BY DATE DESC
-        LIMIT {limit}
-        """
-        
-        print(f"Executing query: {query}")
-        cursor.execute(query, (model_code,))
-        results = cursor.fetchall()
-        
-        if results:
-            print(f"Retrieved {len(results)} records from database_data for model {model_code}")
-            df = pd.DataFrame(results)
-            print(f"Database DataFrame shape before cleaning: {df.shape}")
-            print(f"Database DataFrame columns before cleaning: {list(df.columns)}")  # Show first 10 columns
-            cursor.close()
-            connection.close()
-# Clean the database data before returning
-            print("Cleaning database data...")
-            df_cleaned = clean_database_data(df)
-            print(f"Database DataFrame shape after cleaning: {df_cleaned.shape}")
-            print(f"Database DataFrame columns after cleaning: {list(df_cleaned.columns)}")  # Show first 10 columns
-            return df_cleaned
-        else:
+        if df_cleaned is None:
             print(f"No records found in database_data for model {model_code}")
-            cursor.close()
-            connection.close()
             return None
+        
+        print(f"Database DataFrame shape after cleaning: {df_cleaned.shape}")
+        return df_cleaned
             
     except Exception as e:
         print(f"Error querying database_data table: {e}")
-        if connection:
-            connection.close()
         return None
+
 def clean_database_data(df):
     """
     Clean up database_data table rows and columns that contain specific keywords.
@@ -691,29 +603,19 @@ def clean_database_data(df):
         return df
     
     # Keywords to filter out
-    keywords = [
-        "NG PRESSURE",
-        "REPAIRED AT",
-        "RE PI",
-        "MASTER PUMP",
-        "NG AT",
-        "INSPECTION ONLY"
-    ]
+    keywords = DATABASE_ROW_FILTER.keywords
     
     print(f"Cleaning database data with {len(df)} rows and {len(df.columns)} columns")
     print(f"Filtering out rows and columns containing: {keywords}")
     
     # Filter out rows that contain any of the keywords in any column
-    rows_to_keep = pd.Series([True] * len(df))
-    for keyword in keywords:
-        for col in df.columns:
-            if df[col].dtype == 'object':  # Only check string columns
-                rows_to_keep = rows_to_keep & (~df[col].astype(str).str.contains(keyword, case=False, na=False))
+    rows_to_keep = DATABASE_ROW_FILTER.row_mask(df)
     
     df_filtered = df[rows_to_keep]
     print(f"Filtered rows from {len(df)} to {len(df_filtered)}")
     
     # Filter out columns that contain any of the keywords in their names or values
+    columns_with_keyword_values = set(DATABASE_ROW_FILTER.columns_with_matches(df_filtered))
     columns_to_keep = []
     for col in df_filtered.columns:
         # Check if column name contains any of the keywords
@@ -725,14 +627,9 @@ def clean_database_data(df):
                 break
         
         # If column name is okay, check if any values in the column contain keywords
-        if keep_column:
-            if df_filtered[col].dtype == 'object':  # Only check string columns
-                # Check if any value in the column contains any of the keywords
-                for keyword in keywords:
-                    if df_filtered[col].astype(str).str.contains(keyword, case=False, na=False).any():
-                        keep_column = False
-                        print(f"  Removing column '{col}' because values contain keyword '{keyword}'")
-                        break
+        if keep_column and col in columns_with_keyword_values:
+            keep_column = False
+            print(f"  Removing column '{col}' because values contain one of the keywords")
         
         if keep_column:
             columns_to_keep.append(col)
@@ -1492,19 +1389,34 @@ def perform_deviation_calculations(database_df, inspection_df, process_sn_list=N
 
 def process_material_data():
     """
-    Main function to process material data from CSV and database tables.
-    Processes all materials and their respective inspection tables.
+    Read the latest unit from today's PICompiled file and process it.
+    Kept for callers that do not build a UnitContext themselves.
     """
     print("=== Starting Material Data Processing ===")
     
     # Step 1: Get Process S/N from CSV
     print("\n1. Reading CSV data...")
-    csv_data = read_csv_with_pandas(FILEPATH)
+    # Resolved per call so a long-running process follows the daily file
+    file_path = picompiled_path(directory=NETWORK_DIR)
+    unit_context = UnitContext.from_csv_data(read_csv_with_pandas(file_path), file_path)
     
-    if csv_data is None or csv_data.empty:
+    if unit_context is None:
         print("Failed to read CSV data or no data found")
         return None
     
+    return process_material_data_for_unit(unit_context)
+
+def process_material_data_for_unit(unit_context):
+    """
+    Main function to process material data for one unit from the CSV.
+    Processes all materials and their respective inspection tables.
+    
+    Args:
+        unit_context: UnitContext built once per cycle from the PICompiled CSV
+    """
+    print(f"\n=== Processing {unit_context} ===")
+    csv_data = unit_context.to_frame()
+    
     # Extract Process S/N values and actual S/N values
     process_sn_list = csv_data['PROCESS S/N'].tolist()
     sn_list = csv_data['S/N'].tolist()
@@ -1527,29 +1439,13 @@ def process_material_data():
     
     print(f"Searching for Process S/N: {process_sn_list} with DATE: {csv_date}")
     
-    # Try different date formats if needed
-    date_formats = [
-        csv_date,  # Original format
-        str(csv_date).replace('-', '/') if csv_date and '-' in str(csv_date) else csv_date,  # YYYY/MM/DD
-        str(csv_date).split(' ')[0] if csv_date and ' ' in str(csv_date) else csv_date,  # Just date part if timestamp
-    ]
-    
-    results = None
-    for date_fmt in date_formats:
-        if not date_fmt:
-            continue
-            
-        print(f"Trying date format: {date_fmt}")
-        results = get_process_data_for_materials(process_sn_list, target_materials, date_fmt)
-        
-        # Check if we got any results
-        if results and any(process_data for process_data in results.values()):
-            print(f"Successfully found data with date format: {date_fmt}")
-            break
-            
-    if not results or not any(process_data for process_data in results.values()):
-        print("WARNING: Could not find matching data with any date format. Trying without date filter...")
-        results = get_process_data_for_materials(process_sn_list, target_materials, None)
+    # Rows come from the unit's process table fetch shared by every material
+    # module; a table without rows on the CSV date falls back to the S/N alone
+    traceability = get_unit_traceability(DB_CONFIG, unit_context)
+    if traceability is not None:
+        results = traceability.process_results(target_materials, DATED_OR_ANY)
+    else:
+        results = get_process_data_for_materials(process_sn_list, target_materials, csv_date)
     
     if results:
         print("\n=== SUMMARY OF RESULTS ===")
@@ -1652,7 +1548,7 @@ def process_material_data():
                 # If we have a model code, query database_data table
                 database_df = None
                 if model_code:
-                    database_df = get_database_data_for_model(model_code, 100)
+                    database_df = get_database_data_for_model(model_code, 100, unit_context)
                 
                 # Perform deviation calculations if we have both database and inspection data
                 deviation_df = None
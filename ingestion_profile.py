@@ -0,0 +1,83 @@
+#%%
+import io
+import logging
+import importlib.util
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Faster parser used when it is installed; pandas' C parser otherwise
+FAST_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else None
+
+
+def clean_model_code(series):
+    """
+    Strip stray double quotes from MODEL CODE values.
+
+    Categorical columns are cleaned on their categories only, so the work is
+    per distinct model code instead of per row.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if categories.dtype == object:
+            cleaned = categories.str.replace('"', '', regex=False)
+            if cleaned.is_unique:
+                return series.cat.rename_categories(cleaned)
+    return series.astype(str).str.replace('"', '', regex=False)
+
+
+class IngestionProfile:
+    """
+    Declares how CSV lines are turned into a DataFrame: which columns, their dtypes,
+    and a keyword filter applied to raw lines before parsing.
+
+    Args:
+        columns: Column names to parse (None parses every column)
+        dtypes: Dict of column name to dtype; columns not listed are inferred
+        line_filter: KeywordFilter over all text columns applied to raw lines
+        engine: Parser engine; None picks FAST_ENGINE when installed
+    """
+
+    def __init__(self, columns=None, dtypes=None, line_filter=None, engine=None):
+        if line_filter is not None and line_filter.columns is not None:
+            raise ValueError("line_filter must scan all text columns; column-restricted filters need parsed rows")
+        self.columns = list(columns) if columns is not None else None
+        self.dtypes = dict(dtypes or {})
+        self.line_filter = line_filter
+        self.engine = engine or FAST_ENGINE
+
+    def output_columns(self, all_columns):
+        """Columns of the frames this profile produces for a file with all_columns"""
+        if self.columns is None:
+            return list(all_columns)
+        return [col for col in all_columns if col in self.columns]
+
+    def filter_lines(self, lines, offsets):
+        """Drop the lines (and their offsets) that contain a line_filter keyword"""
+        if self.line_filter is None or not lines:
+            return lines, offsets
+        matched = self.line_filter.line_matches(lines)
+        if not matched.any():
+            return lines, offsets
+        keep = (~matched).tolist()
+        return ([line for line, k in zip(lines, keep) if k],
+                [offset for offset, k in zip(offsets, keep) if k])
+
+    def read(self, data, all_columns, encoding='utf-8'):
+        """
+        Parse headerless CSV bytes whose columns are all_columns.
+
+        Returns:
+            DataFrame with output_columns(all_columns), in file column order
+        """
+        usecols = self.output_columns(all_columns)
+        dtype = {col: self.dtypes[col] for col in usecols if col in self.dtypes}
+        options = dict(header=None, names=list(all_columns), usecols=usecols, dtype=dtype or None,
+                       encoding=encoding)
+        if self.engine is not None and self.engine != 'c':
+            try:
+                return pd.read_csv(io.BytesIO(data), engine=self.engine, **options)
+            except (ValueError, ImportError) as e:
+                logger.warning(f"{self.engine} parser failed ({e}), using the C parser from now on")
+                self.engine = 'c'
+        return pd.read_csv(io.BytesIO(data), **options)
@@ -0,0 +1,253 @@
+#%%
+import os
+import copy
+import json
+import base64
+import decimal
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# Per-user directory holding one cache file per database
+CACHE_DIR = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "material_anomaly", "inspection")
+
+# Lots kept per database; the least recently used lot is dropped first
+INSPECTION_CACHE_SIZE = 5000
+
+# Bumped when the file layout changes; files of another version are ignored
+CACHE_FORMAT = 3
+
+# Variant of entries holding every row of a lot (SELECT *)
+ALL_ROWS = '*'
+
+
+def _file_name(config):
+    name = f"{config.get('host')}_{config.get('database')}"
+    return ''.join(char if char.isalnum() or char in '-_.' else '_' for char in name) + ".json"
+
+
+# JSON has no tuples, dates or decimals; such values are stored as {tag: text}
+_TAGS = {
+    '__tuple__': (tuple, lambda value: [_encode(item) for item in value],
+                  lambda value: tuple(_decode(item) for item in value)),
+    '__datetime__': (datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    '__date__': (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    '__time__': (datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    '__timedelta__': (datetime.timedelta, datetime.timedelta.total_seconds,
+                      lambda value: datetime.timedelta(seconds=value)),
+    '__decimal__': (decimal.Decimal, str, decimal.Decimal),
+    '__bytes__': ((bytes, bytearray), lambda value: base64.b64encode(value).decode('ascii'), base64.b64decode),
+}
+
+
+def _encode(value):
+    """value (rows as fetched: dicts, lists, tuples, dates, decimals) as plain JSON data"""
+    if isinstance(value, dict):
+        return {str(key): _encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    # datetime is a date subclass, so it is tried first
+    for tag, (types, encode, _) in _TAGS.items():
+        if isinstance(value, types):
+            return {tag: encode(value)}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            tag, item = next(iter(value.items()))
+            if tag in _TAGS:
+                return _TAGS[tag][2](item)
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+
+def _is_private(path):
+    """
+    True if path belongs to this user and only it can write there. Windows has
+    no owner ids; LOCALAPPDATA is private to the user already.
+    """
+    if not hasattr(os, 'getuid'):
+        return True
+    for checked in (path, os.path.dirname(os.path.abspath(path))):
+        info = os.stat(checked)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            return False
+    return True
+
+
+class InspectionCache:
+    """
+    LRU cache of inspection records keyed by (inspection table, lot number), persisted to path.
+    Entries carry the variant of the query that produced them; provisional (incomplete)
+    entries are only served while the database is unavailable.
+
+    Args:
+        path: Cache file; None keeps the cache in memory only
+        capacity: Maximum number of lots kept
+    """
+
+    def __init__(self, path=None, capacity=INSPECTION_CACHE_SIZE):
+        self.path = path
+        self.capacity = capacity
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saves = 0
+
+    def _load(self):
+        """Read the cache file once; a missing or unreadable file starts empty"""
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            if not _is_private(self.path):
+                logger.warning(f"Ignoring inspection cache {self.path}: writable by other users")
+                return
+            with open(self.path, 'r', encoding='utf-8') as handle:
+                data = json.load(handle)
+            if data.get('format') != CACHE_FORMAT:
+                logger.info(f"Ignoring inspection cache {self.path} of another format")
+                return
+            for (table, lot), (variant, value, final) in data['entries']:
+                self._entries[(table, lot)] = (_decode(variant), _decode(value), final)
+            logger.info(f"Loaded {len(self._entries)} cached inspection lots from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not read inspection cache {self.path}, starting empty: {e}")
+            self._entries = OrderedDict()
+
+    def lookup(self, table, lot_numbers, variant=ALL_ROWS, include_provisional=False):
+        """
+        Split lot_numbers into cached values and lots still to be queried.
+
+        Args:
+            include_provisional: Also return provisional entries (stale fallback)
+
+        Returns:
+            (dict of lot number to a copy of its cached value, list of missing lot numbers)
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            self._load()
+            for lot in dict.fromkeys(lot_numbers):
+                key = (table, str(lot))
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == variant and (entry[2] or include_provisional):
+                    self._entries.move_to_end(key)
+                    found[lot] = copy.deepcopy(entry[1])
+                    self.hits += 1
+                else:
+                    missing.append(lot)
+                    self.misses += 1
+        return found, missing
+
+    def get(self, table, lot_number, variant=ALL_ROWS):
+        """Cached value of one lot, or None"""
+        found, _ = self.lookup(table, [lot_number], variant)
+        return found.get(lot_number)
+
+    def store(self, table, lot_number, value, variant=ALL_ROWS, final=True):
+        """Cache value for lot_number (provisional unless final); call save() to persist it"""
+        with self._lock:
+            self._load()
+            key = (table, str(lot_number))
+            entry = self._entries.get(key)
+            if not final and entry is not None and entry[0] == variant and entry[2]:
+                # Never downgrade a finished lot
+                return
+            self._entries[key] = (variant, copy.deepcopy(value), final)
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+    def invalidate(self, table=None, lot_number=None):
+        """
+        Drop cached lots, e.g. after an inspection record was corrected.
+
+        Args:
+            table: Only drop lots of this table (default: every table)
+            lot_number: Only drop this lot (default: every lot)
+
+        Returns:
+            Number of lots dropped
+        """
+        with self._lock:
+            self._load()
+            keys = [key for key in self._entries
+                    if (table is None or key[0] == table) and (lot_number is None or key[1] == str(lot_number))]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self._dirty = True
+                self.save()
+            return len(keys)
+
+    def save(self):
+        """Write the cache file if anything changed since the last save"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return False
+            temp_path = self.path + ".tmp"
+            try:
+                data = {'format': CACHE_FORMAT,
+                        'entries': [[list(key), [_encode(variant), _encode(value), final]]
+                                    for key, (variant, value, final) in self._entries.items()]}
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+                # Readable and writable by this user only
+                with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                               'w', encoding='utf-8') as handle:
+                    json.dump(data, handle)
+                os.replace(temp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"Could not write inspection cache {self.path}: {e}")
+                return False
+            self._dirty = False
+            self.saves += 1
+            return True
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._entries)
+
+    def stats(self):
+        return {
+            'lots': len(self._entries) if self._entries is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'saves': self.saves,
+        }
+
+
+_caches = KeyedRegistry(lambda config, cache_dir: InspectionCache(os.path.join(cache_dir, _file_name(config))))
+
+
+def get_inspection_cache(config, cache_dir=CACHE_DIR):
+    """Return the shared InspectionCache for config's database, creating it on first use"""
+    return _caches.get(config, cache_dir)
+
+
+def invalidate_inspection_cache(config, table=None, lot_number=None, cache_dir=CACHE_DIR):
+    """Drop cached lots of config's database; see InspectionCache.invalidate"""
+    return get_inspection_cache(config, cache_dir).invalidate(table, lot_number)
@@ -0,0 +1,154 @@
+#%%
+import logging
+import threading
+from db_health import is_unavailable, note_stale
+
+logger = logging.getLogger(__name__)
+
+# MySQL error raised for syntax the server does not support (window functions before 8.0)
+ER_PARSE_ERROR = 1064
+
+# Databases whose server rejected ROW_NUMBER(), keyed by (host, database)
+_no_window_functions = set()
+_lock = threading.Lock()
+
+
+def _quote(column):
+    return f"`{column}`"
+
+
+def _is_complete(row):
+    """True if no value of row is None or NaN"""
+    return not any(value is None or (isinstance(value, float) and value != value) for value in row.values())
+
+
+def rows_complete(rows):
+    """True if every row of a lot is complete; until then the lot may still be filled in"""
+    return bool(rows) and all(_is_complete(row) for row in rows)
+
+
+def lot_key(lot_number):
+    """Lot number as MySQL's default collation compares it: case and trailing spaces ignored"""
+    return str(lot_number).strip().casefold()
+
+
+def latest_complete_query(table, columns, date_column, lot_count, lot_column='Lot_Number'):
+    """
+    One query returning, per lot, the newest row without NULLs, or the newest row if every row has one.
+
+    Rows are ranked per lot by "has a NULL" first and date_column second, so
+    only the selected row of each lot leaves the server.
+    """
+    select = ', '.join(_quote(column) for column in columns)
+    has_null = ' OR '.join(f"{_quote(column)} IS NULL" for column in columns)
+    placeholders = ', '.join(['%s'] * lot_count)
+    return f"""
+        SELECT {select}
+        FROM (
+            SELECT {select},
+                   ROW_NUMBER() OVER (PARTITION BY {_quote(lot_column)}
+                                      ORDER BY ({has_null}) ASC, {_quote(date_column)} DESC) AS lot_rank
+            FROM {table}
+            WHERE {_quote(lot_column)} IN ({placeholders})
+        ) ranked
+        WHERE lot_rank = 1
+        """
+
+
+def all_lots_query(table, columns, date_column, lot_count, lot_column='Lot_Number'):
+    """Every row of the given lots, newest first, for servers without window functions"""
+    select = ', '.join(_quote(column) for column in columns)
+    placeholders = ', '.join(['%s'] * lot_count)
+    return f"""
+        SELECT {select}
+        FROM {table}
+        WHERE {_quote(lot_column)} IN ({placeholders})
+        ORDER BY {_quote(date_column)} DESC
+        """
+
+
+def latest_complete_records(cursor, config, table, columns, date_column, lot_numbers, lot_column='Lot_Number',
+                            cache=None):
+    """
+    Resolve the latest complete inspection record of every lot with one query.
+
+    Args:
+        cursor: Dictionary cursor of a connection to config's database; None if the
+            database could not be reached, which serves what cache holds
+        config: DB_CONFIG, identifies the server for the window function check
+        table: Inspection table name
+        columns: Columns to return; must include lot_column
+        date_column: Column ordering a lot's records, newest first
+        lot_numbers: Lot numbers to resolve
+        cache: InspectionCache; cached lots are not queried, complete records are stored
+            and incomplete ones kept as provisional for when the database is unavailable
+
+    Returns:
+        Dict of lot number (as given) to its record; lots without rows are absent
+    """
+    lot_numbers = [lot for lot in dict.fromkeys(lot_numbers) if lot is not None]
+    if not lot_numbers:
+        return {}
+    columns = list(columns)
+    if lot_column not in columns:
+        columns.append(lot_column)
+
+    requested = lot_numbers
+    cached = {}
+    if cache is not None:
+        variant = (tuple(columns), date_column)
+        cached, lot_numbers = cache.lookup(table, requested, variant)
+        if not lot_numbers:
+            return cached
+
+    try:
+        if cursor is None:
+            raise ConnectionError(f"No connection to {config.get('database')}")
+        records = _query_records(cursor, config, table, columns, date_column, lot_numbers, lot_column)
+    except Exception as e:
+        if cache is None or not (cursor is None or is_unavailable(e)):
+            raise
+        # Serve the last known state of the lots instead of failing the unit
+        stale, _ = cache.lookup(table, lot_numbers, variant, include_provisional=True)
+        if stale:
+            note_stale(f"{table} records of {len(stale)} lot(s) ({e})", None)
+        return {lot: cached[lot] if lot in cached else stale[lot]
+                for lot in requested if lot in cached or lot in stale}
+
+    if cache is not None:
+        # An incomplete record may still get a complete successor; it is queried again until then
+        for lot, row in records.items():
+            cache.store(table, lot, row, variant, final=_is_complete(row))
+        cache.save()
+        records = {lot: cached[lot] if lot in cached else records[lot]
+                   for lot in requested if lot in cached or lot in records}
+    return records
+
+
+def _query_records(cursor, config, table, columns, date_column, lot_numbers, lot_column):
+    key = (config.get('host'), config.get('database'))
+    rows = None
+    if key not in _no_window_functions:
+        try:
+            cursor.execute(latest_complete_query(table, columns, date_column, len(lot_numbers), lot_column),
+                           lot_numbers)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if getattr(e, 'errno', None) != ER_PARSE_ERROR:
+                raise
+            logger.info(f"{key[0]} does not support window functions, ranking inspection records client-side")
+            with _lock:
+                _no_window_functions.add(key)
+
+    if rows is None:
+        # Still one query per table; the ranking happens here instead
+        cursor.execute(all_lots_query(table, columns, date_column, len(lot_numbers), lot_column), lot_numbers)
+        by_lot = {}
+        for row in cursor.fetchall():
+            lot_rows = by_lot.setdefault(lot_key(row[lot_column]), [])
+            lot_rows.append(row)
+        rows = [next((row for row in lot_rows if _is_complete(row)), lot_rows[0]) for lot_rows in by_lot.values()]
+
+    # The server matched the lots with its collation, so 'l1 ' may come back for 'L1'
+    found = {lot_key(row[lot_column]): row for row in rows}
+    return {lot: found[lot_key(lot)] for lot in lot_numbers if lot_key(lot) in found}
@@ -0,0 +1,136 @@
+#%%
+import re
+import numpy as np
+import pandas as pd
+
+
+def _is_text_dtype(dtype):
+    """True for dtypes that can hold keyword text (object, string and categorical)"""
+    return dtype == object or isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+class KeywordFilter:
+    """
+    Row filter removing rows that contain any of a list of keywords, matched with one
+    regular expression on the distinct values of each text column.
+
+    Args:
+        keywords: Keywords to look for (plain substrings, not regexes)
+        columns: Optional list of column names or a predicate on the column
+                 name restricting which columns are scanned. Defaults to all
+                 text columns.
+        case: Match case-sensitively (default False, like str.contains(case=False))
+    """
+
+    def __init__(self, keywords, columns=None, case=False):
+        self.keywords = list(keywords)
+        self.columns = columns
+        self.case = case
+        flags = 0 if case else re.IGNORECASE
+        self.pattern = re.compile('|'.join(re.escape(k) for k in self.keywords), flags)
+        # Keywords for raw lines; without case, lines are upper-cased before
+        # the search (the ASCII-only folding re.IGNORECASE applies to bytes)
+        self.line_keywords = [k.encode('utf-8') if case else k.encode('utf-8').upper() for k in self.keywords]
+        self._text_columns_cache = {}
+
+    def _column_selected(self, col):
+        if self.columns is None:
+            return True
+        if callable(self.columns):
+            return self.columns(col)
+        return col in self.columns
+
+    def text_columns(self, df):
+        """Return the scanned columns of df that hold text"""
+        layout = tuple(zip(df.columns, df.dtypes))
+        cached = self._text_columns_cache.get(layout)
+        if cached is None:
+            if len(self._text_columns_cache) >= 64:
+                self._text_columns_cache.clear()
+            cached = [col for col, dtype in layout if _is_text_dtype(dtype) and self._column_selected(col)]
+            self._text_columns_cache[layout] = cached
+        return cached
+
+    def column_matches(self, series):
+        """Boolean array marking the values of series that contain a keyword"""
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        if len(uniques) == 0:
+            return np.zeros(len(series), dtype=bool)
+        search = self.pattern.search
+        hits = np.fromiter((search(str(value)) is not None for value in uniques), dtype=bool, count=len(uniques))
+        # Missing values (code -1) never match, like str.contains(na=False)
+        return np.append(hits, False)[codes]
+
+    def row_mask(self, df):
+        """
+        Compute which rows to keep in one pass over the scanned columns.
+
+        Returns:
+            Boolean Series aligned with df, True for rows without any keyword
+        """
+        matched = np.zeros(len(df), dtype=bool)
+        if self.keywords:
+            for col in self.text_columns(df):
+                matched |= self.column_matches(df[col])
+        return pd.Series(~matched, index=df.index)
+
+    def line_matches(self, lines):
+        """
+        Boolean array marking raw CSV lines (bytes) that contain a keyword.
+
+        For word keywords (no digits) numeric fields cannot contain a match,
+        so for a filter over all text columns this keeps the same rows as
+        row_mask() would after parsing, and dropped lines are never parsed.
+        """
+        matched = np.zeros(len(lines), dtype=bool)
+        if not self.keywords or not lines:
+            return matched
+        # bytes.find per keyword over the joined lines is far faster than a
+        # regex alternation; after a hit the rest of that line is skipped
+        data = b'\n'.join(lines)
+        if not self.case:
+            data = data.upper()
+        positions = []
+        for keyword in self.line_keywords:
+            if not keyword:
+                # An empty keyword matches everything, as in the regex
+                matched[:] = True
+                return matched
+            position = data.find(keyword)
+            while position >= 0:
+                positions.append(position)
+                line_end = data.find(b'\n', position)
+                if line_end < 0:
+                    break
+                position = data.find(keyword, line_end)
+        if positions:
+            line_ends = np.cumsum(np.fromiter((len(line) + 1 for line in lines), dtype=np.int64, count=len(lines)))
+            matched[np.searchsorted(line_ends, positions, side='right')] = True
+        return matched
+
+    def filter_rows(self, df):
+        """Return df without the rows that contain any keyword"""
+        return df[self.row_mask(df)]
+
+    def columns_with_matches(self, df):
+        """Return the scanned columns of df where any value contains a keyword"""
+        if not self.keywords:
+            return []
+        return [col for col in self.text_columns(df) if self.column_matches(df[col]).any()]
+
+
+_filters = {}
+
+
+def get_keyword_filter(keywords, columns=None, case=False):
+    """
+    Return a shared KeywordFilter for these settings so its column cache is reused.
+
+    columns must be hashable here: a tuple of names or a module-level predicate.
+    """
+    key = (tuple(keywords), columns, case)
+    keyword_filter = _filters.get(key)
+    if keyword_filter is None:
+        keyword_filter = KeywordFilter(keywords, columns, case)
+        _filters[key] = keyword_filter
+    return keyword_filter
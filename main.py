@@ -1,6 +1,6 @@
 #%%
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import pandas as pd
 import os
 import datetime
@@ -8,12 +8,24 @@ import threading
 import sys
 import subprocess
 import time
-import hashlib
 import logging
 import traceback
 from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from picompiled_reader import get_incremental_reader, locate_last_valid_unit, release_readers, UNIT_COLUMNS
+from ingestion_profile import IngestionProfile
+from picompiled_path import PICOMPILED_DIR, DailyPathResolver, picompiled_path
+from csv_spool import SPOOL_DIR, get_spool_mirror, release_spool_mirror
+from unit_index import find_unit, get_unit_index, release_unit_index
+from unit_context import build_unit_context, read_new_unit_contexts
+from csv_monitor import AdaptivePoller, file_fingerprint
+from change_scheduler import SingleFlightScheduler
+from unit_stream import UnitStream
+from db_pool import get_pool, pool_stats
+from query_log import format_cycle_report, get_query_log, query_scope
+from query_fanout import QueryGraph
+from db_health import cycle_deadline, take_stale_notes
+from baseline_provider import BASELINE_KEYWORDS, BASELINE_LIMIT, get_baseline_provider
+from unit_traceability import get_unit_traceability
 
 # Configure logging
 log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'material_anomaly.log')
@@ -27,6 +39,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# The change check only needs the unit columns of the last row
+CSV_TAIL_PROFILE = IngestionProfile(UNIT_COLUMNS)
+
 def log_unhandled_exception(exc_type, exc_value, exc_traceback):
     """Log unhandled exceptions"""
     if issubclass(exc_type, KeyboardInterrupt):
@@ -81,23 +96,6 @@ if module_import_errors:
 else:
     logger.info("All material processing modules imported successfully")
 
-class CSVFileHandler(FileSystemEventHandler):
-    """File system event handler for monitoring CSV file changes"""
-    
-    def __init__(self, gui_instance):
-        self.gui = gui_instance
-        self.last_processed_hash = None
-        
-    def on_modified(self, event):
-        if event.is_directory:
-            return
-            
-        # Check if the modified file is our target CSV
-        if hasattr(self.gui, 'csv_file_path') and event.src_path == self.gui.csv_file_path:
-            self.gui.log_event(f"CSV file change detected: {event.src_path}")
-            # Add small delay to ensure file write is complete
-            threading.Timer(2.0, self.gui.process_csv_change).start()
-
 class MaterialAnomalyGUI:
     
     def __init__(self, root):
@@ -122,14 +120,31 @@ class MaterialAnomalyGUI:
         self.deviation_log_file = os.path.join(os.path.expanduser("~"), "Desktop", "comprehensive_deviation_log.xlsx")
         
         # CSV monitoring setup
-        self.csv_file_path = fr"\\192.168.2.19\ai_team\AI Program\Outputs\PICompiled\PICompiled{self.x.year}-{self.x.strftime("%m")}-{self.x.strftime('%d')}.csv"
+        self.csv_file_path = picompiled_path(self.x)
+        # Follow the daily PICompiled{YYYY-MM-DD}.csv until a file is picked by hand
+        self.follow_daily_file = True
+        self.path_resolver = DailyPathResolver()
+        self.pending_csv_path = None
+        self.csv_path_from_rotation = False
+        # Parse a local mirror of the CSV instead of reading the share directly
+        self.use_spool = True
         self.auto_monitoring = tk.BooleanVar(value=False)
-        self.file_observer = None
-        self.last_csv_hash = None
+        # Streaming mode checks every appended unit instead of only the last one
+        self.streaming_mode = tk.BooleanVar(value=False)
+        self.unit_stream = UnitStream(self.process_unit_batch)
+        self.csv_poller = None
+        self.change_scheduler = None
+        self.last_csv_fingerprint = None
+        # Held for a whole processing pipeline so manual and automatic runs never overlap
+        self.pipeline_lock = threading.Lock()
+        self.current_unit_context = None
         self.critical_deviations_log = os.path.join(os.path.expanduser("~"), "Desktop", "critical_deviations_auto_log.xlsx")
         
         self.setup_gui()
         self.setup_event_logger()
+        self.update_stream_status()
+        # Open the pooled database connections before the first cycle needs them
+        threading.Thread(target=self.warm_up_db_pools, daemon=True).start()
         
     def setup_gui(self):
         """Setup the main GUI layout"""
@@ -181,6 +196,9 @@ class MaterialAnomalyGUI:
         ttk.Button(button_frame, text="Save All Results", 
                   command=self.save_all_results).grid(row=2, column=0, pady=5, sticky=(tk.W, tk.E))
         
+        ttk.Button(button_frame, text="Re-check Unit by S/N", 
+                  command=self.recheck_unit).grid(row=3, column=0, pady=5, sticky=(tk.W, tk.E))
+        
         # Display options
         display_frame = ttk.LabelFrame(control_frame, text="Display Options", padding="10")
         display_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -200,12 +218,21 @@ class MaterialAnomalyGUI:
                                                   command=self.toggle_monitoring)
         self.monitoring_checkbox.grid(row=0, column=0, sticky=tk.W, pady=2)
         
+        self.streaming_checkbox = ttk.Checkbutton(monitoring_frame, text="Check Every Unit (Streaming)", 
+                                                 variable=self.streaming_mode, 
+                                                 command=self.toggle_streaming_mode)
+        self.streaming_checkbox.grid(row=1, column=0, sticky=tk.W, pady=2)
+        
         ttk.Button(monitoring_frame, text="Set CSV File Path", 
-                  command=self.set_csv_file_path).grid(row=1, column=0, pady=5, sticky=(tk.W, tk.E))
+                  command=self.set_csv_file_path).grid(row=2, column=0, pady=5, sticky=(tk.W, tk.E))
         
         self.csv_path_label = ttk.Label(monitoring_frame, text="No CSV file selected", 
                                        foreground="gray", wraplength=200)
-        self.csv_path_label.grid(row=2, column=0, pady=2, sticky=(tk.W, tk.E))
+        self.csv_path_label.grid(row=3, column=0, pady=2, sticky=(tk.W, tk.E))
+        
+        self.stream_status_label = ttk.Label(monitoring_frame, text="Queue: 0 | Lag: -", 
+                                            foreground="gray", wraplength=200)
+        self.stream_status_label.grid(row=4, column=0, pady=2, sticky=(tk.W, tk.E))
         
         # Progress bar
         self.progress_var = tk.DoubleVar()
@@ -297,23 +324,26 @@ class MaterialAnomalyGUI:
         
         self.root.update_idletasks()
         
-    def run_material_script(self, script_name, material_name):
-        """Run a material processing script and return results"""
+    def run_material_script(self, script_name, material_name, unit_context):
+        """Run a material processing script for the unit of this cycle and return results"""
         try:
             self.log_event(f"Starting {material_name} analysis...")
             
-            if script_name == "frame":
-                result = frame.process_material_data()
-            elif script_name == "csb_data_output":
-                result = csb_data_output.process_material_data()
-            elif script_name == "rod_blk_output":
-                result = rod_blk_output.process_material_data()
-            elif script_name == "em_material":
-                result = em_material.process_material_data()
-            elif script_name == "df_blk_output":
-                result = df_blk_output.process_material_data()
-            else:
-                raise ValueError(f"Unknown script: {script_name}")
+            # The module's queries are reported under the material's name
+            with query_scope(material_name):
+                if script_name == "frame":
+                    result = frame.process_material_data_for_unit(unit_context)
+                elif script_name == "csb_data_output":
+                    result = csb_data_output.process_material_data_for_unit(unit_context)
+                elif script_name == "rod_blk_output":
+                    result = rod_blk_output.process_material_data_for_unit(unit_context)
+                elif script_name == "em_material":
+                    result = em_material.process_material_data_for_unit(unit_context)
+                elif script_name == "df_blk_output":
+                    # Df Block picks its unit with its own test/dummy row filter
+                    result = df_blk_output.process_material_data_for_unit(unit_context.for_module(script_name))
+                else:
+                    raise ValueError(f"Unknown script: {script_name}")
             
             if result and 'deviation_data' in result and result['deviation_data'] is not None:
                 deviation_df = result['deviation_data']
@@ -330,9 +360,46 @@ class MaterialAnomalyGUI:
             self.log_event(f"Error running {material_name} analysis: {str(e)}", "ERROR")
             return pd.DataFrame()
     
+    def active_baseline_materials(self):
+        """Baseline material names of the material modules that imported"""
+        materials = []
+        for module in (frame, csb_data_output, rod_blk_output, em_material, df_blk_output):
+            if module is not None:
+                materials += getattr(module, 'BASELINE_MATERIALS', ())
+        return tuple(materials)
+    
+    def load_unit_context(self):
+        """Read the latest valid unit from the monitored CSV once for this cycle"""
+        self.follow_daily_csv_file()
+        read_path = self.get_csv_read_path()
+        unit_context = build_unit_context(read_path)
+        if unit_context is None:
+            self.log_event("No valid unit found in CSV file", "WARNING")
+            return None
+        
+        # Df Block filters the CSV with its own keywords, so its latest unit can differ
+        df_blk_unit = (build_unit_context(read_path, df_blk_output.CSV_PROFILE, "unit_context.df_blk_output")
+                       if df_blk_output is not None else None)
+        if df_blk_unit is not None and not unit_context.same_unit(df_blk_unit):
+            unit_context.module_units["df_blk_output"] = df_blk_unit
+            self.log_event(f"Df Block unit - PROCESS S/N: {df_blk_unit.process_sn}, S/N: {df_blk_unit.sn}")
+        
+        # Baselines only select the columns of the modules that run this cycle
+        materials = self.active_baseline_materials()
+        for unit in [unit_context] + list(unit_context.module_units.values()):
+            unit.materials = materials
+        
+        self.current_unit_context = unit_context
+        self.log_event(f"Processing unit - MODEL CODE: {unit_context.model_code}, "
+                       f"PROCESS S/N: {unit_context.process_sn}, S/N: {unit_context.sn}")
+        return unit_context
+    
     def refresh_data(self):
         """Refresh data from all material scripts"""
         def refresh_thread():
+            if not self.pipeline_lock.acquire(blocking=False):
+                self.log_event("Processing already in progress - refresh skipped", "WARNING")
+                return
             try:
                 self.progress_var.set(0)
                 self.log_event("Starting data refresh for all materials...")
@@ -346,20 +413,34 @@ class MaterialAnomalyGUI:
                     ("df_blk_output", "Df Block")
                 ]
                 
+                # Parse the CSV once and share the unit with every material module
+                unit_context = self.load_unit_context()
+                if unit_context is None:
+                    return
+                
                 self.all_deviation_data = {}
                 total_materials = len(materials)
-                
-                for i, (script_name, material_name) in enumerate(materials):
-                    self.progress_var.set((i / total_materials) * 100)
+                get_query_log().start_cycle()
+                with cycle_deadline():
+                    # The modules start once the process tables are in; baselines keep loading
+                    unit_queries = self.start_unit_queries(unit_context)
+                    self.wait_for_traceability(unit_queries)
                     
-                    deviation_df = self.run_material_script(script_name, material_name)
-                    if not deviation_df.empty:
-                        self.all_deviation_data[material_name] = deviation_df
+                    for i, (script_name, material_name) in enumerate(materials):
+                        self.progress_var.set((i / total_materials) * 100)
                         
-                        # Log to comprehensive file
-                        self.log_to_comprehensive_file(deviation_df, material_name)
-                    
+                        deviation_df = self.run_material_script(script_name, material_name, unit_context)
+                        if not deviation_df.empty:
+                            self.all_deviation_data[material_name] = deviation_df
+                            
+                            # Log to comprehensive file
+                            self.log_to_comprehensive_file(deviation_df, material_name)
+                        
+                    _, errors = unit_queries.wait()
+                for step, error in errors.items():
+                    self.log_event(f"{step} failed: {error}", "WARNING")
                 self.progress_var.set(100)
+                self.log_query_report()
                 self.log_event("Data refresh completed for all materials.")
                 
                 # Update table display
@@ -369,6 +450,7 @@ class MaterialAnomalyGUI:
                 self.log_event(f"Error during data refresh: {str(e)}", "ERROR")
             finally:
                 self.progress_var.set(0)
+                self.pipeline_lock.release()
         
         # Run in separate thread to prevent GUI freezing
         thread = threading.Thread(target=refresh_thread)
@@ -408,13 +490,10 @@ class MaterialAnomalyGUI:
             self.log_event(f"Error logging to comprehensive file: {str(e)}", "ERROR")
     
     def get_csv_date(self):
-        """Extract date from the current CSV file"""
+        """Return the CSV date of the unit processed in the current cycle"""
         try:
-            if hasattr(self, 'csv_file_path') and os.path.exists(self.csv_file_path):
-                # Read just the first row to get the date
-                csv_data = pd.read_csv(self.csv_file_path, nrows=1)
-                if 'DATE' in csv_data.columns and not csv_data.empty:
-                    return csv_data['DATE'].iloc[0]
+            if self.current_unit_context is not None and self.current_unit_context.date:
+                return self.current_unit_context.date
             return datetime.datetime.now().strftime('%Y/%m/%d')
         except Exception as e:
             self.log_event(f"Error extracting CSV date: {str(e)}", "ERROR")
@@ -646,28 +725,32 @@ class MaterialAnomalyGUI:
         file_path = filedialog.askopenfilename(
             title="Select CSV File to Monitor",
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-            initialdir=r"\\192.168.2.19\ai_team\AI Program\Outputs\PICompiled"
+            initialdir=PICOMPILED_DIR
         )
         
         if file_path:
             self.csv_file_path = file_path
+            self.follow_daily_file = False
+            self.pending_csv_path = None
+            self.csv_path_from_rotation = False
             filename = os.path.basename(file_path)
             self.csv_path_label.config(text=f"Monitoring: {filename}", foreground="blue")
             self.log_event(f"CSV file path set to: {file_path}")
             
-            # Initialize hash for change detection
-            self.last_csv_hash = self.get_file_hash(file_path)
+            # Initialize fingerprint for change detection
+            self.last_csv_fingerprint = self.get_file_fingerprint(file_path)
+            
+            # Point an active poller at the new file
+            if self.csv_poller:
+                self.stop_monitoring()
+                self.start_monitoring()
     
-    def get_file_hash(self, file_path):
-        """Calculate MD5 hash of file for change detection"""
+    def get_file_fingerprint(self, file_path):
+        """Get size, mtime and tail hash of file for change detection"""
         try:
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+            return file_fingerprint(file_path)
         except Exception as e:
-            self.log_event(f"Error calculating file hash: {str(e)}", "ERROR")
+            self.log_event(f"Error calculating file fingerprint: {str(e)}", "ERROR")
             return None
     
     def toggle_monitoring(self):
@@ -685,14 +768,15 @@ class MaterialAnomalyGUI:
             return
         
         try:
-            # Set up file system observer
-            self.file_observer = Observer()
-            event_handler = CSVFileHandler(self)
+            # Bursts of changes are coalesced into one run at a time
+            self.change_scheduler = SingleFlightScheduler(self.process_csv_change)
             
-            # Watch the directory containing the CSV file
-            watch_dir = os.path.dirname(self.csv_file_path)
-            self.file_observer.schedule(event_handler, watch_dir, recursive=False)
-            self.file_observer.start()
+            # Poll only the CSV file itself instead of watching its whole directory
+            self.csv_poller = AdaptivePoller(self.csv_file_path, self.on_csv_fingerprint_changed,
+                                             path_resolver=self.path_resolver if self.follow_daily_file else None,
+                                             on_rotate=self.on_csv_rotated)
+            self.csv_poller.start()
+            self.last_csv_fingerprint = self.csv_poller.fingerprint
             
             self.log_event(f"Started monitoring CSV file: {os.path.basename(self.csv_file_path)}")
             self.status_label.config(text="Auto-monitoring ACTIVE", foreground="orange")
@@ -704,54 +788,215 @@ class MaterialAnomalyGUI:
     
     def stop_monitoring(self):
         """Stop monitoring the CSV file"""
-        if self.file_observer:
-            self.file_observer.stop()
-            self.file_observer.join()
-            self.file_observer = None
+        if self.csv_poller:
+            stats = self.csv_poller.stats()
+            self.csv_poller.stop()
+            self.csv_poller = None
+            self.log_event(f"CSV poller: {stats['checks']} checks, {stats['tail_reads']} tail reads, "
+                           f"{stats['changes']} changes")
+        
+        if self.change_scheduler:
+            stats = self.change_scheduler.stats()
+            self.change_scheduler.stop()
+            self.change_scheduler = None
+            self.log_event(f"Change scheduler: {stats['triggers']} triggers, {stats['runs']} runs, "
+                           f"{stats['coalesced']} coalesced, {stats['suppressed']} suppressed")
         
         self.log_event("Stopped CSV file monitoring")
         self.status_label.config(text="Auto-monitoring STOPPED", foreground="red")
     
-    def process_csv_change(self):
+    def on_csv_fingerprint_changed(self, fingerprint):
+        """Called by the CSV poller when the monitored file's fingerprint changes"""
+        self.log_event(f"CSV file change detected: {os.path.basename(self.csv_file_path)} ({fingerprint.size} bytes)")
+        scheduler = self.change_scheduler
+        if scheduler is not None and not scheduler.trigger(fingerprint):
+            self.log_event("Change already processed - trigger suppressed", "DEBUG")
+    
+    def on_csv_rotated(self, old_path, new_path):
+        """Called by the CSV poller when the next day's file has appeared"""
+        self.log_event(f"New daily CSV file found: {os.path.basename(new_path)} - "
+                       f"finishing {os.path.basename(old_path)} first")
+        self.pending_csv_path = new_path
+        scheduler = self.change_scheduler
+        if scheduler is not None:
+            scheduler.trigger(None)
+    
+    def apply_pending_rotation(self):
+        """
+        Switch to the next day's CSV file after draining the old one.
+        
+        Runs at the start of a scheduled run, so the old file's last units
+        are processed before any unit of the new file. Reader, filter and
+        database caches stay loaded; only the old file's readers are dropped.
+        
+        Returns:
+            True if the CSV file was switched
+        """
+        new_path = self.pending_csv_path
+        self.pending_csv_path = None
+        if not new_path or new_path == self.csv_file_path:
+            return False
+        
+        old_fingerprint = self.get_file_fingerprint(self.csv_file_path)
+        if old_fingerprint is not None and old_fingerprint != self.last_csv_fingerprint:
+            self.log_event(f"Draining remaining rows of {os.path.basename(self.csv_file_path)}")
+            self.last_csv_fingerprint = old_fingerprint
+            self.process_csv_update()
+        
+        self.switch_csv_file(new_path)
+        return True
+    
+    def switch_csv_file(self, new_path):
+        """Start reading the next day's CSV file from its first row"""
+        old_path = self.csv_file_path
+        self.csv_file_path = new_path
+        self.last_csv_fingerprint = None
+        # The new file is read from its first row, not from wherever it had grown to
+        self.csv_path_from_rotation = True
+        released = release_readers(old_path)
+        release_unit_index(old_path)
+        spool_path = release_spool_mirror(old_path)
+        if spool_path:
+            released += release_readers(spool_path)
+            release_unit_index(spool_path)
+        self.csv_path_label.config(text=f"Monitoring: {os.path.basename(new_path)}", foreground="blue")
+        self.log_event(f"Switched to {os.path.basename(new_path)} ({released} reader(s) of the old file released)")
+    
+    def follow_daily_csv_file(self):
+        """Outside auto-monitoring, switch to today's CSV file once it exists"""
+        if self.follow_daily_file and self.csv_poller is None:
+            new_path = self.path_resolver(self.csv_file_path)
+            if new_path:
+                self.switch_csv_file(new_path)
+    
+    def get_csv_read_path(self):
+        """
+        Return the path CSV readers should open for the monitored file.
+        
+        With spooling on, newly appended bytes are first copied to the local
+        mirror and the mirror is read. If the share is unreachable the last
+        good local copy is used; without one the share path is returned.
+        """
+        if not self.use_spool:
+            return self.csv_file_path
+        
+        spool = get_spool_mirror(self.csv_file_path)
+        # One share round trip per cycle: readers within a second reuse the sync
+        if spool.sync(max_age=1.0):
+            return spool.local_path
+        if spool.has_copy():
+            self.log_event(f"CSV share unreachable - using local copy ({spool.last_error})", "WARNING")
+            return spool.local_path
+        return self.csv_file_path
+    
+    def update_unit_index(self):
+        """Add the rows appended since the last cycle to the S/N offset index"""
+        try:
+            get_unit_index(self.get_csv_read_path(), SPOOL_DIR).update()
+        except Exception as e:
+            self.log_event(f"Error updating S/N index: {str(e)}", "ERROR")
+    
+    def recheck_unit(self):
+        """Look up a unit of the current CSV file by S/N or PROCESS S/N and run every material on it"""
+        value = simpledialog.askstring("Re-check Unit", "S/N or PROCESS S/N:", parent=self.root)
+        if not value or not value.strip():
+            return
+        value = value.strip()
+        
+        def recheck_thread():
+            if not self.pipeline_lock.acquire(blocking=False):
+                self.log_event("Processing already in progress - re-check skipped", "WARNING")
+                return
+            try:
+                read_path = self.get_csv_read_path()
+                materials = self.active_baseline_materials()
+                unit_context = (find_unit(read_path, sn=value, index_dir=SPOOL_DIR, materials=materials) or
+                                find_unit(read_path, process_sn=value, index_dir=SPOOL_DIR, materials=materials))
+                if unit_context is None:
+                    self.log_event(f"Unit {value} not found in {os.path.basename(self.csv_file_path)}", "WARNING")
+                    return
+                
+                self.current_unit_context = unit_context
+                self.log_event(f"Re-checking unit - MODEL CODE: {unit_context.model_code}, "
+                               f"PROCESS S/N: {unit_context.process_sn}, S/N: {unit_context.sn}")
+                self.all_deviation_data = self.process_unit_materials(unit_context)
+                self.update_table_display()
+                self.log_event(f"Re-check of unit {value} completed")
+                
+            except Exception as e:
+                self.log_event(f"Error re-checking unit {value}: {str(e)}", "ERROR")
+            finally:
+                self.progress_var.set(0)
+                self.pipeline_lock.release()
+        
+        thread = threading.Thread(target=recheck_thread)
+        thread.daemon = True
+        thread.start()
+    
+    def process_csv_change(self, fingerprint=None):
         """Process CSV file changes automatically"""
         try:
+            switched = self.apply_pending_rotation()
+            
             if not os.path.exists(self.csv_file_path):
                 self.log_event("CSV file no longer exists", "ERROR")
                 return
             
-            # Check if file actually changed using hash
-            current_hash = self.get_file_hash(self.csv_file_path)
-            if current_hash == self.last_csv_hash:
+            # Check if file actually changed using its fingerprint
+            if fingerprint is None or switched:
+                # Triggered by a rotation, or the fingerprint belongs to the previous file
+                fingerprint = self.get_file_fingerprint(self.csv_file_path)
+            current_fingerprint = fingerprint
+            if current_fingerprint == self.last_csv_fingerprint:
                 self.log_event("False alarm - CSV file unchanged")
                 return
             
-            self.last_csv_hash = current_hash
-            self.log_event("CSV file change confirmed - processing new data...")
-            
-            # Read the last row of the CSV file
-            csv_data = self.read_csv_tail()
-            if csv_data is None:
-                return
-            
-            # Update material scripts with new CSV data
-            self.update_material_scripts_csv_path()
-            
-            # Run automatic processing
-            self.auto_process_materials()
+            self.last_csv_fingerprint = current_fingerprint
+            self.process_csv_update()
             
         except Exception as e:
             self.log_event(f"Error processing CSV change: {str(e)}", "ERROR")
     
+    def process_csv_update(self):
+        """Process the rows added to the current CSV file"""
+        self.update_unit_index()
+        
+        if self.streaming_mode.get():
+            self.enqueue_new_units()
+            return
+        
+        self.log_event("CSV file change confirmed - processing new data...")
+        
+        # Read the last row of the CSV file
+        csv_data = self.read_csv_tail()
+        if csv_data is None:
+            return
+        
+        # Update material scripts with new CSV data
+        self.update_material_scripts_csv_path()
+        
+        # Run automatic processing
+        self.auto_process_materials()
+    
     def read_csv_tail(self):
         """Read the last row of the CSV file"""
         try:
-            df = pd.read_csv(self.csv_file_path)
-            if df.empty:
+            # Incremental reader only parses rows appended since the last check
+            read_path = self.get_csv_read_path()
+            reader = get_incremental_reader(read_path, __name__, CSV_TAIL_PROFILE)
+            if reader.columns is None:
+                # First check: take the last row from the end of the file
+                reader.seek_to_end()
+                reader.last_row = locate_last_valid_unit(read_path, end_offset=reader.offset,
+                                                         profile=CSV_TAIL_PROFILE)
+            if reader.read_new_rows() is None:
+                return None
+            if reader.last_row is None:
                 self.log_event("CSV file is empty", "WARNING")
                 return None
             
             # Get the last row
-            last_row = df.tail(1)
+            last_row = reader.last_row
             self.log_event(f"Read CSV tail - Last row contains S/N: {last_row['S/N'].iloc[0] if 'S/N' in last_row.columns else 'N/A'}")
             return last_row
             
@@ -772,39 +1017,75 @@ class MaterialAnomalyGUI:
         except Exception as e:
             self.log_event(f"Error updating material scripts: {str(e)}", "ERROR")
     
+    def process_unit_materials(self, unit_context):
+        """
+        Run every material module for one unit.
+        
+        Returns:
+            Dict of material name to non-empty deviation DataFrame
+        """
+        # Material scripts mapping
+        materials = [
+            ("frame", "Frame"),
+            ("csb_data_output", "CSB"),
+            ("rod_blk_output", "Rod Block"),
+            ("em_material", "EM Material"),
+            ("df_blk_output", "Df Block")
+        ]
+        
+        deviation_data = {}
+        total_materials = len(materials)
+        
+        get_query_log().start_cycle()
+        
+        # The process tables and the database_data baselines only depend on the
+        # unit, so they are fetched side by side. The material modules start on
+        # the process rows (lot and inspection lookups) while the baselines load.
+        # All database work of the unit shares one deadline, so a slow server
+        # delays the stream by at most CYCLE_DEADLINE per unit.
+        with cycle_deadline():
+            unit_queries = self.start_unit_queries(unit_context)
+            self.wait_for_traceability(unit_queries)
+            
+            for i, (script_name, material_name) in enumerate(materials):
+                self.progress_var.set((i / total_materials) * 100)
+                
+                deviation_df = self.run_material_script(script_name, material_name, unit_context)
+                if not deviation_df.empty:
+                    deviation_data[material_name] = deviation_df
+            
+            _, errors = unit_queries.wait()
+        for step, error in errors.items():
+            self.log_event(f"{step} failed: {error}", "WARNING")
+        
+        self.progress_var.set(100)
+        self.log_query_report()
+        return deviation_data
+    
     def auto_process_materials(self):
-        """Automatically process all materials when CSV changes"""
-        def auto_process_thread():
+        """
+        Automatically process all materials when CSV changes.
+        
+        Runs on the change scheduler's worker thread, which keeps it off the
+        GUI thread and allows only one run at a time.
+        """
+        with self.pipeline_lock:
             try:
                 self.log_event("=== AUTOMATIC PROCESSING STARTED ===", "INFO")
                 self.progress_var.set(0)
                 
-                # Material scripts mapping
-                materials = [
-                    ("frame", "Frame"),
-                    ("csb_data_output", "CSB"),
-                    ("rod_blk_output", "Rod Block"),
-                    ("em_material", "EM Material"),
-                    ("df_blk_output", "Df Block")
-                ]
-                
-                auto_deviation_data = {}
-                total_materials = len(materials)
+                # Parse the CSV once and share the unit with every material module
+                unit_context = self.load_unit_context()
+                if unit_context is None:
+                    return
                 
-                for i, (script_name, material_name) in enumerate(materials):
-                    self.progress_var.set((i / total_materials) * 100)
-                    
-                    deviation_df = self.run_material_script(script_name, material_name)
-                    if not deviation_df.empty:
-                        auto_deviation_data[material_name] = deviation_df
-                
-                self.progress_var.set(100)
+                auto_deviation_data = self.process_unit_materials(unit_context)
                 
                 # Create critical deviations log
                 self.create_critical_deviations_log(auto_deviation_data)
                 
-                # Update main data storage
-                self.all_deviation_data.update(auto_deviation_data)
+                # The table shows this unit only; materials without deviations drop out
+                self.all_deviation_data = auto_deviation_data
                 
                 # Update table display
                 self.update_table_display()
@@ -815,11 +1096,151 @@ class MaterialAnomalyGUI:
                 self.log_event(f"Error during automatic processing: {str(e)}", "ERROR")
             finally:
                 self.progress_var.set(0)
+    
+    def toggle_streaming_mode(self):
+        """Start streaming from the units appended after this point"""
+        if self.streaming_mode.get():
+            self.log_event("Streaming mode enabled - every new unit will be checked")
+            # Positions the streaming reader at the end of the file; off the GUI
+            # thread because queueing can wait on a full queue
+            threading.Thread(target=self.enqueue_new_units, daemon=True).start()
+        else:
+            self.log_event(f"Streaming mode disabled - {self.unit_stream.depth()} queued unit(s) will still be processed")
+    
+    def enqueue_new_units(self):
+        """Queue every valid unit appended to the CSV since the last check (streaming mode)"""
+        # Queued units select the same baseline columns as load_unit_context's
+        units = read_new_unit_contexts(self.get_csv_read_path(), from_start=self.csv_path_from_rotation,
+                                       materials=self.active_baseline_materials())
+        if not units:
+            return
         
-        # Run in separate thread
-        thread = threading.Thread(target=auto_process_thread)
-        thread.daemon = True
-        thread.start()
+        self.unit_stream.start()
+        self.log_event(f"Queueing {len(units)} new unit(s), {self.unit_stream.depth()} already waiting")
+        # Blocks while the queue is full, so reading never runs ahead of processing
+        self.unit_stream.put_units(units)
+    
+    def process_unit_batch(self, units):
+        """
+        Process a batch of queued units (streaming mode).
+        
+        Every unit is checked; the critical deviations log is written once per
+        batch and the table shows the last unit of the batch.
+        """
+        with self.pipeline_lock:
+            try:
+                self.log_event(f"=== STREAMING BATCH STARTED: {len(units)} unit(s) ===", "INFO")
+                batch_deviation_data = {}
+                unit_deviation_data = {}
+                
+                for unit_context in units:
+                    self.current_unit_context = unit_context
+                    self.log_event(f"Processing unit - MODEL CODE: {unit_context.model_code}, "
+                                   f"PROCESS S/N: {unit_context.process_sn}, S/N: {unit_context.sn}")
+                    unit_deviation_data = self.process_unit_materials(unit_context)
+                    for material_name, deviation_df in unit_deviation_data.items():
+                        batch_deviation_data.setdefault(material_name, []).append(deviation_df)
+                
+                self.create_critical_deviations_log(
+                    {material_name: pd.concat(frames, ignore_index=True)
+                     for material_name, frames in batch_deviation_data.items()})
+                
+                self.all_deviation_data = unit_deviation_data
+                self.update_table_display()
+                
+                self.log_event(f"=== STREAMING BATCH COMPLETED: {len(units)} unit(s) ===", "INFO")
+                
+            except Exception as e:
+                self.log_event(f"Error during streaming processing: {str(e)}", "ERROR")
+            finally:
+                self.progress_var.set(0)
+    
+    def log_query_report(self):
+        """
+        Log the cycle's round trips and database time per material (slow queries
+        go to slow_queries.log) and any data served from cache while the database
+        was unavailable.
+        """
+        for line in format_cycle_report(get_query_log().cycle_report()):
+            self.log_event(line)
+        for note in take_stale_notes():
+            self.log_event(note, "WARNING")
+    
+    def start_unit_queries(self, unit_context):
+        """
+        Start the queries every material module of the unit shares: the process
+        table rows and the database_data baseline of each module's database.
+        
+        Returns:
+            Started QueryGraph; its 'process tables <database>' steps return UnitTraceability
+        """
+        graph = QueryGraph()
+        traceability_steps = set()
+        baseline_steps = set()
+        for module in (frame, csb_data_output, rod_blk_output, em_material, df_blk_output):
+            config = getattr(module, 'DB_CONFIG', None)
+            if config is None:
+                continue
+            database = config.get('database')
+            step = f"process tables {database}"
+            if step not in traceability_steps:
+                traceability_steps.add(step)
+                graph.add(step, lambda config=config: get_unit_traceability(config, unit_context),
+                          scope="Process tables")
+            # Rod Block excludes its own keyword set; the other modules share one baseline
+            keywords = tuple(getattr(module, 'DATABASE_QUERY_KEYWORDS', BASELINE_KEYWORDS))
+            if unit_context.model_code and (database, keywords) not in baseline_steps:
+                baseline_steps.add((database, keywords))
+                graph.add(f"baseline {database} {module.__name__}",
+                          lambda config=config, keywords=keywords: get_baseline_provider(config, unit_context)
+                          .raw(unit_context.model_code, keywords, BASELINE_LIMIT),
+                          scope="Baselines")
+        return graph.start()
+    
+    def wait_for_traceability(self, unit_queries):
+        """Wait for the unit's process table rows; the baselines keep loading"""
+        for step in unit_queries.steps():
+            if step.startswith("process tables "):
+                traceability = unit_queries.result(step)
+                if traceability is not None:
+                    self.log_event(f"Fetched {traceability.row_count()} process table rows ({step})")
+    
+    def warm_up_db_pools(self):
+        """Open the shared connection pool of every material module's database"""
+        for module in (frame, csb_data_output, rod_blk_output, em_material, df_blk_output):
+            config = getattr(module, 'DB_CONFIG', None)
+            if config is not None:
+                get_pool(config).warm_up()
+    
+    def update_stream_status(self):
+        """Refresh the queue depth and per-unit lag shown under Auto Monitoring"""
+        try:
+            stats = self.unit_stream.stats()
+            last_lag = f"{stats['last_lag']:.1f}s" if stats['last_lag'] is not None else "-"
+            status = (f"Queue: {stats['depth'] + stats['in_flight']} | Lag: {last_lag} "
+                      f"(oldest waiting {stats['oldest_wait']:.1f}s) | Units: {stats['processed']}")
+            spool_behind = False
+            if self.use_spool:
+                poller = self.csv_poller
+                source_size = poller.fingerprint.size if poller is not None and poller.fingerprint else None
+                spool_lag = get_spool_mirror(self.csv_file_path).lag(source_size)
+                if spool_lag['seconds_since_sync'] is not None:
+                    spool_behind = spool_lag['bytes_behind'] > 0 or spool_lag['consecutive_failures'] > 0
+                    status += (f"\nSpool: {spool_lag['bytes_behind']} B behind, "
+                               f"synced {spool_lag['seconds_since_sync']:.0f}s ago")
+            db_unavailable = False
+            for db_stats in pool_stats().values():
+                status += (f"\nDB pool: {db_stats['in_use']}/{db_stats['open']} in use | "
+                           f"{db_stats['checkouts']} checkouts, max wait {db_stats['max_wait']:.2f}s, "
+                           f"{db_stats['reconnects']} reconnects, {db_stats['round_trips']} round trips")
+                if db_stats['circuit'] != 'closed':
+                    db_unavailable = True
+                    status += f" | circuit {db_stats['circuit']}, serving cached data"
+            self.stream_status_label.config(
+                text=status, foreground="orange" if stats['depth'] or spool_behind or db_unavailable else "gray")
+        except Exception as e:
+            logger.error(f"Error updating stream status: {e}")
+        self.root.after(1000, self.update_stream_status)
     
     def create_critical_deviations_log(self, deviation_data):
         """Create Excel log file with critical deviations only"""
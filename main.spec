@@ -5,8 +5,8 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('frame.py', '.'), ('csb_data_output.py', '.'), ('rod_blk_output.py', '.'), ('em_material.py', '.'), ('df_blk_output.py', '.'), ('check_table_schemas.py', '.')],
-    hiddenimports=['frame', 'csb_data_output', 'rod_blk_output', 'em_material', 'df_blk_output', 'check_table_schemas', 'mysql.connector.plugins.caching_sha2_password', 'mysql.connector.plugins.mysql_native_password'],
+    datas=[('frame.py', '.'), ('csb_data_output.py', '.'), ('rod_blk_output.py', '.'), ('em_material.py', '.'), ('df_blk_output.py', '.'), ('check_table_schemas.py', '.'), ('picompiled_reader.py', '.'), ('unit_context.py', '.'), ('keyword_filter.py', '.'), ('csv_monitor.py', '.'), ('change_scheduler.py', '.'), ('unit_stream.py', '.'), ('picompiled_path.py', '.'), ('csv_spool.py', '.'), ('unit_index.py', '.'), ('ingestion_profile.py', '.'), ('db_pool.py', '.'), ('schema_cache.py', '.'), ('process_routing.py', '.'), ('date_canonical.py', '.'), ('unit_traceability.py', '.'), ('baseline_provider.py', '.'), ('inspection_lookup.py', '.'), ('inspection_cache.py', '.'), ('typed_fetch.py', '.'), ('query_log.py', '.'), ('query_fanout.py', '.'), ('db_health.py', '.'), ('registry.py', '.')],
+    hiddenimports=['frame', 'csb_data_output', 'rod_blk_output', 'em_material', 'df_blk_output', 'check_table_schemas', 'picompiled_reader', 'unit_context', 'keyword_filter', 'csv_monitor', 'change_scheduler', 'unit_stream', 'picompiled_path', 'csv_spool', 'unit_index', 'ingestion_profile', 'db_pool', 'schema_cache', 'process_routing', 'date_canonical', 'unit_traceability', 'baseline_provider', 'inspection_lookup', 'inspection_cache', 'typed_fetch', 'query_log', 'query_fanout', 'db_health', 'registry', 'mysql.connector.plugins.caching_sha2_password', 'mysql.connector.plugins.mysql_native_password'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -23,7 +23,6 @@ a = Analysis(
         'openpyxl',
         'sqlalchemy',
         'mysql.connector',
-        'watchdog',
         'tkinter',
         'threading',
         'hashlib',
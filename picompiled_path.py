@@ -0,0 +1,64 @@
+#%%
+import os
+import time
+import logging
+import datetime
+
+logger = logging.getLogger(__name__)
+
+# Share the PI machines write their daily compiled CSV to
+PICOMPILED_DIR = r"\\192.168.2.19\ai_team\AI Program\Outputs\PICompiled"
+
+# Seconds between checks for the next day's file once the date has changed
+ROTATION_CHECK_INTERVAL = 30.0
+
+
+def picompiled_filename(day=None):
+    """Return the PICompiled{YYYY-MM-DD}.csv file name for day (default: today)"""
+    day = day or datetime.datetime.now()
+    return f"PICompiled{day.strftime('%Y-%m-%d')}.csv"
+
+
+def picompiled_path(day=None, directory=PICOMPILED_DIR):
+    """Return the full path of the PICompiled CSV for day (default: today)"""
+    return os.path.join(directory, picompiled_filename(day))
+
+
+class DailyPathResolver:
+    """
+    Follows the daily PICompiled{YYYY-MM-DD}.csv naming: returns the next day's path
+    once it exists, or None to keep reading the current file.
+
+    Args:
+        directory: Directory holding the daily files
+        clock: Callable returning the current datetime
+        check_interval: Seconds between existence checks for the next file
+    """
+
+    def __init__(self, directory=PICOMPILED_DIR, clock=datetime.datetime.now,
+                 check_interval=ROTATION_CHECK_INTERVAL):
+        self.directory = directory
+        self.clock = clock
+        self.check_interval = check_interval
+        self._last_check = None
+
+    def expected_path(self):
+        """Path of the file for the current date"""
+        return picompiled_path(self.clock(), self.directory)
+
+    def __call__(self, current_path):
+        expected = self.expected_path()
+        if os.path.normcase(expected) == os.path.normcase(current_path):
+            self._last_check = None
+            return None
+
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return None
+        self._last_check = now
+
+        if not os.path.exists(expected):
+            logger.debug(f"Waiting for {os.path.basename(expected)} to appear")
+            return None
+        self._last_check = None
+        return expected
@@ -0,0 +1,399 @@
+#%%
+import io
+import os
+import logging
+import threading
+import pandas as pd
+from ingestion_profile import clean_model_code
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes kept from just before the consumed offset. If these bytes
+# change between passes the file was replaced rather than appended to.
+ANCHOR_SIZE = 256
+
+# Block size used when scanning a file backwards from EOF
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+# Columns every material module needs from the CSV
+UNIT_COLUMNS = ['DATE', 'MODEL CODE', 'PROCESS S/N', 'S/N']
+
+
+def parse_lines(columns, data, base_offset, encoding='utf-8', profile=None):
+    """
+    Parse complete CSV lines using the already parsed header columns.
+
+    Args:
+        columns: Column names from the file's header line
+        data: Complete lines (ending in a newline) read from the file
+        base_offset: Byte offset of data within the file
+        profile: Optional IngestionProfile selecting columns, dtypes and
+                 lines to drop before parsing (default: every column, inferred)
+
+    Returns:
+        DataFrame indexed by the byte offset of each row's line in the file
+    """
+    offsets = []
+    lines = []
+    position = base_offset
+    for line in data.split(b'\n')[:-1]:
+        if line.strip():
+            offsets.append(position)
+            lines.append(line)
+        position += len(line) + 1
+
+    if profile is not None:
+        lines, offsets = profile.filter_lines(lines, offsets)
+    if not lines:
+        return pd.DataFrame(columns=columns if profile is None else profile.output_columns(columns))
+
+    data = b'\n'.join(lines) + b'\n'
+    if profile is not None:
+        rows = profile.read(data, columns, encoding)
+    else:
+        rows = pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding=encoding)
+    if len(rows) == len(offsets):
+        rows.index = pd.Index(offsets, name='byte_offset')
+    else:
+        # Quoted fields spanning lines; offsets cannot be matched to rows
+        logger.warning(f"Parsed {len(rows)} rows from {len(offsets)} lines, byte offsets unavailable")
+    return rows
+
+
+class IncrementalCSVReader:
+    """
+    Append-only reader for a PICompiled CSV file: each read_new_rows() parses only
+    the complete lines appended since the previous call, re-reading a replaced file.
+    """
+
+    def __init__(self, file_path, encoding='utf-8', profile=None):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.profile = profile
+        self._lock = threading.RLock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self.header_bytes = b''
+        self.columns = None
+        self.offset = 0
+        self.rows_read = 0
+        self.last_row = None
+        self.was_reset = False
+        # Values derived from the rows of the current file generation. Cleared
+        # whenever the file is truncated or replaced.
+        self.state = {}
+        self._anchor = b''
+
+    def reset(self):
+        """Forget everything read so far; the next pass re-reads the whole file."""
+        with self._lock:
+            self._reset_state()
+
+    def _file_was_replaced(self, handle, size):
+        """Check whether the file on disk is still the one we were reading"""
+        if size < self.offset:
+            logger.info(f"{self.file_path} shrank from {self.offset} to {size} bytes, re-reading")
+            return True
+
+        handle.seek(0)
+        if handle.read(len(self.header_bytes)) != self.header_bytes:
+            logger.info(f"{self.file_path} header changed, re-reading")
+            return True
+
+        if self._anchor:
+            handle.seek(self.offset - len(self._anchor))
+            if handle.read(len(self._anchor)) != self._anchor:
+                logger.info(f"{self.file_path} content before offset {self.offset} changed, re-reading")
+                return True
+
+        return False
+
+    def _read_header(self, handle):
+        """Read and remember the header line. Returns False if it is not complete yet."""
+        handle.seek(0)
+        first_line = handle.readline()
+        if not first_line.endswith(b'\n'):
+            return False
+
+        self.header_bytes = first_line
+        self.columns = list(pd.read_csv(io.BytesIO(first_line), nrows=0, encoding=self.encoding).columns)
+        self.offset = len(first_line)
+        self._anchor = first_line[-ANCHOR_SIZE:]
+        return True
+
+    def seek_to_end(self):
+        """
+        Start reading at the current end of the file without parsing what is
+        already there. Only rows appended after this call are returned by
+        read_new_rows().
+
+        Returns:
+            The byte offset reading will continue from, or None if the file
+            has no complete header yet
+        """
+        return self.seek_to(None)
+
+    def seek_to(self, offset):
+        """
+        Continue reading at offset without parsing anything before it, e.g.
+        where an earlier run stopped. offset must be the start of a line.
+
+        Args:
+            offset: Byte offset to continue from, or None for the end of the
+                    last complete line
+
+        Returns:
+            The byte offset reading will continue from, or None if the file
+            has no complete header yet or offset is outside the file
+        """
+        with self._lock:
+            self._reset_state()
+            try:
+                with open(self.file_path, 'rb') as handle:
+                    if not self._read_header(handle):
+                        self._reset_state()
+                        return None
+                    size = os.fstat(handle.fileno()).st_size
+                    if offset is None:
+                        offset = find_last_line_end(handle, size, self.offset)
+                    elif not self.offset <= offset <= size:
+                        self._reset_state()
+                        return None
+                    self.offset = offset
+                    handle.seek(self.offset - ANCHOR_SIZE if self.offset > ANCHOR_SIZE else 0)
+                    self._anchor = handle.read(min(self.offset, ANCHOR_SIZE))
+            except OSError as e:
+                logger.error(f"Error reading {self.file_path}: {e}")
+                self._reset_state()
+                return None
+            return self.offset
+
+    def _empty_frame(self):
+        columns = self.columns if self.profile is None else self.profile.output_columns(self.columns)
+        return pd.DataFrame(columns=columns)
+
+    def read_new_rows(self):
+        """
+        Parse the rows appended since the previous call.
+
+        Returns:
+            DataFrame with the new complete rows (possibly empty), indexed by
+            the byte offset of each row's line in the file. Returns None if
+            the file cannot be read.
+        """
+        with self._lock:
+            self.was_reset = False
+            try:
+                with open(self.file_path, 'rb') as handle:
+                    size = os.fstat(handle.fileno()).st_size
+
+                    if self.columns is not None and self._file_was_replaced(handle, size):
+                        self._reset_state()
+                        self.was_reset = True
+
+                    if self.columns is None:
+                        if not self._read_header(handle):
+                            return pd.DataFrame()
+                        # Whole-file read: anything derived earlier no longer applies
+                        self.was_reset = True
+
+                    if size <= self.offset:
+                        return self._empty_frame()
+
+                    handle.seek(self.offset)
+                    new_bytes = handle.read(size - self.offset)
+            except OSError as e:
+                logger.error(f"Error reading {self.file_path}: {e}")
+                return None
+
+            # Only consume up to the last newline; the rest is a line still being written
+            last_newline = new_bytes.rfind(b'\n')
+            if last_newline < 0:
+                return self._empty_frame()
+            complete = new_bytes[:last_newline + 1]
+
+            new_rows = parse_lines(self.columns, complete, self.offset, self.encoding, self.profile)
+
+            self.offset += len(complete)
+            self.rows_read += len(new_rows)
+            self._anchor = (self._anchor + complete)[-ANCHOR_SIZE:]
+            if not new_rows.empty:
+                self.last_row = new_rows.tail(1)
+
+            logger.debug(f"Parsed {len(new_rows)} new rows from {self.file_path} (offset {self.offset})")
+            return new_rows
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_incremental_reader(file_path, consumer='default', profile=None):
+    """
+    Return the IncrementalCSVReader for file_path, creating it on first use.
+
+    Each consumer gets its own reader so that rows handed to one module are
+    still delivered to the others.
+
+    Args:
+        file_path: Path of the CSV file to read
+        consumer: Name of the reading module (usually __name__)
+        profile: IngestionProfile for a newly created reader
+    """
+    key = (os.path.normcase(os.path.abspath(file_path)), consumer)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is None:
+            reader = IncrementalCSVReader(file_path, profile=profile)
+            _readers[key] = reader
+        return reader
+
+
+def release_readers(file_path):
+    """
+    Drop every consumer's reader for file_path, e.g. once the previous day's
+    file has been fully processed. Readers of other files are kept.
+
+    Returns:
+        Number of readers released
+    """
+    path_key = os.path.normcase(os.path.abspath(file_path))
+    with _readers_lock:
+        keys = [key for key in _readers if key[0] == path_key]
+        for key in keys:
+            del _readers[key]
+    _header_cache.pop(file_path, None)
+    return len(keys)
+
+
+def find_last_line_end(handle, end, floor, block_size=REVERSE_BLOCK_SIZE):
+    """
+    Return the offset just after the last newline before end (but not before floor).
+    Anything after it is a line that is still being written.
+    """
+    position = end
+    while position > floor:
+        start = max(floor, position - block_size)
+        handle.seek(start)
+        block = handle.read(position - start)
+        newline = block.rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        position = start
+    return floor
+
+
+_header_cache = {}
+
+
+def _cached_columns(file_path, header_bytes, encoding):
+    """Parse a file's header once and reuse it while the header line is unchanged"""
+    cached = _header_cache.get(file_path)
+    if cached is None or cached[0] != header_bytes:
+        columns = list(pd.read_csv(io.BytesIO(header_bytes), nrows=0, encoding=encoding).columns)
+        cached = (header_bytes, columns)
+        _header_cache[file_path] = cached
+    return cached[1]
+
+
+def locate_last_valid_unit(file_path, row_filter=None, end_offset=None,
+                           block_size=REVERSE_BLOCK_SIZE, encoding='utf-8', profile=None):
+    """
+    Find the last row of a PICompiled CSV that survives row_filter by reading
+    the file backwards from EOF in blocks. Only the blocks between the end of
+    the file and that row are read and parsed.
+
+    Args:
+        file_path: Path of the PICompiled CSV file
+        row_filter: KeywordFilter deciding which rows are valid units (None keeps every row)
+        end_offset: Only consider lines that end before this byte offset (default: EOF)
+        block_size: Number of bytes read per step
+        profile: Optional IngestionProfile used to parse each block
+
+    Returns:
+        One-row DataFrame with DATE, MODEL CODE, PROCESS S/N and S/N, indexed
+        by the byte offset of the row, or None if no valid row was found
+    """
+    try:
+        with open(file_path, 'rb') as handle:
+            handle.seek(0)
+            header_bytes = handle.readline()
+            if not header_bytes.endswith(b'\n'):
+                return None
+            columns = _cached_columns(file_path, header_bytes, encoding)
+
+            size = os.fstat(handle.fileno()).st_size
+            end = size if end_offset is None else min(end_offset, size)
+            floor = len(header_bytes)
+            position = find_last_line_end(handle, end, floor, block_size)
+
+            carry = b''
+            blocks_read = 0
+            while position > floor:
+                start = max(floor, position - block_size)
+                handle.seek(start)
+                block = handle.read(position - start) + carry
+                position = start
+                blocks_read += 1
+
+                if start > floor:
+                    # The first line of the block may begin in the previous block
+                    first_newline = block.find(b'\n')
+                    if first_newline < 0:
+                        carry = block
+                        continue
+                    carry = block[:first_newline + 1]
+                    lines = block[first_newline + 1:]
+                    lines_offset = start + first_newline + 1
+                else:
+                    carry = b''
+                    lines = block
+                    lines_offset = start
+
+                if not lines:
+                    continue
+
+                rows = parse_lines(columns, lines, lines_offset, encoding, profile)
+                if rows.empty:
+                    continue
+                rows["MODEL CODE"] = clean_model_code(rows["MODEL CODE"])
+                if row_filter is not None:
+                    rows = row_filter.filter_rows(rows)
+                if not rows.empty:
+                    logger.debug(f"Located last valid unit in {file_path} after {blocks_read} block(s)")
+                    return rows[UNIT_COLUMNS].tail(1)
+
+    except OSError as e:
+        logger.error(f"Error reading {file_path}: {e}")
+    return None
+
+
+def read_row_at(file_path, offset, encoding='utf-8', profile=None):
+    """
+    Parse the single row whose line starts at offset, with one seek.
+
+    Args:
+        file_path: Path of the PICompiled CSV file
+        offset: Byte offset of the row's line (as found in the byte_offset index)
+
+    Returns:
+        One-row DataFrame indexed by offset, or None if there is no complete
+        row at offset
+    """
+    try:
+        with open(file_path, 'rb') as handle:
+            header_bytes = handle.readline()
+            if not header_bytes.endswith(b'\n') or offset < len(header_bytes):
+                return None
+            columns = _cached_columns(file_path, header_bytes, encoding)
+            handle.seek(offset)
+            line = handle.readline()
+    except OSError as e:
+        logger.error(f"Error reading {file_path}: {e}")
+        return None
+
+    if not line.endswith(b'\n'):
+        return None
+    row = parse_lines(columns, line, offset, encoding, profile)
+    return row if len(row) == 1 else None
@@ -0,0 +1,111 @@
+#%%
+import logging
+import threading
+from collections import namedtuple
+from schema_cache import get_schema_cache
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# process1_data .. process6_data
+PROCESS_NUMBERS = range(1, 7)
+
+
+def process_table(process_num):
+    return f"process{process_num}_data"
+
+
+def _standard_column(process_num, material):
+    return f"Process_{process_num}_{material}"
+
+
+# Material column naming used by the process tables
+STANDARD_PATTERNS = (_standard_column,)
+
+# Casing block column names seen in the process tables, tried in order
+CASING_COLUMN_PATTERNS = (
+    # Try exact match first
+    lambda n, m: f"Process_{n}_{m}",
+    # Try with space instead of underscore
+    lambda n, m: f"Process {n} {m}",
+    # Try with different case
+    lambda n, m: f"PROCESS_{n}_{m.upper()}",
+    # Try with different separators
+    lambda n, m: f"Process-{n}-{m}",
+    # Try with different naming conventions
+    lambda n, m: f"P{n}_{m}",
+    lambda n, m: f"P{n}_{m.replace('_', '')}",
+)
+
+# Where a material's code and lot columns live; lot_column is None if the table has none
+ProcessRoute = namedtuple('ProcessRoute', ['process_num', 'table', 'material_column', 'lot_column'])
+
+
+class ProcessTableRouter:
+    """
+    Index of which process{N}_data tables hold each material's code and lot columns,
+    derived from the schema cache.
+
+    Args:
+        schema: SchemaCache of the process tables' database
+        process_numbers: Process tables to consider
+    """
+
+    def __init__(self, schema, process_numbers=PROCESS_NUMBERS):
+        self.schema = schema
+        self.process_numbers = list(process_numbers)
+        self._routes = {}
+        self._layout = None
+        self._lock = threading.Lock()
+
+    def _current_layout(self):
+        return tuple(self.schema.column_hash(process_table(n)) for n in self.process_numbers)
+
+    def routes(self, material, patterns=STANDARD_PATTERNS):
+        """
+        Return the ProcessRoutes of material, in process order.
+
+        Args:
+            material: Material name as used in the column names (e.g. 'Frame', 'Em2p')
+            patterns: Functions (process_num, material) -> column name, tried in order
+        """
+        layout = self._current_layout()
+        with self._lock:
+            if layout != self._layout:
+                if self._layout is not None:
+                    logger.info("Process table layout changed, rebuilding material routes")
+                self._routes = {}
+                self._layout = layout
+            key = (material, tuple(patterns))
+            routes = self._routes.get(key)
+            if routes is None:
+                routes = self._build(material, patterns)
+                self._routes[key] = routes
+                logger.debug(f"{material} routed to {[route.table for route in routes]}")
+            return routes
+
+    def _build(self, material, patterns):
+        routes = []
+        for process_num in self.process_numbers:
+            table = process_table(process_num)
+            for pattern in patterns:
+                column = pattern(process_num, material)
+                if self.schema.has_column(table, column):
+                    lot_column = f"{column}_Lot_No"
+                    routes.append(ProcessRoute(process_num, table, column,
+                                               lot_column if self.schema.has_column(table, lot_column) else None))
+                    break
+        return routes
+
+    def process_numbers_for(self, materials, patterns=STANDARD_PATTERNS):
+        """Process numbers of the tables holding any of materials, in process order"""
+        numbers = {route.process_num for material in materials for route in self.routes(material, patterns)}
+        return sorted(numbers)
+
+
+_routers = KeyedRegistry(lambda config: ProcessTableRouter(get_schema_cache(config)))
+
+
+def get_process_router(config):
+    """Return the shared ProcessTableRouter for config's database"""
+    return _routers.get(config)
@@ -0,0 +1,194 @@
+#%%
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from db_pool import POOL_SIZE
+from query_log import get_query_log, query_scope
+from db_health import current_deadline, deadline_at
+
+logger = logging.getLogger(__name__)
+
+# Threads running graph steps; each step checks out its own pooled connection.
+# One connection stays free for the thread that started the graph (the material
+# modules) and for lookups a step makes while it holds its own
+FANOUT_WORKERS = max(1, POOL_SIZE - 1)
+
+
+class DependencyError(Exception):
+    """A step was not run because a step it depends on failed"""
+
+
+class _Step:
+    def __init__(self, name, function, depends_on, scope, deadline):
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+        self.scope = scope
+        self.deadline = deadline
+        self.future = Future()
+        self.started_at = None
+        self.finished_at = None
+
+
+class QueryGraph:
+    """
+    Runs query steps concurrently, each as soon as the steps in its depends_on have
+    finished; steps must not wait on other steps themselves.
+
+    Args:
+        executor: Executor running the steps (default: the shared fan-out pool)
+    """
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._steps = {}
+        self._dependents = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self.started_at = None
+
+    def add(self, name, function, depends_on=(), scope=None):
+        """
+        Add a step; returns self so steps can be chained.
+
+        Args:
+            name: Unique step name, used by depends_on and result()
+            function: Callable run with the results of depends_on
+            depends_on: Names of steps added before this one
+            scope: QueryLog scope of the step's queries (default: the caller's current scope)
+        """
+        if self._started:
+            raise RuntimeError("Steps cannot be added after start()")
+        if name in self._steps:
+            raise ValueError(f"Duplicate step {name}")
+        for dependency in depends_on:
+            if dependency not in self._steps:
+                raise ValueError(f"Step {name} depends on unknown step {dependency}")
+            self._dependents.setdefault(dependency, []).append(name)
+        scope = scope if scope is not None else get_query_log().current_scope()
+        self._steps[name] = _Step(name, function, depends_on, scope, current_deadline())
+        return self
+
+    def start(self):
+        """Submit every step without dependencies; the others follow as their inputs finish"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            self.started_at = time.monotonic()
+        for step in list(self._steps.values()):
+            if not step.depends_on:
+                self._submit(step)
+        return self
+
+    def _submit(self, step):
+        executor = self._executor or _get_executor()
+        executor.submit(self._run, step)
+
+    def _run(self, step):
+        step.started_at = time.monotonic()
+        try:
+            inputs = [self._steps[dependency].future.result() for dependency in step.depends_on]
+            with query_scope(step.scope), deadline_at(step.deadline):
+                result = step.function(*inputs)
+        except BaseException as e:
+            step.finished_at = time.monotonic()
+            step.future.set_exception(e)
+        else:
+            step.finished_at = time.monotonic()
+            step.future.set_result(result)
+        self._release_dependents(step)
+
+    def _release_dependents(self, step):
+        for name in self._dependents.get(step.name, []):
+            dependent = self._steps[name]
+            futures = [self._steps[dependency].future for dependency in dependent.depends_on]
+            with self._lock:
+                # Only the last finishing dependency releases the step
+                if not all(future.done() for future in futures) or dependent.started_at is not None:
+                    continue
+                dependent.started_at = time.monotonic()
+            failed = [dependency for dependency, future in zip(dependent.depends_on, futures)
+                      if future.exception() is not None]
+            if failed:
+                dependent.finished_at = dependent.started_at
+                dependent.future.set_exception(DependencyError(f"{name} skipped, {', '.join(failed)} failed"))
+                self._release_dependents(dependent)
+            else:
+                self._submit(dependent)
+
+    def steps(self):
+        """Step names in the order they were added"""
+        return list(self._steps)
+
+    def result(self, name, timeout=None):
+        """Wait for a step and return its result, raising its exception if it failed"""
+        self.start()
+        return self._steps[name].future.result(timeout)
+
+    def wait(self, timeout=None):
+        """
+        Wait for every step.
+
+        Returns:
+            (dict of step name to result, dict of step name to exception) of the finished steps
+        """
+        self.start()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        results, errors = {}, {}
+        for name, step in self._steps.items():
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            try:
+                results[name] = step.future.result(remaining)
+            except Exception as e:
+                errors[name] = e
+        return results, errors
+
+    def stats(self):
+        """
+        Seconds each finished step ran, their sum (the time a sequential run
+        would take) and the wall time from start() to the last finished step.
+        """
+        steps = {name: step.finished_at - step.started_at for name, step in self._steps.items()
+                 if step.finished_at is not None}
+        finished = [step.finished_at for step in self._steps.values() if step.finished_at is not None]
+        return {
+            'steps': steps,
+            'serial_time': sum(steps.values()),
+            'wall_time': max(finished) - self.started_at if finished and self.started_at is not None else 0.0,
+        }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="query-fanout")
+        return _executor
+
+
+def run_concurrently(steps, executor=None):
+    """
+    Run independent steps side by side and wait for all of them.
+
+    Args:
+        steps: Dict of step name to callable without arguments
+
+    Returns:
+        Dict of step name to result
+
+    Raises:
+        The exception of the first failing step, after every step finished
+    """
+    graph = QueryGraph(executor)
+    for name, function in steps.items():
+        graph.add(name, function)
+    results, errors = graph.wait()
+    if errors:
+        raise next(iter(errors.values()))
+    return results
@@ -0,0 +1,227 @@
+#%%
+import os
+import re
+import sys
+import time
+import logging
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Queries taking longer than this (execute plus fetch) are appended to the slow-query log
+SLOW_QUERY_SECONDS = 0.5
+
+# Tab separated slow-query log, next to material_anomaly.log
+SLOW_QUERY_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow_queries.log')
+
+# Finished queries kept in memory for inspection
+RECENT_QUERIES = 2000
+
+# Longest parameter text kept per query
+MAX_PARAMS_LENGTH = 200
+
+# Modules skipped when looking for the code that sent a query
+INFRASTRUCTURE_MODULES = {'db_pool', 'typed_fetch', __name__}
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    SQL with literals and placeholders replaced by ?, so the same statement
+    with other values (or another number of IN values) groups together.
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    text = _STRING_LITERAL.sub('?', str(sql))
+    text = text.replace('%s', '?')
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('(?+)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _row_bytes(row):
+    """Approximate size of a result row: text and binary lengths, 8 bytes for anything else"""
+    values = row.values() if isinstance(row, dict) else row
+    return sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+               for value in values if value is not None)
+
+
+def _caller():
+    """'module.function' of the nearest frame outside the database layer"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        if module not in INFRASTRUCTURE_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+
+class QueryRecord:
+    """One statement: where it came from, what it sent and what it cost"""
+
+    def __init__(self, sql, params, database, caller, scope):
+        self.started_at = time.time()
+        self.fingerprint = fingerprint(sql)
+        self.params = repr(params)[:MAX_PARAMS_LENGTH] if params is not None else ''
+        self.database = database
+        self.caller = caller
+        self.scope = scope
+        self.duration = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.finished = False
+
+    def add(self, duration, rows=None):
+        """Account a call on the cursor (execute or a fetch) and the rows it returned"""
+        self.duration += duration
+        if rows:
+            self.rows += len(rows)
+            self.bytes += sum(_row_bytes(row) for row in rows)
+
+
+class QueryLog:
+    """
+    Records every statement run through the pooled connections, grouped per cycle and
+    scope, and appends slow ones to the slow-query log.
+
+    Args:
+        slow_threshold: Seconds after which a query is logged as slow
+        slow_log_path: Slow-query log file; None disables it
+        capacity: Finished records kept in recent
+    """
+
+    def __init__(self, slow_threshold=SLOW_QUERY_SECONDS, slow_log_path=SLOW_QUERY_LOG, capacity=RECENT_QUERIES):
+        self.slow_threshold = slow_threshold
+        self.slow_log_path = slow_log_path
+        self.recent = deque(maxlen=capacity)
+        self._cycle = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.queries = 0
+        self.slow_queries = 0
+        self.total_time = 0.0
+
+    @contextmanager
+    def scope(self, name):
+        """Attribute the queries of the calling thread to name while the block runs"""
+        previous = getattr(self._local, 'scope', None)
+        self._local.scope = name
+        try:
+            yield
+        finally:
+            self._local.scope = previous
+
+    def current_scope(self):
+        """Scope of the calling thread, or None"""
+        return getattr(self._local, 'scope', None)
+
+    def begin(self, sql, params=None, database=None):
+        """Open a record for a statement about to be executed"""
+        return QueryRecord(sql, params, database, _caller(), self.current_scope())
+
+    def finish(self, record):
+        """Close a record; safe to call more than once"""
+        if record.finished:
+            return
+        record.finished = True
+        with self._lock:
+            self.recent.append(record)
+            self._cycle.append(record)
+            self.queries += 1
+            self.total_time += record.duration
+        if record.duration >= self.slow_threshold:
+            with self._lock:
+                self.slow_queries += 1
+            self._log_slow(record)
+
+    def _log_slow(self, record):
+        if not self.slow_log_path:
+            return
+        started = datetime.datetime.fromtimestamp(record.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        line = '\t'.join([started, f"{record.duration:.3f}s", f"{record.rows} rows", f"{record.bytes} B",
+                          record.caller, record.scope or '-', record.database or '-', record.fingerprint,
+                          record.params])
+        try:
+            with self._lock, open(self.slow_log_path, 'a', encoding='utf-8') as handle:
+                handle.write(line + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write slow-query log {self.slow_log_path}: {e}")
+
+    def start_cycle(self):
+        """Begin a new processing cycle; cycle_report() covers the queries from here on"""
+        with self._lock:
+            self._cycle = []
+
+    def cycle_report(self, top=5):
+        """
+        Summary of the queries finished since start_cycle().
+
+        Returns:
+            Dict with round_trips, db_time, rows and bytes of the cycle, scopes
+            ({scope: {'queries', 'time', 'rows'}}, unscoped queries under their
+            calling module) and slowest (the top fingerprints by total time as
+            (fingerprint, count, time) tuples)
+        """
+        with self._lock:
+            records = list(self._cycle)
+        scopes = {}
+        fingerprints = {}
+        for record in records:
+            scope = scopes.setdefault(record.scope or record.caller.split('.')[0],
+                                      {'queries': 0, 'time': 0.0, 'rows': 0})
+            scope['queries'] += 1
+            scope['time'] += record.duration
+            scope['rows'] += record.rows
+            count, total = fingerprints.get(record.fingerprint, (0, 0.0))
+            fingerprints[record.fingerprint] = (count + 1, total + record.duration)
+        slowest = sorted(((sql, count, total) for sql, (count, total) in fingerprints.items()),
+                         key=lambda item: item[2], reverse=True)[:top]
+        return {
+            'round_trips': len(records),
+            'db_time': sum(record.duration for record in records),
+            'rows': sum(record.rows for record in records),
+            'bytes': sum(record.bytes for record in records),
+            'scopes': scopes,
+            'slowest': slowest,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queries': self.queries,
+                'slow_queries': self.slow_queries,
+                'total_time': self.total_time,
+            }
+
+
+def format_cycle_report(report):
+    """cycle_report() as log lines"""
+    lines = [f"Database: {report['round_trips']} round trips, {report['db_time']:.2f}s, "
+             f"{report['rows']} rows, ~{report['bytes'] / 1024:.0f} KB"]
+    for scope, totals in report['scopes'].items():
+        lines.append(f"  {scope}: {totals['queries']} queries, {totals['time']:.2f}s, {totals['rows']} rows")
+    for sql, count, total in report['slowest']:
+        lines.append(f"  {total:.2f}s in {count}x {sql[:120]}")
+    return lines
+
+
+_query_log = QueryLog()
+
+
+def get_query_log():
+    """The QueryLog shared by every pooled connection"""
+    return _query_log
+
+
+def query_scope(name):
+    """Attribute the calling thread's queries to name; see QueryLog.scope"""
+    return _query_log.scope(name)
@@ -0,0 +1,43 @@
+#%%
+import threading
+
+
+def database_key(config):
+    """(host, database) of a DB_CONFIG dict; the per-database singletons are keyed by it"""
+    return (config.get('host'), config.get('database'))
+
+
+def get_or_create(instances, lock, key, factory):
+    """Return instances[key], storing factory() there first if it is missing"""
+    with lock:
+        instance = instances.get(key)
+        if instance is None:
+            instance = factory()
+            instances[key] = instance
+        return instance
+
+
+class KeyedRegistry:
+    """
+    One shared instance per database, created by factory(config, *args) on first use.
+
+    Args:
+        factory: Callable building the instance for a config
+        key: Function mapping a config to its registry key (default: database_key)
+    """
+
+    def __init__(self, factory, key=database_key):
+        self._factory = factory
+        self._key = key
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, config, *args):
+        """Return the instance for config; args only apply when it is created"""
+        return get_or_create(self._instances, self._lock, self._key(config),
+                             lambda: self._factory(config, *args))
+
+    def values(self):
+        """Every instance created so far"""
+        with self._lock:
+            return list(self._instances.values())
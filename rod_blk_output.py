@@ -5,6 +5,19 @@ from sqlalchemy import create_engine
 import mysql.connector
 import re
 import datetime
+from picompiled_reader import get_incremental_reader, UNIT_COLUMNS
+from unit_context import UnitContext, prime_reader_from_tail, UNIT_DTYPES
+from keyword_filter import KeywordFilter
+from picompiled_path import picompiled_path
+from ingestion_profile import IngestionProfile, clean_model_code
+from db_pool import get_connection
+from baseline_provider import BaselineProvider, get_baseline_provider
+from schema_cache import get_schema_cache
+from inspection_cache import get_inspection_cache
+from inspection_lookup import lot_key, rows_complete
+from typed_fetch import fetch_frame, frame_from_rows
+from date_canonical import date_condition, retry_date_formats
+from unit_traceability import get_unit_traceability, DATED
 
 x = datetime.datetime.now()
 
@@ -95,29 +108,40 @@ material_patterns = {
     }
 }
 
+# Keyword row filter for the PICompiled CSV
+CSV_ROW_FILTER = KeywordFilter(['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI'])
+# Parse only the unit columns; keyword lines are dropped before parsing
+CSV_PROFILE = IngestionProfile(UNIT_COLUMNS, UNIT_DTYPES, line_filter=CSV_ROW_FILTER)
+# NG_Cause keywords left out of the database_data baseline (narrower than the other modules' list)
+DATABASE_QUERY_KEYWORDS = ('NG PRESSURE', 'REPAIRED AT', 'RE PI', 'MASTER PUMP', 'NG AT', 'INSPECTION ONLY')
+# database_data material columns this module's deviation step reads
+BASELINE_MATERIALS = ('Rod_Blk',)
+
 def read_csv_with_pandas(file_path):
 
     try:
-        piCompiled = pd.read_csv(file_path)
-        piCompiled["MODEL CODE"]= piCompiled["MODEL CODE"].astype(str).str.replace('"', '', regex=False)
-        
-        # Filter out rows containing specific keywords
-        keywords_to_remove = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI']
-        print(f"Original CSV rows: {len(piCompiled)}")
-        
-        # Create a mask to filter out rows containing any of the keywords in any column
-        mask = pd.Series([True] * len(piCompiled))
-        for keyword in keywords_to_remove:
-            for col in piCompiled.columns:
-                if piCompiled[col].dtype == 'object':  # Only check string columns
-                    mask = mask & (~piCompiled[col].astype(str).str.contains(keyword, case=False, na=False))
+        # Only the rows appended since the previous cycle are parsed
+        reader = get_incremental_reader(file_path, __name__, CSV_PROFILE)
+        if reader.columns is None:
+            # First pass: locate the latest valid unit from the end of the file
+            prime_reader_from_tail(reader, CSV_ROW_FILTER)
+        piCompiled = reader.read_new_rows()
+        if piCompiled is None or reader.columns is None:
+            print(f"CSV not readable yet: {file_path}")
+            return None
+        piCompiled["MODEL CODE"]= clean_model_code(piCompiled["MODEL CODE"])
         
-        piCompiled_filtered = piCompiled[mask]
-        print(f"Filtered CSV rows: {len(piCompiled_filtered)} (removed {len(piCompiled) - len(piCompiled_filtered)} rows)")
+        # Rows containing specific keywords were dropped by CSV_PROFILE before parsing
+        keywords_to_remove = CSV_ROW_FILTER.keywords
+        piCompiled_filtered = piCompiled
+        print(f"New filtered CSV rows: {len(piCompiled_filtered)} (total rows kept: {reader.rows_read})")
         print(f"Keywords filtered: {keywords_to_remove}")
         
-        # Take the last row after filtering
-        piCompiled_final = piCompiled_filtered.tail(1)
+        # Remember the last row that survived filtering; if nothing new survived,
+        # the last valid unit from an earlier pass is still the latest one
+        if not piCompiled_filtered.empty:
+            reader.state['last_valid_row'] = piCompiled_filtered.tail(1)
+        piCompiled_final = reader.state.get('last_valid_row', piCompiled_filtered.tail(1))
         print("CSV successfully loaded and filtered!")
         
         # Include S/N column in the return
@@ -129,7 +153,7 @@ def read_csv_with_pandas(file_path):
 def create_db_connection():
     """Create database connection using the DB_CONFIG"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         print("Database connection established successfully!")
         return connection
     except Exception as e:
@@ -137,22 +161,11 @@ def create_db_connection():
         return None
 
 def check_table_structure(table_name):
-    """Check the structure of a table to see available columns"""
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
+    """Check the structure of a table to see available columns (served from the schema cache)"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(f"DESCRIBE {table_name}")
-        columns = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        return columns
+        return get_schema_cache(DB_CONFIG).describe(table_name)
     except Exception as e:
         print(f"Error checking table structure for {table_name}: {e}")
-        if connection:
-            connection.close()
         return None
 
 
@@ -181,20 +194,29 @@ def get_rod_blk_lot_from_process_data(process_sn_list, csv_date):
         print(f"Filtering by CSV date: {csv_date}")
         print(f"Process S/N list: {process_sn_list}")
         
-        # For each Process S/N, get the latest (tail) row matching both S/N and DATE
-        for process_sn in process_sn_list:
-            query = """
+        def fetch_lot(process_sn, date_sql, date_params):
+            query = f"""
             SELECT Process_2_S_N, Process_2_Rod_Blk_Lot_No, Process_2_DATE
             FROM process2_data
             WHERE Process_2_S_N = %s
-            AND Process_2_DATE = %s
+            AND {date_sql}
             AND Process_2_Rod_Blk_Lot_No IS NOT NULL
             AND Process_2_Rod_Blk_Lot_No != ''
             LIMIT 1
             """
-            
-            cursor.execute(query, (process_sn, csv_date))
-            row = cursor.fetchone()
+            cursor.execute(query, [process_sn] + date_params)
+            return cursor.fetchall()
+        
+        # For each Process S/N, get the latest (tail) row matching both S/N and DATE
+        for process_sn in process_sn_list:
+            # Date written the way process2_data stores it
+            date_sql, date_params = date_condition(DB_CONFIG, 'process2_data', 'Process_2_DATE', csv_date)
+            rows = fetch_lot(process_sn, date_sql, date_params)
+            if not rows:
+                # The stored date layout may have changed since it was detected
+                rows = retry_date_formats(DB_CONFIG, 'process2_data', 'Process_2_DATE', csv_date,
+                                          lambda sql, params: fetch_lot(process_sn, sql, params))
+            row = rows[0] if rows else None
             
             if row:
                 lot_no = row['Process_2_Rod_Blk_Lot_No']
@@ -231,7 +253,7 @@ def get_checksheet_data_by_prod_date(rod_blk_lot_mapping):
         return None
     
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         
         print("\n=== GETTING CHECKSHEET DATA FROM rdb5200200_checksheet ===")
         
@@ -255,11 +277,11 @@ def get_checksheet_data_by_prod_date(rod_blk_lot_mapping):
         """
         
         cursor.execute(query, lot_numbers)
-        rows = cursor.fetchall()
+        # Read column-wise; numeric checksheet columns arrive as float64
+        checksheet_df = fetch_frame(cursor, get_schema_cache(DB_CONFIG).table('rdb5200200_checksheet'))
         
-        if rows:
-            print(f"Found {len(rows)} matching records in rdb5200200_checksheet")
-            checksheet_df = pd.DataFrame(rows)
+        if not checksheet_df.empty:
+            print(f"Found {len(checksheet_df)} matching records in rdb5200200_checksheet")
             print("Checksheet data columns:", list(checksheet_df.columns))
             print("Sample checksheet data:")
             print(checksheet_df.head())
@@ -312,15 +334,35 @@ def get_inspection_data_by_lot_number(checksheet_df, csv_date=None):
         
         print(f"Searching for inspection data with lot numbers: {material_lot_numbers}")
         
-        # Strategy 1: Try exact lot number match first
-        placeholders = ','.join(['%s'] * len(material_lot_numbers))
-        query = f"""
-        SELECT * FROM rd05200200_inspection
-        WHERE Lot_Number IN ({placeholders})
-        """
+        # Strategy 1: Try exact lot number match first. Inspection rows of a lot
+        # do not change once written, so lots seen before come from the local cache
+        cache = get_inspection_cache(DB_CONFIG)
+        variant = get_schema_cache(DB_CONFIG).column_hash('rd05200200_inspection')
+        cached, missing_lots = cache.lookup('rd05200200_inspection', material_lot_numbers, variant)
+        rows = [row for lot_number in material_lot_numbers for row in cached.get(lot_number, [])]
         
-        cursor.execute(query, material_lot_numbers)
-        rows = cursor.fetchall()
+        if missing_lots:
+            placeholders = ','.join(['%s'] * len(missing_lots))
+            query = f"""
+            SELECT * FROM rd05200200_inspection
+            WHERE Lot_Number IN ({placeholders})
+            """
+            
+            cursor.execute(query, missing_lots)
+            fetched = cursor.fetchall()
+            fetched_by_lot = {}
+            for row in fetched:
+                fetched_by_lot.setdefault(lot_key(row['Lot_Number']), []).append(row)
+            for lot_number in missing_lots:
+                lot_rows = fetched_by_lot.get(lot_key(lot_number))
+                if lot_rows:
+                    # Lots with missing values are queried again until they are complete
+                    cache.store('rd05200200_inspection', lot_number, lot_rows, variant,
+                                final=rows_complete(lot_rows))
+            cache.save()
+            rows += fetched
+        else:
+            print(f"All {len(material_lot_numbers)} lot numbers served from the inspection cache")
         
         # Strategy 2: If no exact matches and CSV date provided, prioritize date matching
         if not rows and csv_date:
@@ -377,7 +419,7 @@ def get_inspection_data_by_lot_number(checksheet_df, csv_date=None):
         connection.close()
         
         if rows:
-            df = pd.DataFrame(rows)
+            df = frame_from_rows(rows, get_schema_cache(DB_CONFIG).table('rd05200200_inspection'))
             print(f"Retrieved {len(df)} inspection rows before date filtering")
             
             # Filter by CSV date if provided
@@ -495,75 +537,29 @@ def combine_checksheet_and_inspection_data(checksheet_df, inspection_df):
         return combined_df
 
 
-def get_database_data_for_model(model_code, limit=100):
+def get_database_data_for_model(model_code, limit=100, unit_context=None):
     """
     Query database_data table for 100 units of data based on Model Code.
-    Only include records where PASS_NG = "1" (passing records) for accurate historical averages.
+    Keeps all PASS_NG values; only rows with the DATABASE_QUERY_KEYWORDS are left out.
     Include dates for traceability.
     
     Args:
         model_code: The model code to filter by
         limit: Number of records to retrieve (default 100)
+        unit_context: Unit of this cycle; the baseline is fetched once per cycle
     
     Returns:
-        DataFrame with database data (only passing records)
+        DataFrame with database data
     """
-    connection = create_db_connection()
-    if not connection:
-        return None
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        
         print(f"\n=== QUERYING DATABASE_DATA TABLE FOR MODEL {model_code} ===")
-        
-        # Define problematic keywords to filter out
-        problematic_keywords = [
-            'NG PRESSURE',
-            'REPAIRED AT', 
-            'RE PI',
-            'MASTER PUMP',
-            'NG AT',
-            'INSPECTION ONLY',
-        ]
-        
-        # Build keyword filtering conditions for NG_Cause columns
-        ng_cause_columns = [
-            'Process_1_NG_Cause',
-            'Process_2_NG_Cause', 
-            'Process_3_NG_Cause',
-            'Process_4_NG_Cause',
-            'Process_5_NG_Cause',
-            'Process_6_NG_Cause'
-        ]
-        
-        # Create WHERE conditions to exclude records with problematic keywords
-        keyword_conditions = []
-        for keyword in problematic_keywords:
-            for column in ng_cause_columns:
-                keyword_conditions.append(f"{column} NOT LIKE '%{keyword}%'")
-        
-        keyword_filter = " AND ".join(keyword_conditions)
-        
-        # Query for data with the specific model code, excluding problematic keywords (keep all PASS_NG values)
-        # Order by date descending to get the most recent clean records
-        query = f"""
-        SELECT *
-        FROM database_data
-        WHERE Model_Code = %s
-        AND ({keyword_filter})
-        ORDER BY DATE DESC
-        LIMIT {limit}
-        """
-        
         print(f"Executing query for {limit} records (excluding problematic keywords, keeping all PASS_NG values)")
-        print(f"Filtering out keywords: {problematic_keywords}")
-        cursor.execute(query, (model_code,))
-        results = cursor.fetchall()
+        print(f"Filtering out keywords: {DATABASE_QUERY_KEYWORDS}")
+        provider = get_baseline_provider(DB_CONFIG, unit_context) if unit_context is not None else BaselineProvider(DB_CONFIG, materials=BASELINE_MATERIALS)
+        df = provider.view(__name__, model_code, keywords=DATABASE_QUERY_KEYWORDS, limit=limit)
         
-        if results:
-            print(f"Retrieved {len(results)} records from database_data for model {model_code}")
-            df = pd.DataFrame(results)
+        if df is not None:
+            print(f"Retrieved {len(df)} records from database_data for model {model_code}")
             print(f"Database DataFrame shape: {df.shape}")
             print(f"Database DataFrame columns (first 10): {list(df.columns)[:10]}")
             
@@ -579,19 +575,13 @@ def get_database_data_for_model(model_code, limit=100):
                 pass_ng_counts = df['PASS_NG'].value_counts()
                 print(f"PASS_NG distribution: {pass_ng_counts.to_dict()}")
             
-            cursor.close()
-            connection.close()
             return df
         else:
             print(f"No records found in database_data for model {model_code}")
-            cursor.close()
-            connection.close()
             return None
             
     except Exception as e:
         print(f"Error querying database_data table: {e}")
-        if connection:
-            connection.close()
         return None
 
 
@@ -994,19 +984,35 @@ def process_material_data():
 
 def process_rod_blk_material_data():
     """
-    Main function to process Rod_Blk material data with fallback approach.
-    If process2_data lookup fails, use direct inspection table approach.
+    Read the latest unit from today's PICompiled file and run the Rod_Blk processing on it.
+    Kept for callers that do not build a UnitContext themselves.
     """
     print("=== STARTING ROD_BLK MATERIAL DATA PROCESSING ===")
     
     # Step 1: Read CSV data
     print("\n1. Reading CSV data...")
-    csv_data = read_csv_with_pandas(FILEPATH)
+    # Resolved per call so a long-running process follows the daily file
+    file_path = picompiled_path(directory=NETWORK_DIR)
+    unit_context = UnitContext.from_csv_data(read_csv_with_pandas(file_path), file_path)
     
-    if csv_data is None or csv_data.empty:
+    if unit_context is None:
         print("Failed to read CSV data or no data found")
         return None
     
+    return process_material_data_for_unit(unit_context)
+
+
+def process_material_data_for_unit(unit_context):
+    """
+    Main function to process Rod_Blk material data for one unit with fallback approach.
+    If process2_data lookup fails, use direct inspection table approach.
+    
+    Args:
+        unit_context: UnitContext built once per cycle from the PICompiled CSV
+    """
+    print(f"\n=== Processing {unit_context} ===")
+    csv_data = unit_context.to_frame()
+    
     # Extract required values
     process_sn_list = csv_data['PROCESS S/N'].tolist()
     sn_list = csv_data['S/N'].tolist()
@@ -1020,7 +1026,19 @@ def process_rod_blk_material_data():
     
     # Step 2: Try to get Rod_Blk lot numbers from process2_data
     print("\n2. Getting Rod_Blk lot numbers from process2_data...")
-    rod_blk_lot_mapping = get_rod_blk_lot_from_process_data(process_sn_list, csv_date)
+    # Lots come from the unit's process table fetch shared by every material module
+    traceability = get_unit_traceability(DB_CONFIG, unit_context)
+    if traceability is not None:
+        rod_blk_lot_mapping = {}
+        for process_sn in process_sn_list:
+            _, lot_no = traceability.material_entry('Rod_Blk', process_sn, DATED, require_lot=True)
+            if lot_no:
+                rod_blk_lot_mapping[process_sn] = lot_no
+                print(f"  Process S/N: {process_sn} -> Rod_Blk Lot: {lot_no}")
+            else:
+                print(f"  No Rod_Blk lot found for Process S/N: {process_sn}")
+    else:
+        rod_blk_lot_mapping = get_rod_blk_lot_from_process_data(process_sn_list, csv_date)
     
     combined_df = pd.DataFrame()
     
@@ -1057,7 +1075,7 @@ def process_rod_blk_material_data():
     if combined_df.empty:
         print("No combined data available - trying database-only approach")
         # Last resort: Use database data only for deviation calculations
-        database_df = get_database_data_for_model(model_code, 100)
+        database_df = get_database_data_for_model(model_code, 100, unit_context)
         
         if database_df is not None and not database_df.empty:
             print("Using database-only approach for Rod_Blk processing")
@@ -1077,7 +1095,7 @@ def process_rod_blk_material_data():
     
     # Step 6: Get database data for model
     print("\n6. Getting database data...")
-    database_df = get_database_data_for_model(model_code, 100)
+    database_df = get_database_data_for_model(model_code, 100, unit_context)
     
     # Step 7: Calculate deviations
     print("\n7. Calculating deviations...")
@@ -0,0 +1,217 @@
+#%%
+import re
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from db_pool import get_connection
+from registry import KeyedRegistry
+
+logger = logging.getLogger(__name__)
+
+# Seconds a loaded schema is trusted before the server fingerprint is checked
+SCHEMA_TTL = 300.0
+
+# Every column of the database, in table and column order
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, ORDINAL_POSITION, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = %s
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+# One-row fingerprint of the column set; a sum of CRCs avoids GROUP_CONCAT's length limit.
+# _fingerprint() computes the same value from loaded rows.
+FINGERPRINT_QUERY = """
+SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, ORDINAL_POSITION))), 0)
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = %s
+"""
+
+
+def _like_regex(pattern):
+    """Translate a SQL LIKE pattern into a case-insensitive regex, as SHOW COLUMNS LIKE matches"""
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _fingerprint(rows):
+    """FINGERPRINT_QUERY's (count, CRC sum) for rows of COLUMNS_QUERY"""
+    total = 0
+    for table, column, column_type, position in (row[:4] for row in rows):
+        total += zlib.crc32(f"{table}:{column}:{column_type}:{position}".encode('utf-8'))
+    return (len(rows), total)
+
+
+class TableSchema:
+    """Columns of one table in ordinal order, as DESCRIBE returns them"""
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self.columns = [row['Field'] for row in rows]
+        self.types = {row['Field']: row['Type'] for row in rows}
+        # MySQL column names are case-insensitive
+        self._lookup = {column.lower(): column for column in self.columns}
+        self.column_hash = hashlib.md5('\n'.join(f"{row['Field']}:{row['Type']}" for row in rows)
+                                       .encode('utf-8')).hexdigest()
+
+    def has_column(self, column):
+        return column.lower() in self._lookup
+
+    def column_type(self, column):
+        """COLUMN_TYPE of column (e.g. 'varchar(50)', 'date'), or None if it does not exist"""
+        name = self._lookup.get(column.lower())
+        return self.types[name] if name is not None else None
+
+
+class SchemaCache:
+    """
+    Column metadata of every table in one database, loaded with one
+    INFORMATION_SCHEMA.COLUMNS query and reloaded only when the server's fingerprint changes.
+
+    Args:
+        config: DB_CONFIG of the database (its 'database' entry is the schema)
+        ttl: Seconds before the fingerprint is checked again
+        connect: Function returning a connection for config (default: the shared pool)
+    """
+
+    def __init__(self, config, ttl=SCHEMA_TTL, connect=None):
+        self.config = config
+        self.schema = config.get('database')
+        self.ttl = ttl
+        self._connect = connect or get_connection
+        self._tables = None
+        self._lookup = {}
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.fingerprint_checks = 0
+        self.lookups = 0
+
+    def _query(self, sql):
+        connection = self._connect(self.config)
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, (self.schema,))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    def _load(self):
+        rows = [tuple(value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else value
+                      for value in row) for row in self._query(COLUMNS_QUERY)]
+        by_table = {}
+        for table, column, column_type, position, nullable, key, default, extra in rows:
+            by_table.setdefault(table, []).append({
+                'Field': column, 'Type': column_type, 'Null': nullable,
+                'Key': key, 'Default': default, 'Extra': extra,
+            })
+        tables = {name: TableSchema(name, table_rows) for name, table_rows in by_table.items()}
+
+        if self._tables is not None:
+            changed = sorted(name for name, table in tables.items()
+                             if name not in self._tables or self._tables[name].column_hash != table.column_hash)
+            removed = sorted(set(self._tables) - set(tables))
+            if changed or removed:
+                logger.info(f"Schema of {self.schema} changed: {changed + removed}")
+        self._tables = tables
+        self._fingerprint = _fingerprint(rows)
+        self._lookup = {name.lower(): name for name in tables}
+        self.loads += 1
+        logger.info(f"Loaded schema of {self.schema}: {len(tables)} tables, {len(rows)} columns")
+
+    def _ensure_current(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._tables is not None and now - self._checked_at < self.ttl:
+                return
+            try:
+                if self._tables is None:
+                    self._load()
+                else:
+                    count, total = self._query(FINGERPRINT_QUERY)[0]
+                    self.fingerprint_checks += 1
+                    if (int(count), int(total)) != self._fingerprint:
+                        self._load()
+                self._checked_at = now
+            except Exception as e:
+                if self._tables is None:
+                    raise
+                logger.warning(f"Could not check schema of {self.schema}, using cached columns: {e}")
+                self._checked_at = now
+
+    def invalidate(self):
+        """Check the server fingerprint on the next lookup, e.g. after an unknown-column error"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def table(self, table_name):
+        """Return the TableSchema of table_name, or None if the table does not exist"""
+        self._ensure_current()
+        self.lookups += 1
+        name = self._lookup.get(table_name.lower())
+        return self._tables.get(name) if name is not None else None
+
+    def table_exists(self, table_name):
+        return self.table(table_name) is not None
+
+    def describe(self, table_name):
+        """DESCRIBE-style rows (Field, Type, Null, Key, Default, Extra), or None if the table does not exist"""
+        table = self.table(table_name)
+        return [dict(row) for row in table.rows] if table is not None else None
+
+    def columns(self, table_name):
+        """Column names of table_name in ordinal order ([] if the table does not exist)"""
+        table = self.table(table_name)
+        return list(table.columns) if table is not None else []
+
+    def has_column(self, table_name, column):
+        table = self.table(table_name)
+        return table is not None and table.has_column(column)
+
+    def existing_columns(self, table_name, columns):
+        """The given columns that exist in table_name, in the given order"""
+        table = self.table(table_name)
+        if table is None:
+            return []
+        return [column for column in columns if table.has_column(column)]
+
+    def find_columns(self, table_name, like):
+        """Columns of table_name matching a SQL LIKE pattern, like SHOW COLUMNS ... LIKE"""
+        regex = _like_regex(like)
+        return [column for column in self.columns(table_name) if regex.fullmatch(column)]
+
+    def column_hash(self, table_name):
+        """Hash of table_name's column names and types, or None if the table does not exist"""
+        table = self.table(table_name)
+        return table.column_hash if table is not None else None
+
+    def stats(self):
+        return {
+            'tables': len(self._tables) if self._tables is not None else 0,
+            'loads': self.loads,
+            'fingerprint_checks': self.fingerprint_checks,
+            'lookups': self.lookups,
+        }
+
+
+_caches = KeyedRegistry(SchemaCache)
+
+
+def get_schema_cache(config):
+    """Return the shared SchemaCache for config's database, creating it on first use"""
+    return _caches.get(config)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the unit ingestion profile against a full parse of every column.
+
+Writes a synthetic PICompiled-like CSV (20,000 rows x 200 columns by default)
+and parses it both ways: the full parse followed by the keyword filter, and
+UNIT_PROFILE, which drops keyword lines as raw bytes and parses only the unit
+columns. Reports parse time and peak traced memory and checks that both keep
+the same units.
+
+Usage:
+    python "testing files/benchmark_ingestion_profile.py" [rows] [columns]
+"""
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from ingestion_profile import FAST_ENGINE, clean_model_code
+from picompiled_reader import parse_lines, UNIT_COLUMNS
+from unit_context import CSV_ROW_FILTER, CSV_KEYWORDS_TO_REMOVE, UNIT_PROFILE
+
+
+def build_csv(rows, columns, seed=0):
+    """Unit columns, then repetitive text and numeric measurement columns"""
+    rng = np.random.default_rng(seed)
+    text_values = ['OK', 'PASS', 'GOOD', 'LINE A', 'LINE B']
+    extra = columns - len(UNIT_COLUMNS)
+    header = UNIT_COLUMNS + [f"TEXT_{i}" if i % 5 < 2 else f"VALUE_{i}" for i in range(extra)]
+
+    values = rng.normal(10.0, 1.0, (rows, extra))
+    picks = rng.integers(0, len(text_values), (rows, extra))
+    flagged = set(rng.choice(rows, size=max(1, rows // 100), replace=False).tolist())
+
+    out = io.StringIO()
+    out.write(",".join(header) + "\n")
+    for n in range(rows):
+        fields = ["2025/09/10", f'"60CAT021{n % 4}P"', str(1000 + n), str(5000 + n)]
+        for i in range(extra):
+            fields.append(text_values[picks[n, i]] if i % 5 < 2 else f"{values[n, i]:.4f}")
+        if n in flagged:
+            fields[4] = f"REMARK {CSV_KEYWORDS_TO_REMOVE[n % len(CSV_KEYWORDS_TO_REMOVE)]}"
+        out.write(",".join(fields) + "\n")
+    return header, out.getvalue().encode()
+
+
+def full_parse(columns, data, base_offset):
+    """The path used before the profile: parse every column, then filter"""
+    rows = parse_lines(columns, data, base_offset)
+    rows["MODEL CODE"] = rows["MODEL CODE"].astype(str).str.replace('"', '', regex=False)
+    return CSV_ROW_FILTER.filter_rows(rows)[UNIT_COLUMNS]
+
+
+def profiled_parse(columns, data, base_offset):
+    rows = parse_lines(columns, data, base_offset, profile=UNIT_PROFILE)
+    rows["MODEL CODE"] = clean_model_code(rows["MODEL CODE"])
+    return rows
+
+
+def measure(parse, columns, data, base_offset):
+    """Return (result, seconds, peak bytes); numpy and pandas buffers are traced too"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = parse(columns, data, base_offset)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run(rows=20000, columns=200):
+    header, csv_bytes = build_csv(rows, columns)
+    header_length = csv_bytes.index(b"\n") + 1
+    data = csv_bytes[header_length:]
+    print(f"CSV: {rows} rows x {columns} columns, {len(data) / 1e6:.1f} MB")
+    print(f"Fast parser engine: {FAST_ENGINE or 'not installed (C parser)'}")
+
+    legacy, legacy_seconds, legacy_peak = measure(full_parse, header, data, header_length)
+    profiled, profiled_seconds, profiled_peak = measure(profiled_parse, header, data, header_length)
+
+    assert list(legacy.index) == list(profiled.index), "Paths disagree on kept rows"
+    assert list(legacy["S/N"]) == list(profiled["S/N"])
+    assert list(legacy["MODEL CODE"]) == list(profiled["MODEL CODE"].astype(str))
+
+    print(f"Units kept: {len(profiled)} of {rows}")
+    print(f"Full parse + filter: {legacy_seconds:8.3f} s  peak {legacy_peak / 1e6:8.1f} MB")
+    print(f"Ingestion profile:   {profiled_seconds:8.3f} s  peak {profiled_peak / 1e6:8.1f} MB"
+          f"  ({legacy_seconds / profiled_seconds:5.1f}x faster, {legacy_peak / profiled_peak:5.1f}x less memory)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
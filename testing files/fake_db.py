@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Fake MySQL server and schema shared by the database tests, so each test only states its canned rows
+"""
+
+from schema_cache import TableSchema
+
+
+class LostConnection(Exception):
+    """What mysql.connector raises when the server stops answering"""
+    errno = 2013
+
+
+class FakeServer:
+    """
+    Answers every query with canned rows and records what was sent.
+
+    Args:
+        rows: List of row dicts answering every query, dict of table name (the word
+              after FROM) to row dicts, or function (sql, params) -> rows.
+              Rows given as tuples are returned as they are.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = {} if rows is None else rows
+        # (sql, params) of every query; session settings are not counted
+        self.queries = []
+        self.connections = []
+        # While down, connecting and querying raise LostConnection
+        self.down = False
+
+    def connect(self, config=None, **kwargs):
+        """Takes connect(config) like the modules' connect hooks and connect(**config) like the pool"""
+        if self.down:
+            raise LostConnection("Can't connect to MySQL server")
+        connection = FakeConnection(self, config if config is not None else kwargs)
+        self.connections.append(connection)
+        return connection
+
+    @property
+    def held(self):
+        """Connections opened and not closed yet"""
+        return sum(not connection.closed for connection in self.connections)
+
+    def answer(self, sql, params):
+        if callable(self.rows):
+            return list(self.rows(sql, params))
+        if isinstance(self.rows, dict):
+            table = sql.split(" FROM ")[1].split()[0] if " FROM " in sql else None
+            return list(self.rows.get(table, []))
+        return list(self.rows)
+
+
+class FakeConnection:
+    """One connection to a FakeServer; counts pings and closes"""
+
+    def __init__(self, server, config):
+        self.server = server
+        self.config = config
+        self.alive = True
+        self.closed = False
+        self.pings = 0
+        self.unread_result = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.server, dictionary)
+
+    def ping(self):
+        self.pings += 1
+        if not self.alive:
+            raise OSError("MySQL server has gone away")
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, server, dictionary=False):
+        self.server = server
+        self.dictionary = dictionary
+        self.executed = []
+        self.description = None
+        self._pending = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        if sql.startswith("SET SESSION"):
+            return
+        if self.server.down:
+            raise LostConnection("Lost connection to MySQL server during query")
+        self.server.queries.append((sql, params))
+        rows = self.server.answer(sql, params)
+        names = list(rows[0]) if rows and isinstance(rows[0], dict) else []
+        self.description = [(name,) for name in names]
+        if self.dictionary:
+            self._pending = [dict(row) for row in rows]
+        else:
+            self._pending = [row if isinstance(row, tuple) else tuple(row.values()) for row in rows]
+
+    def fetchone(self):
+        return self._pending.pop(0) if self._pending else None
+
+    def fetchmany(self, size=1):
+        batch, self._pending = self._pending[:size], self._pending[size:]
+        return batch
+
+    def fetchall(self):
+        rows, self._pending = self._pending, []
+        return rows
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeSchema:
+    """
+    The SchemaCache lookups, over fixed tables.
+
+    Args:
+        tables: Dict of table name to {column: type}, or to DESCRIBE rows ({'Field', 'Type', 'Key'})
+    """
+
+    def __init__(self, tables):
+        self.tables = {}
+        for name, columns in tables.items():
+            if isinstance(columns, dict):
+                columns = [{'Field': column, 'Type': column_type, 'Key': ''} for column, column_type in columns.items()]
+            self.tables[name.lower()] = TableSchema(name, columns)
+
+    def table(self, name):
+        return self.tables.get(name.lower())
+
+    def has_column(self, table, column):
+        table_schema = self.table(table)
+        return table_schema is not None and table_schema.has_column(column)
+
+    def existing_columns(self, table, columns):
+        return [column for column in columns if self.has_column(table, column)]
+
+    def column_hash(self, table):
+        table_schema = self.table(table)
+        return table_schema.column_hash if table_schema is not None else None
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-cycle database_data baseline provider
+"""
+
+import os
+import sys
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeSchema, FakeServer
+from baseline_provider import BaselineProvider, BaselineWindow, baseline_columns, baseline_query, get_baseline_provider
+from unit_context import UnitContext
+
+
+COLUMNS = [
+    ('Model_Code', 'varchar(20)'), ('DATE', 'varchar(10)'), ('PASS_NG', 'varchar(2)'), ('Process_1_S_N', 'varchar(20)'),
+    ('Process_1_NG_Cause', 'varchar(100)'), ('Process_1_Remarks', 'text'),
+    ('Process_1_Frame_Inspection_1_Average_Data', 'varchar(20)'),
+    ('Process_2_Df_Blk_Inspection_1_Average_Data', 'double'),
+    ('Process_4_Leak_Test_Data', 'varchar(20)'), ('Process_5_Pressure_1_Data', 'double'),
+]
+
+
+SCHEMA = {'database_data': dict(COLUMNS)}
+
+
+def _provider(server):
+    return BaselineProvider({'database': 'fc_1_data_db'}, connect=server.connect, schema=FakeSchema(SCHEMA))
+
+
+ROWS = [
+    {'Model_Code': '60CAT0212P', 'DATE': '2025-09-10', 'Process_1_Frame_Inspection_1_Average_Data': 1.0},
+    {'Model_Code': '60CAT0212P', 'DATE': '2025-09-09', 'Process_1_Frame_Inspection_1_Average_Data': 3.0},
+]
+
+
+def test_one_query_serves_every_material():
+    """Five material views of the same model in a cycle cost one database_data query"""
+    server = FakeServer(ROWS)
+    provider = _provider(server)
+    cleaned = []
+
+    def clean(df):
+        cleaned.append(len(df))
+        return df[df['DATE'] == '2025-09-10']
+
+    for name in ('frame', 'em_material', 'csb_data_output', 'df_blk_output'):
+        provider.view(name, '60CAT0212P', clean)
+    provider.view('frame', '60CAT0212P', clean)
+    assert len(server.queries) == 1
+    assert server.queries[0][1] == ('60CAT0212P',)
+    assert cleaned == [2, 2, 2, 2]
+
+    # A different keyword set is a different baseline
+    provider.view('rod_blk_output', '60CAT0212P', keywords=('NG PRESSURE', 'NG AT'))
+    assert len(server.queries) == 2
+    stats = provider.stats()
+    assert (stats['baselines'], stats['views'], stats['queries'], stats['hits']) == (2, 5, 2, 3)
+    print(f"✓ {len(server.queries)} queries for 6 baseline requests")
+
+
+def test_views_are_independent_copies():
+    """A module changing its DataFrame does not change what the next module gets"""
+    provider = _provider(FakeServer(ROWS))
+    first = provider.view('frame', '60CAT0212P')
+    first['Process_1_Frame_Inspection_1_Average_Data'] = 0.0
+    assert provider.view('frame', '60CAT0212P')['Process_1_Frame_Inspection_1_Average_Data'].tolist() == [1.0, 3.0]
+    assert _provider(FakeServer([])).view('frame', 'NONE') is None
+    print("✓ Views are independent copies")
+
+
+def test_query_selects_only_needed_columns():
+    """Identifiers, text and the active materials' columns are selected; other measurements are not"""
+    server = FakeServer(ROWS)
+    _provider(server).view('frame', '60CAT0212P')
+    sql = server.queries[0][0]
+    assert 'SELECT *' not in sql
+    assert sql.split('FROM')[0].split('SELECT')[1].strip() == (
+        "`Model_Code`, `DATE`, `PASS_NG`, `Process_1_S_N`, `Process_1_NG_Cause`, `Process_1_Remarks`, "
+        "`Process_1_Frame_Inspection_1_Average_Data`, `Process_2_Df_Blk_Inspection_1_Average_Data`")
+    assert baseline_columns(FakeSchema(SCHEMA).table('database_data'), ['Frame'])[-1] == \
+        'Process_1_Frame_Inspection_1_Average_Data'
+    print("✓ Baseline query selects only the needed columns")
+
+
+class KeyedServer(FakeServer):
+    """database_data with an auto-increment id; answers full and since-watermark queries"""
+
+    def __init__(self):
+        super().__init__(self.select)
+        self.table_rows = []
+
+    def add(self, date):
+        self.table_rows.append({'id': len(self.table_rows) + 1, 'Model_Code': '60CAT0212P', 'DATE': date})
+
+    def select(self, sql, params):
+        limit = int(sql.split('LIMIT')[1])
+        if '`id` >' in sql:
+            return [row for row in self.table_rows if row['id'] > params[1]][:limit]
+        return sorted(self.table_rows, key=lambda row: (row['DATE'], row['id']), reverse=True)[:limit]
+
+
+KEYED_SCHEMA = {'database_data': [{'Field': 'id', 'Type': 'int', 'Key': 'PRI'},
+                                  {'Field': 'Model_Code', 'Type': 'varchar(20)', 'Key': ''},
+                                  {'Field': 'DATE', 'Type': 'varchar(10)', 'Key': ''}]}
+
+
+def test_window_fetches_only_new_units():
+    """Later cycles fetch the units added since the watermark and keep the newest N"""
+    server = KeyedServer()
+    for day in range(1, 9):
+        server.add(f"2025-09-{day:02d}")
+    windows = {}
+
+    def cycle():
+        provider = BaselineProvider({'database': 'fc_1_data_db'}, connect=server.connect,
+                                    schema=FakeSchema(KEYED_SCHEMA), windows=windows)
+        return provider, provider.raw('60CAT0212P', limit=5)
+
+    provider, df = cycle()
+    assert df['id'].tolist() == [8, 7, 6, 5, 4] and provider.stats()['full_loads'] == 1
+
+    server.add('2025-09-09')
+    server.add('2025-09-09')
+    provider, df = cycle()
+    assert df['id'].tolist() == [10, 9, 8, 7, 6]
+    assert (provider.stats()['delta_loads'], provider.stats()['rows_fetched']) == (1, 2)
+    assert 'ORDER BY DATE' not in server.queries[-1][0]
+
+    provider, df = cycle()
+    assert provider.stats()['rows_fetched'] == 0 and len(df) == 5
+
+    # More new units than the window holds: reload in full
+    for _ in range(6):
+        server.add('2025-09-10')
+    provider, df = cycle()
+    assert df['id'].tolist() == [16, 15, 14, 13, 12] and provider.stats()['full_loads'] == 1
+
+    window = BaselineWindow('id', 2)
+    window.replace([{'id': 3, 'DATE': '2025-09-02'}, {'id': 1, 'DATE': '2025-09-01'}])
+    assert window.merge([{'id': 4, 'DATE': '2025-08-31'}]) and [row['id'] for row in window.rows] == [3, 1]
+    assert window.watermark == 4 and window.newest_date == '2025-09-02'
+    print("✓ Baseline window fetches only new units")
+
+
+def test_provider_lives_for_one_cycle():
+    """Each unit context gets its own provider; modules of the same unit share it"""
+    config = {'host': 'db', 'database': 'fc_1_data_db'}
+    unit = UnitContext('2025-09-10', '60CAT0212P', 'P100', 'S100')
+    assert get_baseline_provider(config, unit) is get_baseline_provider(config, unit)
+    assert get_baseline_provider(config, UnitContext('2025-09-10', '60CAT0212P', 'P101', 'S101')) \
+        is not get_baseline_provider(config, unit)
+    assert "NOT LIKE '%TRIAL%'" in baseline_query() and "LIMIT 100" in baseline_query()
+    print("✓ Provider lives for one cycle")
+
+
+def test_disabled_material_columns_are_not_selected():
+    """The cycle's active materials pick the provider and the columns its query selects"""
+    config = {'host': 'db', 'database': 'fc_1_data_db'}
+    unit = UnitContext('2025-09-10', '60CAT0212P', 'P100', 'S100')
+    unit.materials = ('Frame', 'Df_Blk')
+    assert get_baseline_provider(config, unit).materials == ('Frame', 'Df_Blk')
+    unit.materials = ('Frame',)
+    provider = get_baseline_provider(config, unit)
+    assert provider.materials == ('Frame',) and len(unit.baselines) == 2
+
+    server = FakeServer(ROWS)
+    BaselineProvider(config, connect=server.connect, schema=FakeSchema(SCHEMA), materials=provider.materials) \
+        .raw('60CAT0212P')
+    sql = server.queries[0][0]
+    assert '`Process_1_Frame_Inspection_1_Average_Data`' in sql and 'Df_Blk' not in sql
+    print("✓ Disabled materials' columns are not selected")
+
+
+if __name__ == "__main__":
+    test_one_query_serves_every_material()
+    test_views_are_independent_copies()
+    test_query_selects_only_needed_columns()
+    test_window_fetches_only_new_units()
+    test_provider_lives_for_one_cycle()
+    test_disabled_material_columns_are_not_selected()
+    print("\nAll baseline provider tests passed")
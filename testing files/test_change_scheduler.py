@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the single-flight change scheduler
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from change_scheduler import SingleFlightScheduler
+
+
+def test_burst_is_coalesced_into_one_run_with_newest_state():
+    """A burst of triggers within the debounce window runs once, on the last state"""
+    seen = []
+    scheduler = SingleFlightScheduler(seen.append, debounce=0.05, max_delay=1.0)
+    for state in range(5):
+        assert scheduler.trigger(state)
+    assert scheduler.wait_idle(2.0)
+
+    assert seen == [4]
+    stats = scheduler.stats()
+    assert stats['runs'] == 1 and stats['coalesced'] == 4
+    scheduler.stop()
+    print("✓ Burst coalesced into one run on the newest state")
+
+
+def test_one_in_flight_and_one_pending():
+    """Triggers during a run collapse into a single follow-up run; runs never overlap"""
+    release = threading.Event()
+    seen = []
+    active = []
+
+    def run(state):
+        active.append(state)
+        assert len(active) == 1, "runs overlapped"
+        seen.append(state)
+        if state == 'first':
+            release.wait(2.0)
+        active.remove(state)
+
+    scheduler = SingleFlightScheduler(run, debounce=0.01, max_delay=0.05)
+    scheduler.trigger('first')
+    deadline = time.monotonic() + 2.0
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    for state in ('second', 'third', 'fourth'):
+        scheduler.trigger(state)
+    release.set()
+    assert scheduler.wait_idle(2.0)
+
+    assert seen == ['first', 'fourth']
+    assert scheduler.stats()['coalesced'] == 2
+    scheduler.stop()
+    print("✓ One run in flight plus one pending")
+
+
+def test_repeated_state_is_suppressed():
+    """A trigger with the state that was just processed does not start another run"""
+    seen = []
+    scheduler = SingleFlightScheduler(seen.append, debounce=0.01)
+    scheduler.trigger('fp-1')
+    assert scheduler.wait_idle(2.0)
+    assert not scheduler.trigger('fp-1')
+    assert scheduler.wait_idle(2.0)
+
+    assert seen == ['fp-1']
+    assert scheduler.stats()['suppressed'] == 1
+
+    scheduler.stop()
+    assert not scheduler.trigger('fp-2')
+    print("✓ Repeated and post-stop triggers are suppressed")
+
+
+if __name__ == "__main__":
+    test_burst_is_coalesced_into_one_run_with_newest_state()
+    test_one_in_flight_and_one_pending()
+    test_repeated_state_is_suppressed()
+    print("\nAll change scheduler tests passed")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script to verify CSV fingerprinting and the adaptive poller
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from csv_monitor import AdaptivePoller, file_fingerprint
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N\n"
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def test_fingerprint_tracks_appends_and_same_size_rewrites():
+    """Appends change size; a same-size rewrite with the same mtime changes the tail hash"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + "2025/09/10,60CAT0212P,1000,5000\n", mode="w")
+        first = file_fingerprint(path)
+        assert first.size == os.path.getsize(path)
+
+        _write(path, "2025/09/10,60CAT0212P,1001,5001\n")
+        assert file_fingerprint(path).size > first.size
+
+        # Same size, mtime forced back to the original value
+        _write(path, HEADER + "2025/09/10,60CAT0212P,1000,5009\n", mode="w")
+        os.utime(path, ns=(first.mtime_ns, first.mtime_ns))
+        rewritten = file_fingerprint(path)
+        assert (rewritten.size, rewritten.mtime_ns) == (first.size, first.mtime_ns)
+        assert rewritten.tail_hash != first.tail_hash
+        print("✓ Fingerprint detects appends and same-size rewrites")
+
+
+def test_poller_backs_off_when_idle_and_resets_on_change():
+    """Unchanged polls grow the interval and only stat the file; a change resets it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER, mode="w")
+
+        changes = []
+        poller = AdaptivePoller(path, changes.append, min_interval=1.0, max_interval=4.0,
+                                backoff=2.0, verify_every=100)
+        poller.fingerprint = file_fingerprint(path)
+
+        for _ in range(3):
+            assert not poller.check_once()
+        assert poller.interval == 4.0
+        assert poller.tail_reads == 0
+
+        _write(path, "2025/09/10,60CAT0212P,1000,5000\n")
+        assert poller.check_once()
+        assert poller.interval == 1.0
+        assert len(changes) == 1 and changes[0].size == os.path.getsize(path)
+        assert poller.stats()['changes'] == 1
+        print("✓ Poller backs off while idle and resets on change")
+
+
+def test_poller_verifies_tail_and_survives_missing_file():
+    """Periodic tail verification catches changes stat misses; a missing file is not an error"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + "A\n", mode="w")
+
+        changes = []
+        poller = AdaptivePoller(path, changes.append, verify_every=2)
+        poller.fingerprint = file_fingerprint(path)
+        stat = os.stat(path)
+
+        _write(path, HEADER + "B\n", mode="w")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert not poller.check_once()  # stat unchanged, not verified yet
+        assert poller.check_once()      # verification poll hashes the tail
+        assert len(changes) == 1
+
+        os.remove(path)
+        assert not poller.check_once()
+        assert poller.fingerprint is None and poller.interval == poller.max_interval
+
+        _write(path, HEADER, mode="w")
+        assert poller.check_once()
+        print("✓ Poller verifies the tail and handles a missing file")
+
+
+if __name__ == "__main__":
+    test_fingerprint_tracks_appends_and_same_size_rewrites()
+    test_poller_backs_off_when_idle_and_resets_on_change()
+    test_poller_verifies_tail_and_survives_missing_file()
+    print("\nAll CSV monitor tests passed")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the local spool mirror of the PICompiled CSV
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from csv_spool import SpoolMirror
+from picompiled_reader import IncrementalCSVReader
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N\n"
+
+
+def _row(i):
+    return f"2025/09/10,60CAT0212P,{1000 + i},{5000 + i}\n"
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_only_appended_bytes_are_copied():
+    """Each sync copies just the new bytes and the copy matches the source"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "share", "PICompiled2025-09-10.csv")
+        os.makedirs(os.path.dirname(source))
+        _write(source, HEADER + _row(0), mode="w")
+
+        mirror = SpoolMirror(source, os.path.join(tmp, "spool"))
+        assert mirror.sync()
+        assert _read(mirror.local_path) == _read(source)
+        first_copy = mirror.bytes_copied
+
+        # Includes a partially written line; the reader holds it back
+        _write(source, _row(1) + _row(2)[:10])
+        assert mirror.sync()
+        assert mirror.bytes_copied - first_copy == len(_row(1)) + 10
+        assert _read(mirror.local_path) == _read(source)
+        assert mirror.lag()['bytes_behind'] == 0
+        assert mirror.lag(source_size=os.path.getsize(source) + 50)['bytes_behind'] == 50
+
+        rows = IncrementalCSVReader(mirror.local_path).read_new_rows()
+        assert list(rows["S/N"]) == [5000, 5001]
+        print("✓ Only appended bytes are copied")
+
+
+def test_replaced_source_is_copied_again():
+    """A truncated or rewritten source is copied from the start"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(source, HEADER + _row(0) + _row(1), mode="w")
+        mirror = SpoolMirror(source, os.path.join(tmp, "spool"))
+        mirror.sync()
+
+        # Same length, different content
+        _write(source, HEADER + _row(7) + _row(8), mode="w")
+        assert mirror.sync()
+        assert _read(mirror.local_path) == _read(source)
+        assert mirror.recopies == 1
+
+        # Shrunk
+        _write(source, HEADER, mode="w")
+        assert mirror.sync()
+        assert _read(mirror.local_path) == _read(source)
+        print("✓ Replaced source is copied again")
+
+
+def test_unreachable_share_keeps_last_copy():
+    """Failed syncs retry a bounded number of times and leave the local copy readable"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(source, HEADER + _row(0), mode="w")
+        mirror = SpoolMirror(source, os.path.join(tmp, "spool"), attempts=2, backoff=0.01, max_backoff=0.05)
+        mirror.sync()
+
+        os.rename(source, source + ".offline")
+        assert not mirror.sync()
+        assert mirror.failures == 2 and mirror.consecutive_failures == 1
+        assert mirror.has_copy() and mirror.lag()['last_error']
+        # Within the cooldown the share is not touched again
+        assert not mirror.sync()
+        assert mirror.failures == 2
+
+        os.rename(source + ".offline", source)
+        _write(source, _row(1))
+        mirror._next_attempt_at = 0.0
+        assert mirror.sync()
+        assert mirror.consecutive_failures == 0
+        assert _read(mirror.local_path) == _read(source)
+        print("✓ Unreachable share keeps the last copy")
+
+
+def test_same_file_name_on_two_shares():
+    """Sources with the same file name get separate spool copies"""
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = os.path.join(tmp, "spool")
+        first = os.path.join(tmp, "share_a", "PICompiled2025-09-10.csv")
+        second = os.path.join(tmp, "share_b", "PICompiled2025-09-10.csv")
+        for path, i in ((first, 0), (second, 1)):
+            os.makedirs(os.path.dirname(path))
+            _write(path, HEADER + _row(i), mode="w")
+
+        mirrors = [SpoolMirror(first, spool), SpoolMirror(second, spool)]
+        for _ in range(2):
+            assert all(mirror.sync() for mirror in mirrors)
+        assert mirrors[0].local_path != mirrors[1].local_path
+        assert os.path.basename(mirrors[0].local_path).startswith("PICompiled2025-09-10.")
+        assert _read(mirrors[0].local_path) == _read(first) and _read(mirrors[1].local_path) == _read(second)
+        assert mirrors[0].recopies == mirrors[1].recopies == 0
+        print("✓ Same file name on two shares")
+
+
+if __name__ == "__main__":
+    test_only_appended_bytes_are_copied()
+    test_replaced_source_is_copied_again()
+    test_unreachable_share_keeps_last_copy()
+    test_same_file_name_on_two_shares()
+    print("\nAll spool mirror tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script to verify switching to the next day's PICompiled file without a restart
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from csv_monitor import AdaptivePoller, file_fingerprint
+from picompiled_path import DailyPathResolver, picompiled_filename, picompiled_path
+from picompiled_reader import get_incremental_reader, release_readers
+from unit_context import read_new_unit_contexts
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,REMARKS\n"
+
+
+def _row(i, remarks="OK"):
+    return f"2025/09/10,60CAT0212P,{1000 + i},{5000 + i},{remarks}\n"
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_daily_file_naming():
+    """Paths follow PICompiled{YYYY-MM-DD}.csv"""
+    day = datetime.datetime(2025, 9, 1, 23, 59)
+    assert picompiled_filename(day) == "PICompiled2025-09-01.csv"
+    assert picompiled_path(day, "share") == os.path.join("share", "PICompiled2025-09-01.csv")
+    print("✓ Daily file naming")
+
+
+def test_resolver_switches_once_next_file_exists():
+    """No switch while the date matches; after midnight, switch once the new file appears"""
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = _Clock(datetime.datetime(2025, 9, 1, 23, 59))
+        resolver = DailyPathResolver(tmp, clock, check_interval=0)
+        today = picompiled_path(clock.now, tmp)
+        assert resolver(today) is None
+
+        clock.now = datetime.datetime(2025, 9, 2, 0, 1)
+        tomorrow = picompiled_path(clock.now, tmp)
+        assert resolver(today) is None  # not written yet
+
+        _write(tomorrow, HEADER, mode="w")
+        assert resolver(today) == tomorrow
+        assert resolver(tomorrow) is None
+        print("✓ Resolver switches once the next day's file exists")
+
+
+def test_poller_drains_old_file_before_switching():
+    """Changes to the old file are reported before the rotation, then the new file is polled"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "PICompiled2025-09-01.csv")
+        new_path = os.path.join(tmp, "PICompiled2025-09-02.csv")
+        _write(old_path, HEADER + _row(0), mode="w")
+
+        events = []
+        target = {'path': None}
+        poller = AdaptivePoller(old_path, lambda fp: events.append(('change', poller.file_path)),
+                                path_resolver=lambda current: target['path'],
+                                on_rotate=lambda old, new: events.append(('rotate', old, new)))
+        poller.fingerprint = file_fingerprint(old_path)
+
+        # Last unit of the day and the new file appear between two polls
+        _write(old_path, _row(1))
+        _write(new_path, HEADER + _row(2), mode="w")
+        target['path'] = new_path
+        assert poller.check_once()
+
+        assert events == [('change', old_path), ('rotate', old_path, new_path), ('change', new_path)]
+        assert poller.file_path == new_path and poller.stats()['rotations'] == 1
+        print("✓ Poller drains the old file before switching")
+
+
+def test_new_file_is_streamed_from_its_first_row():
+    """After a switch every unit already in the new file is read, and old readers are released"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "PICompiled2025-09-01.csv")
+        new_path = os.path.join(tmp, "PICompiled2025-09-02.csv")
+        _write(old_path, HEADER + _row(0), mode="w")
+        _write(new_path, HEADER + _row(1) + _row(2), mode="w")
+
+        get_incremental_reader(old_path, "test_rotation")
+        assert release_readers(old_path) == 1
+        assert release_readers(old_path) == 0
+
+        units = read_new_unit_contexts(new_path, consumer="test_rotation", from_start=True)
+        assert [unit.sn for unit in units] == [5001, 5002]
+        print("✓ New daily file is streamed from its first row")
+
+
+if __name__ == "__main__":
+    test_daily_file_naming()
+    test_resolver_switches_once_next_file_exists()
+    test_poller_drains_old_file_before_switching()
+    test_new_file_is_streamed_from_its_first_row()
+    print("\nAll daily rotation tests passed")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script to verify per-table DATE format detection and the single date query
+"""
+
+import os
+import sys
+import datetime
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeSchema, FakeServer
+from date_canonical import DateFormatCache, detect_text_representation, parse_date, _sort_column
+from schema_cache import TableSchema
+
+
+def _cache(samples):
+    """DateFormatCache over process1..5_data; samples maps a table to its stored DATE values"""
+    schema = FakeSchema({
+        'process1_data': {'Process_1_DATE': 'varchar(20)'},
+        'process2_data': {'Process_2_DATE': 'varchar(20)'},
+        'process3_data': {'Process_3_DATE': 'date'},
+        'process4_data': {'Process_4_DATE': 'datetime'},
+        'process5_data': {'Process_5_DATE': 'varchar(30)'},
+    })
+    server = FakeServer({table: [(value,) for value in values] for table, values in samples.items()})
+    return DateFormatCache({'database': 'fc_1_data_db'}, connect=server.connect, schema=schema), server
+
+
+def test_text_layouts_are_detected():
+    """Separator, zero padding and a time part are read from stored values"""
+    assert detect_text_representation(['2025/09/10', '2025/10/01']) == ('text', '/', True, False)
+    assert detect_text_representation(['2025-10-15', '2025-9-3']) == ('text', '-', False, False)
+    assert detect_text_representation([b'2025/09/10 08:15:00']) == ('text', '/', True, True)
+    assert detect_text_representation(['', 'n/a']) is None
+    assert parse_date('2025-09-10 08:00') == parse_date('2025/9/10') == datetime.date(2025, 9, 10)
+    print("✓ Text date layouts detected")
+
+
+def test_one_correctly_formatted_condition_per_table():
+    """Every table gets the CSV date in its own stored format"""
+    cache, server = _cache({
+        'process1_data': ['2025/09/10'],
+        'process2_data': ['2025-9-9'],
+        'process5_data': ['2025/09/10 07:00:00'],
+    })
+    csv_date = '2025-09-10'
+    assert cache.condition('process1_data', 'Process_1_DATE', csv_date) == ("Process_1_DATE = %s", ['2025/09/10'])
+    assert cache.condition('process2_data', 'Process_2_DATE', csv_date) == ("Process_2_DATE = %s", ['2025-9-10'])
+    assert cache.condition('process3_data', 'Process_3_DATE', csv_date) == \
+        ("Process_3_DATE = %s", [datetime.date(2025, 9, 10)])
+    sql, params = cache.condition('process4_data', 'Process_4_DATE', csv_date)
+    assert sql == "Process_4_DATE >= %s AND Process_4_DATE < %s"
+    assert params == [datetime.datetime(2025, 9, 10), datetime.datetime(2025, 9, 11)]
+    assert cache.condition('process5_data', 'Process_5_DATE', csv_date) == ("Process_5_DATE LIKE %s", ['2025/09/10%'])
+    print("✓ One correctly formatted condition per table")
+
+
+def test_detection_round_trips_are_paid_once():
+    """Text columns are sampled once; later units need no extra round trips"""
+    cache, server = _cache({'process1_data': ['2025/09/10'], 'process2_data': ['2025/09/10']})
+    for day in range(1, 11):
+        for table, column in (('process1_data', 'Process_1_DATE'), ('process2_data', 'Process_2_DATE'),
+                              ('process3_data', 'Process_3_DATE')):
+            cache.condition(table, column, f"2025/09/{day:02d}")
+
+    # Previously each unit tried up to 3 formats per table (x3 outer attempts in frame)
+    assert len(server.queries) == 2
+    assert cache.stats() == {'columns': 3, 'detections': 2, 'conditions': 30, 'retries': 0, 'relearned': 0}
+    print(f"✓ {len(server.queries)} detection round trips for 30 date lookups")
+
+
+def test_newest_rows_are_sampled():
+    """Detection reads the newest rows: by primary key, else a DateTime column"""
+    cache, server = _cache({'process1_data': ['2025/09/10']})
+    cache.condition('process1_data', 'Process_1_DATE', '2025-09-10')
+    assert "ORDER BY Process_1_DATE DESC LIMIT" in server.queries[-1][0]
+
+    keyed = TableSchema('process1_data', [{'Field': 'Id', 'Type': 'int', 'Key': 'PRI'},
+                                          {'Field': 'Process_1_DATE', 'Type': 'varchar(20)', 'Key': ''}])
+    dated = TableSchema('process1_data', [{'Field': 'Process_1_DateTime', 'Type': 'datetime', 'Key': ''},
+                                          {'Field': 'Process_1_DATE', 'Type': 'varchar(20)', 'Key': ''}])
+    assert _sort_column(keyed, 'Process_1_DATE') == 'Id'
+    assert _sort_column(dated, 'Process_1_DATE') == 'Process_1_DateTime'
+    print("✓ Newest rows sampled")
+
+
+def test_changed_layout_is_retried_and_relearned():
+    """A dated lookup that finds nothing is retried in every layout and the match is cached"""
+    cache, server = _cache({'process1_data': ['2025/09/10']})
+    assert cache.condition('process1_data', 'Process_1_DATE', '2025-09-10')[1] == ['2025/09/10']
+
+    # The table is now written as 2025-9-1; '2025-9-1%' must not also match 2025-9-10
+    stored = {'Process_1_DATE': '2025-9-1 07:00:00'}
+    calls = []
+
+    def run(sql, params):
+        calls.append((sql, params))
+        return [stored] if '2025-9-1 %' in params else []
+
+    assert cache.retry('process1_data', 'Process_1_DATE', '2025-09-01', run) == [stored]
+    sql, params = calls[0]
+    assert sql.startswith("(Process_1_DATE IN (") and '2025-9-1%' not in params and '2025.09.01%' in params
+    assert cache.condition('process1_data', 'Process_1_DATE', '2025-09-01') == \
+        ("Process_1_DATE LIKE %s", ['2025-9-1 %'])
+    assert cache.stats()['retries'] == 1 and cache.stats()['relearned'] == 1
+
+    # Native columns have no other layout to try
+    assert cache.retry('process3_data', 'Process_3_DATE', '2025-09-01', run) == [] and len(calls) == 1
+    print("✓ Changed date layout retried and relearned")
+
+
+if __name__ == "__main__":
+    test_text_layouts_are_detected()
+    test_one_correctly_formatted_condition_per_table()
+    test_detection_round_trips_are_paid_once()
+    test_newest_rows_are_sampled()
+    test_changed_layout_is_retried_and_relearned()
+    print("\nAll date canonicalization tests passed")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the database deadlines, circuit breaker and stale fallbacks
+"""
+
+import os
+import sys
+import time
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from mysql.connector.errors import PoolError
+from fake_db import FakeSchema, FakeServer, LostConnection
+from baseline_provider import BaselineProvider
+from db_health import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, check_deadline, cycle_deadline,
+                       remaining, take_stale_notes)
+from db_pool import ConnectionPool
+from inspection_cache import InspectionCache
+from inspection_lookup import latest_complete_records
+from query_log import QueryLog
+
+
+def _query(pool):
+    connection = pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def test_breaker_trips_and_probes():
+    """Three timeouts open the circuit; after the cooldown one probe closes it again"""
+    server = FakeServer()
+    breaker = CircuitBreaker('db/fc_1_data_db', threshold=3, cooldown=0.2)
+    pool = ConnectionPool({'host': 'db', 'database': 'fc_1_data_db'}, connect=server.connect,
+                          query_log=QueryLog(slow_log_path=None), breaker=breaker)
+    _query(pool)
+
+    server.down = True
+    for _ in range(3):
+        try:
+            _query(pool)
+            assert False, "query should fail"
+        except LostConnection:
+            pass
+    assert pool.stats()['circuit'] == 'open'
+
+    # Rejected without reaching the server
+    queries = len(server.queries)
+    try:
+        _query(pool)
+        assert False, "circuit should be open"
+    except CircuitOpenError:
+        pass
+    assert len(server.queries) == queries and breaker.stats()['rejected'] == 1
+
+    time.sleep(0.25)
+    server.down = False
+    _query(pool)
+    assert pool.stats()['circuit'] == 'closed' and breaker.stats()['trips'] == 1
+
+    # Errors that are not timeouts mean the server answered; a full local pool says nothing about it
+    breaker.record_failure(ValueError("Unknown column"))
+    for _ in range(3):
+        breaker.record_failure(PoolError("No free database connection"))
+    assert breaker.stats()['failures'] == 0 and pool.stats()['circuit'] == 'closed'
+    print("✓ Circuit opens after timeouts and closes after a probe")
+
+
+def test_deadline_limits_database_work():
+    """Queries after the unit's deadline fail fast with DeadlineExceeded"""
+    server = FakeServer()
+    pool = ConnectionPool({'host': 'db', 'database': 'deadline_db'}, connect=server.connect,
+                          query_log=QueryLog(slow_log_path=None), breaker=CircuitBreaker('db/deadline_db'))
+    assert remaining() is None
+    with cycle_deadline(0.05):
+        _query(pool)
+        assert 0 < remaining() <= 0.05
+        time.sleep(0.06)
+        try:
+            _query(pool)
+            assert False, "deadline should be exceeded"
+        except DeadlineExceeded:
+            pass
+    check_deadline()
+    assert len(server.queries) == 1
+    print("✓ Deadline stops database work of a unit")
+
+
+BASELINE_SCHEMA = {'database_data': {'Model_Code': 'varchar(20)', 'DATE': 'varchar(10)',
+                                     'Process_5_Pressure_1_Data': 'double'}}
+
+
+def test_stale_baseline_while_database_is_down():
+    """The last baseline is served, marked stale, while the database does not answer"""
+    server = FakeServer([{'Model_Code': '60CAT0212P', 'DATE': '2025-09-10', 'Process_5_Pressure_1_Data': 1.0}])
+    schema = FakeSchema(BASELINE_SCHEMA)
+    config = {'host': 'stale-test', 'database': 'fc_1_data_db'}
+    take_stale_notes()
+
+    fresh = BaselineProvider(config, connect=server.connect, schema=schema).raw('60CAT0212P')
+    assert not fresh.attrs.get('stale')
+
+    server.down = True
+    stale = BaselineProvider(config, connect=server.connect, schema=schema).raw('60CAT0212P')
+    assert stale.attrs['stale'] and stale['Process_5_Pressure_1_Data'].tolist() == [1.0]
+    notes = take_stale_notes()
+    assert len(notes) == 1 and '60CAT0212P' in notes[0]
+
+    # Nothing to fall back to: the error surfaces
+    try:
+        BaselineProvider(config, connect=server.connect, schema=schema).raw('OTHER')
+        assert False, "should raise without a cached baseline"
+    except LostConnection:
+        pass
+    try:
+        BaselineProvider(config, connect=server.connect, schema=schema, serve_stale=False).raw('60CAT0212P')
+        assert False, "serve_stale=False should raise"
+    except LostConnection:
+        pass
+    print("✓ Stale baseline served while the database is down")
+
+
+def test_cached_inspection_without_connection():
+    """Without a connection, finished and provisional lots come from the inspection cache"""
+    cache = InspectionCache()
+    variant = (('Lot_Number', 'Average'), 'Date')
+    cache.store('fm05000102_inspection', 'L1', {'Lot_Number': 'L1', 'Average': 2.0}, variant)
+    cache.store('fm05000102_inspection', 'L2', {'Lot_Number': 'L2', 'Average': None}, variant, final=False)
+    take_stale_notes()
+
+    records = latest_complete_records(None, {'database': 'fc_1_data_db'}, 'fm05000102_inspection',
+                                      ['Lot_Number', 'Average'], 'Date', ['L1', 'L2', 'L3'], cache=cache)
+    assert list(records) == ['L1', 'L2'] and records['L2']['Average'] is None
+    assert len(take_stale_notes()) == 1
+    print("✓ Cached inspection records served without a connection")
+
+
+if __name__ == "__main__":
+    test_breaker_trips_and_probes()
+    test_deadline_limits_database_work()
+    test_stale_baseline_while_database_is_down()
+    test_cached_inspection_without_connection()
+    print("\nAll database health tests passed")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared MySQL connection pool
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from mysql.connector.errors import PoolError
+from fake_db import FakeServer
+from db_pool import ConnectionPool
+
+
+def _pool(**kwargs):
+    server = FakeServer()
+    return ConnectionPool({'host': 'db', 'database': 'fc_1_data_db'}, connect=server.connect, **kwargs), \
+        server.connections
+
+
+def test_connections_are_reused():
+    """close() returns the connection to the pool and the next checkout reuses it"""
+    pool, opened = _pool(size=2)
+    connection = pool.get_connection()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT 1")
+    assert cursor.executed == ["SELECT 1"] and cursor.dictionary
+    connection.close()
+    connection.close()  # harmless twice
+
+    again = pool.get_connection()
+    again.close()
+    assert len(opened) == 1 and not opened[0].closed
+    assert opened[0].config['autocommit'] is True
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['created'], stats['open'], stats['idle']) == (2, 1, 1, 1)
+    assert stats['round_trips'] == 1
+    print("✓ Connections are reused")
+
+
+def test_checkout_waits_for_a_free_connection():
+    """With every connection in use, checkout waits for one to be returned or times out"""
+    pool, opened = _pool(size=1)
+    # Held by another thread; a thread's own nested checkout never waits
+    checked_out = []
+    holder = threading.Thread(target=lambda: checked_out.append(pool.get_connection()))
+    holder.start()
+    holder.join()
+    held = checked_out[0]
+    try:
+        pool.get_connection(timeout=0.05)
+        raise AssertionError("Expected PoolError")
+    except PoolError:
+        pass
+
+    threading.Timer(0.1, held.close).start()
+    start = time.monotonic()
+    pool.get_connection(timeout=2.0).close()
+    assert time.monotonic() - start >= 0.05
+    stats = pool.stats()
+    assert stats['waits'] == 1 and stats['max_wait'] >= 0.05 and stats['failures'] == 1
+    assert len(opened) == 1
+    print("✓ Checkout waits for a free connection")
+
+
+def test_nested_checkout_does_not_wait():
+    """A thread holding a connection gets an overflow one instead of waiting on a full pool"""
+    pool, opened = _pool(size=2)
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def step():
+        # Like a traceability fetch looking up a date format while holding its connection
+        try:
+            with pool.get_connection():
+                barrier.wait(timeout=2)
+                with pool.get_connection(timeout=0.5):
+                    barrier.wait(timeout=2)
+        except Exception as e:
+            errors.append(e)
+
+    # As many concurrent steps as pooled connections
+    threads = [threading.Thread(target=step) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()
+    assert not errors, errors
+    assert stats['overflows'] == 2 and stats['failures'] == 0
+    # Overflow connections are closed on return; the pool keeps size open
+    assert stats['open'] == stats['idle'] == 2 and sum(connection.closed for connection in opened) == 2
+    print("✓ Nested checkouts do not wait on a full pool")
+
+
+def test_dropped_connection_is_replaced_on_checkout():
+    """Idle connections are pinged and a dead one is replaced with a new connection"""
+    pool, opened = _pool(size=2, health_check_idle=0.0)
+    assert pool.warm_up() == 2
+    for connection in opened:
+        connection.alive = False
+
+    pool.get_connection().close()
+    assert len(opened) == 3 and opened[1].closed
+    assert pool.stats()['reconnects'] == 1
+    print("✓ Dropped connection replaced on checkout")
+
+
+def test_connection_with_unread_result_is_discarded():
+    """A connection whose unread result cannot be drained is closed instead of reused"""
+    pool, opened = _pool(size=1)
+    connection = pool.get_connection()
+    opened[0].unread_result = True
+    connection.close()
+    assert opened[0].closed
+    assert pool.stats()['open'] == 0
+
+    pool.get_connection().close()
+    assert len(opened) == 2
+    print("✓ Connection with unread result discarded")
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_checkout_waits_for_a_free_connection()
+    test_nested_checkout_does_not_wait()
+    test_dropped_connection_is_replaced_on_checkout()
+    test_connection_with_unread_result_is_discarded()
+    print("\nAll connection pool tests passed")
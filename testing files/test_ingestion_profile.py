@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the column-projected, typed CSV ingestion profile
+"""
+
+import os
+import sys
+import tempfile
+import pandas as pd
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from ingestion_profile import IngestionProfile, clean_model_code
+from keyword_filter import KeywordFilter
+from picompiled_reader import IncrementalCSVReader, parse_lines
+from unit_context import CSV_ROW_FILTER, UNIT_PROFILE
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,PRESSURE,REMARKS,JUDGEMENT\n"
+
+
+def _row(i, remarks="OK", judgement="PASS"):
+    return f'2025/09/10,"60CAT021{i % 3}P",{1000 + i},{5000 + i},{10 + i / 10},{remarks},{judgement}\n'
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def test_profile_parses_only_unit_columns_with_declared_dtypes():
+    """Only the unit columns are returned, MODEL CODE as a categorical, offsets intact"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0) + _row(1, remarks="NG PRESSURE") + _row(2), mode="w")
+
+        rows = IncrementalCSVReader(path, profile=UNIT_PROFILE).read_new_rows()
+        assert list(rows.columns) == ['DATE', 'MODEL CODE', 'PROCESS S/N', 'S/N']
+        assert isinstance(rows["MODEL CODE"].dtype, pd.CategoricalDtype)
+        assert rows["DATE"].iloc[0] == "2025/09/10"
+        assert list(rows["S/N"]) == [5000, 5002]
+        assert list(rows.index) == [len(HEADER), len(HEADER) + len(_row(0)) + len(_row(1, remarks="NG PRESSURE"))]
+        assert list(clean_model_code(rows["MODEL CODE"])) == ["60CAT0210P", "60CAT0212P"]
+        print("✓ Profile parses only the unit columns")
+
+
+def test_line_filter_keeps_the_same_units_as_the_parsed_filter():
+    """Dropping keyword lines before parsing keeps exactly the rows row_mask() keeps"""
+    lines = [_row(0), _row(1, remarks="TRIAL RUN"), _row(2, judgement="ng"), _row(3),
+             _row(4, remarks="MASTER PUMP"), _row(5, remarks="re pi done"), _row(6)]
+    data = "".join(lines).encode()
+    columns = HEADER.strip().split(",")
+
+    legacy = parse_lines(columns, data, len(HEADER))
+    legacy = CSV_ROW_FILTER.filter_rows(legacy)
+    profiled = parse_lines(columns, data, len(HEADER), profile=UNIT_PROFILE)
+
+    assert list(profiled.index) == list(legacy.index)
+    assert list(profiled["S/N"]) == list(legacy["S/N"]) == [5000, 5003, 5006]
+
+    # Every line filtered out: empty frame with the profile's columns
+    empty = parse_lines(columns, lines[1].encode(), len(HEADER), profile=UNIT_PROFILE)
+    assert empty.empty and list(empty.columns) == list(profiled.columns)
+    print("✓ Line filter keeps the same units as the parsed filter")
+
+
+def test_unavailable_engine_falls_back_to_c_parser():
+    """A parser engine that cannot be used is replaced by pandas' C parser"""
+    profile = IngestionProfile(['S/N'], engine='no-such-engine')
+    rows = profile.read(_row(0).encode(), HEADER.strip().split(","))
+    assert list(rows["S/N"]) == [5000]
+    assert profile.engine == 'c'
+    print("✓ Unavailable engine falls back to the C parser")
+
+
+def test_column_restricted_line_filter_is_rejected():
+    """Raw-line filtering cannot honour a filter restricted to some columns"""
+    try:
+        IngestionProfile(line_filter=KeywordFilter(['NG'], columns=['REMARKS']))
+    except ValueError:
+        print("✓ Column-restricted line filter rejected")
+        return
+    raise AssertionError("Expected ValueError")
+
+
+if __name__ == "__main__":
+    test_profile_parses_only_unit_columns_with_declared_dtypes()
+    test_line_filter_keeps_the_same_units_as_the_parsed_filter()
+    test_unavailable_engine_falls_back_to_c_parser()
+    test_column_restricted_line_filter_is_rejected()
+    print("\nAll ingestion profile tests passed")
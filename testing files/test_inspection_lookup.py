@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the batched latest-complete inspection record lookup
+"""
+
+import os
+import sys
+import stat
+import decimal
+import sqlite3
+import datetime
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeSchema, FakeServer
+from inspection_cache import InspectionCache
+from inspection_lookup import latest_complete_records
+
+
+class ParseError(Exception):
+    errno = 1064
+
+
+class SQLiteCursor:
+    """Dictionary cursor over sqlite3 speaking the mysql.connector paramstyle"""
+
+    def __init__(self, connection, window_functions=True):
+        self.connection = connection
+        self.window_functions = window_functions
+        self.queries = 0
+
+    def execute(self, sql, params=()):
+        if not self.window_functions and 'OVER (' in sql:
+            raise ParseError("You have an error in your SQL syntax")
+        self.queries += 1
+        self.cursor = self.connection.execute(sql.replace('%s', '?'), list(params))
+
+    def fetchall(self):
+        names = [description[0] for description in self.cursor.description]
+        return [dict(zip(names, row)) for row in self.cursor.fetchall()]
+
+
+def _database():
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE fm05000102_inspection "
+                       "(id INTEGER PRIMARY KEY, Lot_Number TEXT COLLATE NOCASE, Date TEXT, Inspection_1_Average REAL)")
+    connection.executemany(
+        "INSERT INTO fm05000102_inspection (Lot_Number, Date, Inspection_1_Average) VALUES (?, ?, ?)", [
+            ('L1', '2025-09-08', 1.0),
+            ('L1', '2025-09-09', 2.0),
+            ('L1', '2025-09-10', None),   # newest but incomplete
+            ('L2', '2025-09-07', None),   # only incomplete rows
+            ('L2', '2025-09-06', None),
+            ('L3', '2025-09-05', 5.0),
+        ])
+    return connection
+
+
+COLUMNS = ['Lot_Number', 'Date', 'Inspection_1_Average']
+CONFIG = {'host': 'db', 'database': 'fc_1_data_db'}
+
+
+def _check(records):
+    assert records['L1'] == {'Lot_Number': 'L1', 'Date': '2025-09-09', 'Inspection_1_Average': 2.0}
+    assert records['L2']['Date'] == '2025-09-07'
+    assert 'L4' not in records and list(records) == ['L1', 'L2', 'L3']
+
+
+def test_one_query_returns_one_row_per_lot():
+    """The newest complete record of every lot comes back from a single query"""
+    cursor = SQLiteCursor(_database())
+    records = latest_complete_records(cursor, CONFIG, 'fm05000102_inspection', COLUMNS, 'Date',
+                                      ['L1', 'L2', 'L3', 'L4', 'L1'])
+    _check(records)
+    assert cursor.queries == 1
+    print("✓ One query returns the latest complete record per lot")
+
+
+def test_servers_without_window_functions():
+    """Without ROW_NUMBER() the lots are still fetched in one query and ranked here"""
+    cursor = SQLiteCursor(_database(), window_functions=False)
+    config = {'host': 'mysql57', 'database': 'fc_1_data_db'}
+    _check(latest_complete_records(cursor, config, 'fm05000102_inspection', COLUMNS, 'Date', ['L1', 'L2', 'L3', 'L4']))
+    _check(latest_complete_records(cursor, config, 'fm05000102_inspection', COLUMNS, 'Date', ['L1', 'L2', 'L3', 'L4']))
+    assert cursor.queries == 2
+    print("✓ Client-side ranking used without window functions")
+
+
+def test_cache_persists_complete_lots():
+    """Finished lots are served from the cache, also after a restart; incomplete ones are queried again"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(cache_dir, 'db_fc_1_data_db.json')
+        cursor = SQLiteCursor(_database())
+        _check(latest_complete_records(cursor, CONFIG, 'fm05000102_inspection', COLUMNS, 'Date',
+                                       ['L1', 'L2', 'L3', 'L4'], cache=InspectionCache(path)))
+
+        # A new process: L1 and L3 come from disk, only L2 (no complete record) and L4 are queried
+        cache = InspectionCache(path)
+        records = latest_complete_records(cursor, CONFIG, 'fm05000102_inspection', COLUMNS, 'Date',
+                                          ['L1', 'L2', 'L3', 'L4'], cache=cache)
+        _check(records)
+        assert cursor.queries == 2 and cache.stats()['hits'] == 2
+
+        records = latest_complete_records(cursor, CONFIG, 'fm05000102_inspection', COLUMNS, 'Date',
+                                          ['L1', 'L3'], cache=cache)
+        assert cursor.queries == 2
+        records['L1']['Inspection_1_Average'] = 0.0
+        assert cache.get('fm05000102_inspection', 'L1', (tuple(COLUMNS), 'Date'))['Inspection_1_Average'] == 2.0
+
+        # Other columns are a different lookup; invalidation forces a query
+        assert cache.get('fm05000102_inspection', 'L1', (('Lot_Number',), 'Date')) is None
+        assert cache.invalidate('fm05000102_inspection', 'L1') == 1
+        latest_complete_records(cursor, CONFIG, 'fm05000102_inspection', COLUMNS, 'Date', ['L1', 'L3'], cache=cache)
+        assert cursor.queries == 3
+        # L2 is kept as provisional: skipped by lookups, but served while the database is down
+        assert len(InspectionCache(path)) == 3
+        assert cache.get('fm05000102_inspection', 'L2', (tuple(COLUMNS), 'Date')) is None
+        found, _ = cache.lookup('fm05000102_inspection', ['L2'], (tuple(COLUMNS), 'Date'), include_provisional=True)
+        assert 'L2' in found
+
+        small = InspectionCache(capacity=2)
+        for lot in ('A', 'B', 'A', 'C'):
+            small.store('t', lot, {'lot': lot})
+        assert small.get('t', 'B') is None and small.get('t', 'A') == {'lot': 'A'}
+    print("✓ Complete lots are cached on disk")
+
+
+def test_cache_file_is_plain_private_json():
+    """Rows round-trip through JSON; a file other users can write is not loaded"""
+    rows = [{'Lot_Number': 'R1', 'Date': datetime.date(2025, 9, 10), 'Time': datetime.timedelta(hours=7),
+             'Inspected': datetime.datetime(2025, 9, 10, 7, 30), 'Average': decimal.Decimal('2.50'),
+             'Raw': b'\x00\x01', 'Count': 3, 'Remarks': None}]
+    variant = (('Lot_Number', 'Average'), 'Date')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        path = os.path.join(cache_dir, 'db_fc_1_data_db.json')
+        cache = InspectionCache(path)
+        cache.store('rd05200200_inspection', 'R1', rows, variant)
+        cache.save()
+        with open(path, encoding='utf-8') as handle:
+            assert handle.read().startswith('{')
+        assert InspectionCache(path).get('rd05200200_inspection', 'R1', variant) == rows
+
+        if hasattr(os, 'getuid'):
+            assert not os.stat(path).st_mode & 0o077
+            os.chmod(path, os.stat(path).st_mode | stat.S_IWOTH)
+            assert len(InspectionCache(path)) == 0
+    print("✓ Cache file is private JSON")
+
+
+def test_incomplete_lot_is_fetched_again():
+    """A lot read with SELECT * is queried again while any of its values is missing"""
+    import df_blk_output
+    rows = [{'Lot_Number': 'D1', 'Date': '2025-09-10', 'Inspection_1_Average': None}]
+    server = FakeServer({'df06600600_inspection': rows})
+    cache = InspectionCache()
+    schema = FakeSchema({'df06600600_inspection': {'Lot_Number': 'varchar(20)', 'Date': 'varchar(10)',
+                                                   'Inspection_1_Average': 'double'}})
+    patched = {'get_connection': server.connect, 'get_inspection_cache': lambda config: cache,
+               'get_schema_cache': lambda config: schema}
+    originals = {name: getattr(df_blk_output, name) for name in patched}
+    try:
+        for name, function in patched.items():
+            setattr(df_blk_output, name, function)
+        df_blk_output.get_df06600600_inspection_data('D1')
+        df_blk_output.get_df06600600_inspection_data('D1')
+        assert len(server.queries) == 2
+
+        rows[0]['Inspection_1_Average'] = 2.0
+        df_blk_output.get_df06600600_inspection_data('D1')
+        assert df_blk_output.get_df06600600_inspection_data('D1')['Inspection_1_Average'].tolist() == [2.0]
+        assert len(server.queries) == 3
+    finally:
+        for name, function in originals.items():
+            setattr(df_blk_output, name, function)
+    print("✓ Incomplete lot fetched again")
+
+
+def test_lots_match_like_the_server_collation():
+    """A lot stored in another case still comes back under the requested lot number"""
+    for window_functions in (True, False):
+        connection = _database()
+        connection.execute("INSERT INTO fm05000102_inspection (Lot_Number, Date, Inspection_1_Average) "
+                           "VALUES ('l5', '2025-09-10', 5.5)")
+        cursor = SQLiteCursor(connection, window_functions)
+        config = {'host': f"collation-{window_functions}", 'database': 'fc_1_data_db'}
+        records = latest_complete_records(cursor, config, 'fm05000102_inspection', COLUMNS, 'Date', ['L5', 'L1'])
+        assert list(records) == ['L5', 'L1'] and records['L5']['Inspection_1_Average'] == 5.5
+    print("✓ Lots matched like the server collation")
+
+
+if __name__ == "__main__":
+    test_one_query_returns_one_row_per_lot()
+    test_servers_without_window_functions()
+    test_cache_persists_complete_lots()
+    test_lots_match_like_the_server_collation()
+    test_cache_file_is_plain_private_json()
+    test_incomplete_lot_is_fetched_again()
+    print("\nAll inspection lookup tests passed")
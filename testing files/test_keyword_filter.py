@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared keyword row filter
+"""
+
+import os
+import sys
+import decimal
+import numpy as np
+import pandas as pd
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from keyword_filter import KeywordFilter
+
+
+def test_matches_legacy_loop():
+    """Same rows are kept as the old keyword x column str.contains loop"""
+    df = pd.DataFrame({
+        'REMARKS': ['ok', 'ng pressure', None, 'Master Pump check', 'fine'],
+        'CODE': ['60CAT', '60CAT', 'TRIAL-1', np.nan, '60CAT'],
+        'VALUE': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'MIXED': [decimal.Decimal('1.5'), 'RUNNING', 3, None, 'x'],
+    })
+    keywords = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI']
+
+    legacy = pd.Series([True] * len(df))
+    for keyword in keywords:
+        for col in df.columns:
+            if df[col].dtype == 'object':
+                legacy = legacy & (~df[col].astype(str).str.contains(keyword, case=False, na=False))
+
+    mask = KeywordFilter(keywords).row_mask(df)
+    assert mask.tolist() == legacy.tolist() == [True, False, False, False, True]
+    print("✓ Row mask matches the legacy loop")
+
+
+def test_configured_columns_and_case():
+    """Only configured columns are scanned and case-sensitive matching is honoured"""
+    df = pd.DataFrame({
+        'Process_1_NG_Cause': ['', 'REPAIRED AT P2', ''],
+        'Comment': ['REPAIRED AT P1', '', ''],
+        'Name': ['Test unit', 'unit', 'TEST'],
+    })
+    ng_filter = KeywordFilter(['REPAIRED AT'], columns=lambda col: 'NG_Cause' in col)
+    assert ng_filter.row_mask(df).tolist() == [True, False, True]
+    assert ng_filter.columns_with_matches(df) == ['Process_1_NG_Cause']
+
+    case_filter = KeywordFilter(['TEST'], case=True)
+    assert case_filter.row_mask(df).tolist() == [True, True, False]
+    print("✓ Column restriction and case sensitivity work")
+
+
+def test_mask_aligns_with_non_default_index():
+    """Rows from the incremental reader keep their file row numbers as index"""
+    df = pd.DataFrame({'REMARKS': ['ok', 'RE PI']}, index=[40, 41])
+    kept = KeywordFilter(['RE PI']).filter_rows(df)
+    assert list(kept.index) == [40]
+    print("✓ Mask keeps the frame's index")
+
+
+def test_raw_line_matches():
+    """Raw CSV lines are matched with the same case rules as parsed values"""
+    lines = [b'1,60CAT0212P,ok', b'2,60CAT0212P,re pi', b'3,60CAT0212P,Test', b'4,60CAT0212P,TEST']
+    assert KeywordFilter(['RE PI', 'test']).line_matches(lines).tolist() == [False, True, True, True]
+    assert KeywordFilter(['TEST'], case=True).line_matches(lines).tolist() == [False, False, False, True]
+    assert KeywordFilter([]).line_matches(lines).tolist() == [False] * 4
+    print("✓ Raw lines matched like parsed values")
+
+
+if __name__ == "__main__":
+    test_matches_legacy_loop()
+    test_configured_columns_and_case()
+    test_mask_aligns_with_non_default_index()
+    test_raw_line_matches()
+    print("\nAll keyword filter tests passed")
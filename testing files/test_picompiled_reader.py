@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the incremental PICompiled CSV reader
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from keyword_filter import KeywordFilter
+from picompiled_reader import IncrementalCSVReader, locate_last_valid_unit
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,REMARKS\n"
+
+
+def _row(i, remarks="OK"):
+    return f"2025/09/10,60CAT0212P,{1000 + i},{5000 + i},{remarks}\n"
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def test_only_appended_rows_are_parsed():
+    """Each pass returns just the rows written since the previous pass"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0) + _row(1), mode="w")
+
+        reader = IncrementalCSVReader(path)
+        first = reader.read_new_rows()
+        assert list(first["S/N"]) == [5000, 5001]
+        assert reader.was_reset
+
+        _write(path, _row(2))
+        second = reader.read_new_rows()
+        assert list(second["S/N"]) == [5002]
+        # Rows are indexed by the byte offset of their line
+        assert list(second.index) == [len(HEADER) + 2 * len(_row(0))]
+        assert not reader.was_reset
+
+        assert reader.read_new_rows().empty
+        assert reader.last_row["S/N"].iloc[0] == 5002
+        print("✓ Incremental reads return only appended rows")
+
+
+def test_partial_last_line_is_held_back():
+    """A line without its newline yet is not parsed until it is complete"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0), mode="w")
+
+        reader = IncrementalCSVReader(path)
+        reader.read_new_rows()
+
+        partial = _row(1)
+        _write(path, partial[:12])
+        assert reader.read_new_rows().empty
+
+        _write(path, partial[12:])
+        rows = reader.read_new_rows()
+        assert list(rows["S/N"]) == [5001]
+        print("✓ Partially written line is held back until complete")
+
+
+def test_truncation_and_replacement_trigger_full_reread():
+    """A shrunk or rewritten file is re-read from the start"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0) + _row(1) + _row(2), mode="w")
+
+        reader = IncrementalCSVReader(path)
+        reader.read_new_rows()
+        reader.state['last_valid_row'] = 'stale'
+
+        # Truncated
+        _write(path, HEADER + _row(7), mode="w")
+        rows = reader.read_new_rows()
+        assert reader.was_reset
+        assert list(rows["S/N"]) == [5007]
+        assert 'last_valid_row' not in reader.state
+
+        # Replaced by a larger file with the same header
+        _write(path, HEADER + _row(8) + _row(9) + _row(10), mode="w")
+        rows = reader.read_new_rows()
+        assert reader.was_reset
+        assert list(rows["S/N"]) == [5008, 5009, 5010]
+        print("✓ Truncation and replacement are detected")
+
+
+def test_locator_reads_backwards_to_last_valid_unit():
+    """The reverse locator skips filtered rows and a partial last line across block boundaries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        rows = [_row(i) for i in range(200)]
+        rows += [_row(200, "NG PRESSURE"), _row(201, "TRIAL RUN")]
+        _write(path, HEADER + "".join(rows) + _row(202)[:10], mode="w")
+
+        row_filter = KeywordFilter(['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI'])
+        unit = locate_last_valid_unit(path, row_filter, block_size=64)
+        assert list(unit.columns) == ['DATE', 'MODEL CODE', 'PROCESS S/N', 'S/N']
+        assert unit["S/N"].iloc[0] == 5199
+        assert unit.index[0] == len(HEADER) + 199 * len(_row(0))
+
+        # Same answer as a full parse followed by tail(1)
+        reader = IncrementalCSVReader(path)
+        expected = row_filter.filter_rows(reader.read_new_rows()).tail(1)
+        assert unit.index[0] == expected.index[0]
+
+        assert locate_last_valid_unit(path, KeywordFilter(['60CAT'])) is None
+        print("✓ Reverse locator finds the last valid unit")
+
+
+def test_seek_to_end_skips_existing_rows():
+    """After seek_to_end only rows appended later are parsed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        partial = _row(2)
+        _write(path, HEADER + _row(0) + _row(1) + partial[:8], mode="w")
+
+        reader = IncrementalCSVReader(path)
+        assert reader.seek_to_end() == len(HEADER) + 2 * len(_row(0))
+        _write(path, partial[8:] + _row(3))
+        assert list(reader.read_new_rows()["S/N"]) == [5002, 5003]
+        print("✓ seek_to_end starts at the last complete line")
+
+
+if __name__ == "__main__":
+    test_only_appended_rows_are_parsed()
+    test_partial_last_line_is_held_back()
+    test_truncation_and_replacement_trigger_full_reread()
+    test_locator_reads_backwards_to_last_valid_unit()
+    test_seek_to_end_skips_existing_rows()
+    print("\nAll incremental reader tests passed")
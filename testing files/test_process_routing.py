@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the material -> process table routing index
+"""
+
+import os
+import sys
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from process_routing import ProcessTableRouter, ProcessRoute
+from csb_data_output import CASING_COLUMN_PATTERNS
+
+
+class FakeSchema:
+    """Just the SchemaCache lookups the router uses"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.lookups = 0
+
+    def has_column(self, table, column):
+        self.lookups += 1
+        return column.lower() in (c.lower() for c in self.tables.get(table, []))
+
+    def column_hash(self, table):
+        columns = self.tables.get(table)
+        return None if columns is None else hash(tuple(columns))
+
+
+TABLES = {
+    'process1_data': ['Process_1_S_N', 'Process_1_Frame', 'Process_1_Frame_Lot_No',
+                      'Process_1_Em2p', 'Process_1_Em2p_Lot_No', 'Process_1_Em3p'],
+    'process2_data': ['Process_2_S_N', 'Process_2_Rod_Blk', 'Process_2_Rod_Blk_Lot_No', 'Process_2_Df_Blk'],
+    'process3_data': ['Process_3_S_N', 'P3_CasingBlock', 'P3_CasingBlock_Lot_No'],
+    'process4_data': ['Process_4_S_N'],
+}
+
+
+def test_materials_are_routed_to_their_tables():
+    """Only the process tables holding a material's columns are returned"""
+    router = ProcessTableRouter(FakeSchema(TABLES))
+    assert router.routes('Frame') == [ProcessRoute(1, 'process1_data', 'Process_1_Frame', 'Process_1_Frame_Lot_No')]
+    assert router.routes('Em3p') == [ProcessRoute(1, 'process1_data', 'Process_1_Em3p', None)]
+    assert router.process_numbers_for(['Em2p', 'Em3p']) == [1]
+    assert router.process_numbers_for(['Rod_Blk', 'Df_Blk']) == [2]
+    assert router.process_numbers_for(['Casing_Block']) == []
+    assert router.routes('Casing_Block', CASING_COLUMN_PATTERNS)[0].material_column == 'P3_CasingBlock'
+    print("✓ Materials routed to their process tables")
+
+
+def test_routes_are_cached_until_the_layout_changes():
+    """Routes are rebuilt only when a process table's columns change"""
+    tables = {name: list(columns) for name, columns in TABLES.items()}
+    schema = FakeSchema(tables)
+    router = ProcessTableRouter(schema)
+    router.routes('Frame')
+    lookups = schema.lookups
+    router.routes('Frame')
+    assert schema.lookups == lookups
+
+    tables['process4_data'] += ['Process_4_Frame', 'Process_4_Frame_Lot_No']
+    assert router.process_numbers_for(['Frame']) == [1, 4]
+    print("✓ Routes cached until the process table layout changes")
+
+
+if __name__ == "__main__":
+    test_materials_are_routed_to_their_tables()
+    test_routes_are_cached_until_the_layout_changes()
+    print("\nAll process routing tests passed")
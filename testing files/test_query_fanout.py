@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the concurrent query fan-out with dependencies
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeServer
+from db_pool import POOL_SIZE, ConnectionPool
+from query_fanout import FANOUT_WORKERS, DependencyError, QueryGraph, run_concurrently
+from query_log import get_query_log, query_scope
+
+
+def slow(seconds, value):
+    def step(*inputs):
+        time.sleep(seconds)
+        return (value, inputs)
+    return step
+
+
+def test_wall_time_follows_longest_chain():
+    """Baseline runs beside the lot lookup; inspection starts as soon as the lots are known"""
+    started = {}
+
+    def inspection(lots):
+        started['inspection'] = time.monotonic()
+        return f"inspection of {lots[0]}"
+
+    graph = QueryGraph()
+    graph.add('baseline', slow(0.3, 'baseline rows'))
+    graph.add('lots', slow(0.1, 'L1'))
+    graph.add('inspection', inspection, depends_on=['lots'])
+    graph.add('deviation', lambda baseline, record: (baseline[0], record), depends_on=['baseline', 'inspection'])
+
+    start = time.monotonic()
+    graph.start()
+    assert graph.result('deviation') == ('baseline rows', 'inspection of L1')
+    elapsed = time.monotonic() - start
+    assert elapsed < 0.39, elapsed
+    # The inspection did not wait for the baseline
+    assert started['inspection'] - start < 0.25
+    stats = graph.stats()
+    assert stats['serial_time'] >= 0.4 and stats['wall_time'] < stats['serial_time']
+    print(f"✓ Wall time {elapsed:.2f}s for {stats['serial_time']:.2f}s of steps")
+
+
+def test_failures_skip_dependents():
+    """A failing step fails its dependents without running them; independent steps still finish"""
+    ran = []
+
+    def fail():
+        raise ValueError("server gone")
+
+    graph = QueryGraph()
+    graph.add('lots', fail)
+    graph.add('inspection', lambda lots: ran.append(lots), depends_on=['lots'])
+    graph.add('baseline', slow(0.01, 'rows'))
+    results, errors = graph.wait()
+    assert results == {'baseline': ('rows', ())} and not ran
+    assert isinstance(errors['lots'], ValueError) and isinstance(errors['inspection'], DependencyError)
+
+    try:
+        run_concurrently({'a': slow(0.01, 1), 'b': fail})
+        assert False, "run_concurrently should raise"
+    except ValueError:
+        pass
+    print("✓ Failures skip dependent steps")
+
+
+def test_steps_keep_the_callers_scope():
+    """Queries of a step are reported under the scope active when it was added"""
+    seen = []
+    with query_scope('Df Block'):
+        results = run_concurrently({
+            'a': lambda: seen.append((threading.current_thread().name, get_query_log().current_scope())),
+            'b': lambda: 'b',
+        })
+    assert results['b'] == 'b'
+    assert seen[0][0].startswith('query-fanout') and seen[0][1] == 'Df Block'
+    print("✓ Steps keep the caller's query scope")
+
+
+def test_fanout_leaves_a_pooled_connection_free():
+    """A full fan-out never takes the connection the module thread is holding or about to need"""
+    assert FANOUT_WORKERS < POOL_SIZE
+    pool = ConnectionPool({'host': 'db', 'database': 'fanout_db'}, connect=FakeServer().connect)
+    barrier = threading.Barrier(FANOUT_WORKERS)
+
+    def step():
+        with pool.get_connection(timeout=0.5):
+            barrier.wait(timeout=2)
+
+    with pool.get_connection():
+        run_concurrently({f"step {n}": step for n in range(FANOUT_WORKERS * 2)})
+        with pool.get_connection(timeout=0.5):
+            pass
+    stats = pool.stats()
+    assert stats['waits'] == 0 and stats['failures'] == 0 and stats['open'] <= POOL_SIZE
+    print(f"✓ {FANOUT_WORKERS} fan-out workers leave a pooled connection free")
+
+
+if __name__ == "__main__":
+    test_wall_time_follows_longest_chain()
+    test_failures_skip_dependents()
+    test_steps_keep_the_callers_scope()
+    test_fanout_leaves_a_pooled_connection_free()
+    print("\nAll query fan-out tests passed")
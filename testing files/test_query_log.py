@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-query instrumentation of pooled connections
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeServer
+from db_pool import ConnectionPool
+from query_log import QueryLog, fingerprint, format_cycle_report
+
+
+def _pool(query_log):
+    server = FakeServer([{'Lot_Number': 'L1', 'Average': 1.5}, {'Lot_Number': 'L22', 'Average': None}])
+    return ConnectionPool({'host': 'db', 'database': 'fc_1_data_db'}, connect=server.connect, query_log=query_log)
+
+
+def load_inspection(pool):
+    connection = pool.get_connection()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM fm05000102_inspection WHERE Lot_Number IN (%s, %s)", ['L1', 'L22'])
+    rows = cursor.fetchall()
+    # Left open: returning the connection finishes the record
+    connection.close()
+    return rows
+
+
+def test_fingerprint_groups_statements():
+    """Literals, placeholders and IN lists of any length share a fingerprint"""
+    assert fingerprint("SELECT *\n  FROM t WHERE a = 'x' AND b IN (%s, %s) LIMIT 100") == \
+        fingerprint("SELECT * FROM t WHERE a = 'y' AND b IN (%s) LIMIT 5") == \
+        "SELECT * FROM t WHERE a = ? AND b IN (?+) LIMIT ?"
+    assert fingerprint("SELECT Process_1_S_N FROM process1_data") == "SELECT Process_1_S_N FROM process1_data"
+    print("✓ Fingerprints group statements")
+
+
+def test_cycle_report_and_slow_log():
+    """Every query is recorded with caller, scope, rows and bytes; slow ones reach the log"""
+    with tempfile.TemporaryDirectory() as log_dir:
+        slow_log = os.path.join(log_dir, 'slow_queries.log')
+        query_log = QueryLog(slow_threshold=0.0, slow_log_path=slow_log)
+        pool = _pool(query_log)
+
+        query_log.start_cycle()
+        with query_log.scope('Frame'):
+            load_inspection(pool)
+            load_inspection(pool)
+        load_inspection(pool)
+
+        record = query_log.recent[-1]
+        assert record.caller == f"{__name__}.load_inspection" and record.scope is None
+        assert (record.rows, record.bytes, record.database) == (2, 2 + 8 + 3, 'fc_1_data_db')
+        assert "'L22'" in record.params
+
+        report = query_log.cycle_report()
+        assert report['round_trips'] == 3 == pool.stats()['round_trips']
+        assert report['scopes']['Frame']['queries'] == 2 and report['scopes'][__name__]['queries'] == 1
+        assert report['slowest'][0][:2] == ("SELECT * FROM fm05000102_inspection WHERE Lot_Number IN (?+)", 3)
+        assert format_cycle_report(report)[0].startswith("Database: 3 round trips")
+
+        with open(slow_log, encoding='utf-8') as handle:
+            lines = handle.read().splitlines()
+        assert len(lines) == 3 and lines[0].split('\t')[5] == 'Frame'
+
+        query_log.start_cycle()
+        assert query_log.cycle_report()['round_trips'] == 0 and query_log.stats()['queries'] == 3
+    print("✓ Cycle report and slow-query log")
+
+
+if __name__ == "__main__":
+    test_fingerprint_groups_statements()
+    test_cycle_report_and_slow_log()
+    print("\nAll query log tests passed")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the INFORMATION_SCHEMA column cache
+"""
+
+import os
+import sys
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeServer, LostConnection
+from schema_cache import COLUMNS_QUERY, SchemaCache, _fingerprint
+
+
+def _column(table, name, column_type, position):
+    return (table, name, column_type, position, 'YES', '', None, '')
+
+
+ROWS = [
+    _column('process1_data', 'id', 'int', 1),
+    _column('process1_data', 'Process_1_S_N', 'varchar(50)', 2),
+    _column('process1_data', 'Process_1_Frame', 'varchar(50)', 3),
+    _column('process1_data', 'Process_1_Frame_Lot_No', 'varchar(50)', 4),
+    _column('process3_data', 'Process_3_Casing_Block_Code', 'varchar(50)', 1),
+    _column('fm05000102_inspection', 'Lot_Number', 'varchar(50)', 1),
+    _column('fm05000102_inspection', 'Date', 'date', 2),
+]
+
+
+def _server(columns):
+    """Answers the two INFORMATION_SCHEMA queries from the column rows in columns"""
+    return FakeServer(lambda sql, params: columns if sql == COLUMNS_QUERY else [_fingerprint(columns)])
+
+
+def test_lookups_are_served_from_one_query():
+    """Every lookup after the first load is answered without querying the server"""
+    server = _server(list(ROWS))
+    cache = SchemaCache({'database': 'fc_1_data_db'}, connect=server.connect)
+
+    assert cache.table_exists('FM05000102_inspection')
+    assert not cache.table_exists('em0580106p_inspection')
+    assert cache.describe('process1_data')[1] == {'Field': 'Process_1_S_N', 'Type': 'varchar(50)', 'Null': 'YES',
+                                                  'Key': '', 'Default': None, 'Extra': ''}
+    assert cache.existing_columns('process1_data', ['Process_1_Frame', 'Process_1_Em2p', 'process_1_s_n']) == \
+        ['Process_1_Frame', 'process_1_s_n']
+    assert cache.find_columns('process3_data', '%casing%') == ['Process_3_Casing_Block_Code']
+    assert cache.columns('missing_table') == [] and cache.describe('missing_table') is None
+    assert [sql for sql, _ in server.queries] == [COLUMNS_QUERY]
+    print("✓ Lookups served from one INFORMATION_SCHEMA query")
+
+
+def test_schema_reloads_only_when_the_fingerprint_changes():
+    """After the TTL the fingerprint is checked; the columns are reloaded only if it changed"""
+    columns = list(ROWS)
+    server = _server(columns)
+    cache = SchemaCache({'database': 'fc_1_data_db'}, ttl=0.0, connect=server.connect)
+    old_hash = cache.column_hash('process1_data')
+
+    assert cache.has_column('process1_data', 'Process_1_Frame')
+    assert cache.stats()['loads'] == 1 and cache.stats()['fingerprint_checks'] == 1
+
+    columns.append(_column('process1_data', 'Process_1_Em2p', 'varchar(50)', 5))
+    assert cache.has_column('process1_data', 'Process_1_Em2p')
+    assert cache.stats()['loads'] == 2
+    assert cache.column_hash('process1_data') != old_hash
+    assert cache.column_hash('process3_data') == cache.table('process3_data').column_hash
+    print("✓ Schema reloaded only when the fingerprint changes")
+
+
+def test_cached_schema_is_kept_when_the_server_is_down():
+    """A failed fingerprint check keeps serving the last loaded schema"""
+    server = _server(list(ROWS))
+    cache = SchemaCache({'database': 'fc_1_data_db'}, ttl=0.0, connect=server.connect)
+    cache.table('process1_data')
+
+    server.down = True
+    assert cache.has_column('process1_data', 'Process_1_Frame')
+
+    fresh = SchemaCache({'database': 'fc_1_data_db'}, connect=server.connect)
+    try:
+        fresh.table('process1_data')
+        raise AssertionError("Expected the connection error")
+    except LostConnection:
+        pass
+    print("✓ Cached schema kept while the server is down")
+
+
+if __name__ == "__main__":
+    test_lookups_are_served_from_one_query()
+    test_schema_reloads_only_when_the_fingerprint_changes()
+    test_cached_schema_is_kept_when_the_server_is_down()
+    print("\nAll schema cache tests passed")
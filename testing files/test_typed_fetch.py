@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the column-wise typed result fetch
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from schema_cache import TableSchema
+from typed_fetch import fetch_frame, frame_from_rows, column_kind
+
+
+class FakeCursor:
+    """Plain cursor returning tuples in fetchmany() batches"""
+
+    def __init__(self, names, rows):
+        self.description = [(name, None) for name in names]
+        self.rows = list(rows)
+        self.batches = 0
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        if batch:
+            self.batches += 1
+        return batch
+
+
+SCHEMA = TableSchema('fm05000102_inspection', [
+    {'Field': 'id', 'Type': 'int(11)'},
+    {'Field': 'Lot_Number', 'Type': 'varchar(20)'},
+    {'Field': 'Inspection_1_Average', 'Type': 'decimal(10,3)'},
+    {'Field': 'Inspection_2_Average', 'Type': 'double'},
+    {'Field': 'Count', 'Type': 'int unsigned'},
+])
+
+NAMES = ['id', 'Lot_Number', 'Inspection_1_Average', 'Inspection_2_Average', 'Count']
+ROWS = [
+    (1, 'L1', Decimal('1.250'), 2.5, 3),
+    (2, 'L2', None, 3.5, None),
+    (3, 'L3', Decimal('0.750'), None, 4),
+]
+
+
+def test_numeric_columns_are_float64():
+    """DECIMAL columns become float64 arrays; integers stay int64 unless they hold NULLs"""
+    cursor = FakeCursor(NAMES, ROWS)
+    df = fetch_frame(cursor, SCHEMA, batch_size=2)
+    assert cursor.batches == 2
+    assert list(df.columns) == NAMES
+    assert str(df['Inspection_1_Average'].dtype) == 'float64'
+    assert df['Inspection_1_Average'].tolist()[0] == 1.25 and df['Inspection_1_Average'].isna().tolist()[1]
+    assert str(df['Inspection_2_Average'].dtype) == 'float64'
+    assert str(df['id'].dtype) == 'int64' and str(df['Count'].dtype) == 'float64'
+    assert df['Lot_Number'].tolist() == ['L1', 'L2', 'L3']
+    print("✓ Numeric columns arrive as float64")
+
+
+def test_without_schema_and_from_dict_rows():
+    """Unknown columns holding Decimals are converted; dict rows give the same frame"""
+    df = fetch_frame(FakeCursor(['Average'], [(Decimal('1.5'),), (None,)]))
+    assert str(df['Average'].dtype) == 'float64'
+
+    rows = [dict(zip(NAMES, row)) for row in ROWS]
+    assert frame_from_rows(rows, SCHEMA).equals(fetch_frame(FakeCursor(NAMES, ROWS), SCHEMA))
+    assert frame_from_rows([]).empty and fetch_frame(FakeCursor(NAMES, [])).columns.tolist() == NAMES
+
+    # A value the schema type does not hold is kept as is instead of failing the fetch
+    df = fetch_frame(FakeCursor(['Average'], [('n/a',)]), TableSchema('t', [{'Field': 'Average', 'Type': 'double'}]))
+    assert df['Average'].tolist() == ['n/a']
+    assert (column_kind('DECIMAL(10,3)'), column_kind('bigint(20) unsigned'), column_kind('varchar(5)')) == \
+        ('float', 'int', None)
+    print("✓ Typed frames without schema and from dict rows")
+
+
+if __name__ == "__main__":
+    test_numeric_columns_are_float64()
+    test_without_schema_and_from_dict_rows()
+    print("\nAll typed fetch tests passed")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-cycle unit context built from the PICompiled CSV
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from unit_context import UnitContext, build_unit_context
+from keyword_filter import KeywordFilter
+from ingestion_profile import IngestionProfile
+from picompiled_reader import UNIT_COLUMNS
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,REMARKS\n"
+
+
+def test_last_valid_unit_is_kept_across_cycles():
+    """Rows removed by the keyword filter do not replace the last valid unit"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        with open(path, "w", newline="") as f:
+            f.write(HEADER)
+            f.write('2025/09/10,"""60CAT0212P""",1001,5001,OK\n')
+            f.write("2025/09/10,60CAT0212P,1002,5002,NG PRESSURE\n")
+
+        unit = build_unit_context(path)
+        assert unit.process_sn == 1001
+        assert unit.model_code == "60CAT0212P"
+
+        with open(path, "a", newline="") as f:
+            f.write("2025/09/10,60CAT0212P,1003,5003,TRIAL RUN\n")
+        assert build_unit_context(path).process_sn == 1001
+
+        with open(path, "a", newline="") as f:
+            f.write("2025/09/10,60CAT0212P,1004,5004,OK\n")
+        unit = build_unit_context(path)
+        assert (unit.process_sn, unit.sn) == (1004, 5004)
+        print(f"✓ Latest valid unit: {unit}")
+
+
+def test_to_frame_matches_read_csv_layout():
+    """to_frame() returns the one-row layout the material modules expect"""
+    unit = UnitContext("2025/09/10", "60CAT0212P", 1001, 5001, byte_offset=7)
+    frame = unit.to_frame()
+    assert list(frame.columns) == ['DATE', 'MODEL CODE', 'PROCESS S/N', 'S/N']
+    assert frame['PROCESS S/N'].tolist() == [1001]
+    assert UnitContext.from_csv_data(frame).byte_offset == 7
+    print("✓ Unit context round-trips through the CSV row layout")
+
+
+def test_module_filter_keeps_its_own_unit():
+    """A module with its own row filter gets the latest unit passing that filter"""
+    df_blk_profile = IngestionProfile(UNIT_COLUMNS, line_filter=KeywordFilter(['test', 'TEST'], case=True))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        with open(path, "w", newline="") as f:
+            f.write(HEADER)
+            f.write("2025/09/10,60CAT0212P,1001,5001,OK\n")
+            f.write("2025/09/10,60CAT0212P,1002,5002,NG PRESSURE\n")
+
+        unit = build_unit_context(path)
+        df_blk_unit = build_unit_context(path, df_blk_profile, "test.df_blk_output")
+        assert unit.process_sn == 1001 and df_blk_unit.process_sn == 1002
+        assert not unit.same_unit(df_blk_unit)
+        unit.module_units['df_blk_output'] = df_blk_unit
+        assert unit.for_module('df_blk_output') is df_blk_unit and unit.for_module('frame') is unit
+        print("✓ Df Block keeps the unit of its own row filter")
+
+
+if __name__ == "__main__":
+    test_last_valid_unit_is_kept_across_cycles()
+    test_to_frame_matches_read_csv_layout()
+    test_module_filter_keeps_its_own_unit()
+    print("\nAll unit context tests passed")
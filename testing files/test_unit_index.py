@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the S/N -> byte offset sidecar index
+"""
+
+import os
+import sys
+import tempfile
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from unit_index import UnitOffsetIndex, find_unit
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,REMARKS\n"
+
+
+def _row(i, remarks="OK"):
+    return f'2025/09/10,"60CAT0212P",{1000 + i},{5000 + i},{remarks}\n'
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def test_index_is_built_incrementally_and_fetches_with_one_seek():
+    """Appended rows are added to the index and any unit can be read back by S/N"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0) + _row(1), mode="w")
+
+        index = UnitOffsetIndex(path)
+        assert index.update() == 2
+        _write(path, _row(2) + _row(3)[:6])
+        assert index.update() == 1
+        assert index.update() == 0
+
+        assert index.lookup(sn=5001) == [len(HEADER) + len(_row(0))]
+        assert index.lookup(process_sn="1002") == [len(HEADER) + 2 * len(_row(0))]
+
+        row = index.fetch(sn="5001")
+        assert row["S/N"].iloc[0] == 5001
+        assert row["MODEL CODE"].iloc[0] == "60CAT0212P"
+        assert index.fetch(sn=9999) is None
+        print("✓ Index built incrementally, units fetched by S/N")
+
+
+def test_sidecar_is_resumed_and_rebuilt_when_the_csv_changes():
+    """A new process resumes from the sidecar; a replaced CSV is re-indexed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0) + _row(1), mode="w")
+        UnitOffsetIndex(path).update()
+
+        _write(path, _row(2))
+        resumed = UnitOffsetIndex(path)
+        # Only the row appended after the sidecar was written is parsed
+        assert resumed.update() == 1
+        assert resumed.rows_indexed == 3
+        assert resumed.lookup(sn=5000) == [len(HEADER)]
+
+        # Same size, different units: the sidecar no longer applies
+        _write(path, HEADER + _row(7) + _row(8) + _row(9), mode="w")
+        rebuilt = UnitOffsetIndex(path)
+        assert rebuilt.update() == 3
+        assert rebuilt.lookup(sn=5000) == []
+        assert rebuilt.lookup(sn=5008) == [len(HEADER) + len(_row(0))]
+        print("✓ Sidecar resumed, and rebuilt after the CSV changed")
+
+
+def test_find_unit_returns_a_unit_context():
+    """find_unit gives a UnitContext for a historical unit, ready for the material pipelines"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-09.csv")
+        _write(path, HEADER + "".join(_row(i) for i in range(50)), mode="w")
+
+        index_dir = os.path.join(tmp, "index")
+        os.makedirs(index_dir)
+        unit = find_unit(path, process_sn=1010, index_dir=index_dir, materials=('Frame',))
+        assert (unit.sn, unit.process_sn, unit.model_code) == (5010, 1010, "60CAT0212P")
+        assert unit.materials == ('Frame',)
+        assert unit.byte_offset == len(HEADER) + 10 * len(_row(0))
+        assert list(unit.to_frame().columns) == ['DATE', 'MODEL CODE', 'PROCESS S/N', 'S/N']
+        assert not os.path.exists(path + ".snidx")
+        assert os.path.exists(os.path.join(index_dir, "PICompiled2025-09-09.csv.snidx"))
+        print("✓ find_unit returns a UnitContext")
+
+
+if __name__ == "__main__":
+    test_index_is_built_incrementally_and_fetches_with_one_seek()
+    test_sidecar_is_resumed_and_rebuilt_when_the_csv_changes()
+    test_find_unit_returns_a_unit_context()
+    print("\nAll unit index tests passed")
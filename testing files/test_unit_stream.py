@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script to verify per-unit streaming: reading every appended unit and the bounded unit queue
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from baseline_provider import get_baseline_provider
+from unit_context import read_new_unit_contexts
+from unit_stream import UnitStream
+
+HEADER = "DATE,MODEL CODE,PROCESS S/N,S/N,REMARKS\n"
+
+
+def _row(i, remarks="OK"):
+    return f'2025/09/10,"60CAT0212P",{1000 + i},{5000 + i},{remarks}\n'
+
+
+def _write(path, text, mode="a"):
+    with open(path, mode, newline="") as f:
+        f.write(text)
+
+
+def test_every_appended_unit_is_returned():
+    """All valid units appended between two checks are returned, not only the last one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0), mode="w")
+
+        assert read_new_unit_contexts(path, consumer="test_stream") == []
+
+        _write(path, _row(1) + _row(2, "NG LEAK") + _row(3) + _row(4))
+        units = read_new_unit_contexts(path, consumer="test_stream")
+        assert [unit.sn for unit in units] == [5001, 5003, 5004]
+        assert units[0].model_code == "60CAT0212P"
+        assert units[0].byte_offset == len(HEADER) + len(_row(0))
+
+        assert read_new_unit_contexts(path, consumer="test_stream") == []
+        print("✓ Every appended unit is read")
+
+
+def test_streamed_units_carry_the_active_materials():
+    """Streamed units select only the active materials' baseline columns, like the GUI's unit"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "PICompiled2025-09-10.csv")
+        _write(path, HEADER + _row(0), mode="w")
+        units = read_new_unit_contexts(path, consumer="test_stream_materials", from_start=True,
+                                       materials=('Frame', 'Df_Blk'))
+        assert [unit.materials for unit in units] == [('Frame', 'Df_Blk')]
+        provider = get_baseline_provider({'host': 'db', 'database': 'fc_1_data_db'}, units[0])
+        assert provider.materials == ('Frame', 'Df_Blk')
+        print("✓ Streamed units carry the active materials")
+
+
+def test_units_are_processed_in_order_and_in_batches():
+    """The worker drains the queue in arrival order, at most batch_size units per call"""
+    batches = []
+    stream = UnitStream(batches.append, maxsize=100, batch_size=3)
+    stream.put_units(range(7))
+    stream.start()
+    assert stream.wait_empty(2.0)
+
+    assert [unit for batch in batches for unit in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    stats = stream.stats()
+    assert stats['processed'] == 7 and stats['depth'] == 0
+    assert stats['last_lag'] is not None
+    stream.stop()
+    print("✓ Units processed in order and in batches")
+
+
+def test_full_queue_applies_backpressure_without_dropping():
+    """A producer waits on a full queue instead of dropping units"""
+    release = threading.Event()
+    processed = []
+
+    def slow_batch(units):
+        release.wait(2.0)
+        processed.extend(units)
+
+    stream = UnitStream(slow_batch, maxsize=2, batch_size=1)
+    stream.start()
+
+    # Times out with the worker stuck on the first unit and two more queued
+    assert stream.put_units(range(10), timeout=0.2) == 3
+    assert stream.stats()['blocked_puts'] >= 1
+    assert stream.depth() == 2
+
+    producer = threading.Thread(target=stream.put_units, args=(range(3, 10),))
+    producer.start()
+    release.set()
+    producer.join(2.0)
+    assert stream.wait_empty(2.0)
+
+    assert processed == list(range(10))
+    stream.stop()
+    print("✓ Full queue blocks the producer and no unit is dropped")
+
+
+if __name__ == "__main__":
+    test_every_appended_unit_is_returned()
+    test_streamed_units_carry_the_active_materials()
+    test_units_are_processed_in_order_and_in_batches()
+    test_full_queue_applies_backpressure_without_dropping()
+    print("\nAll unit stream tests passed")
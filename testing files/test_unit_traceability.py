@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-unit cross-material process table fetch
+"""
+
+import os
+import sys
+
+# Material modules live one directory up
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from fake_db import FakeSchema, FakeServer
+from process_routing import ProcessTableRouter
+from unit_traceability import fetch_unit_traceability, DATED, DATED_OR_ANY, LATEST_DATE
+
+
+class FakeDateFormats:
+    def __init__(self):
+        self.relearned = []
+
+    def condition(self, table, column, value):
+        return f"{column} = %s", [value]
+
+    def relearn(self, table, column, values):
+        self.relearned.append((table, column, values))
+
+
+TABLES = {table: dict.fromkeys(columns, 'varchar(50)') for table, columns in {
+    'process1_data': ['Process_1_S_N', 'Process_1_Model_Code', 'Process_1_DATE',
+                      'Process_1_Frame', 'Process_1_Frame_Lot_No', 'Process_1_Em2p', 'Process_1_Em2p_Lot_No',
+                      'Process_1_Em3p', 'Process_1_Em3p_Lot_No'],
+    'process2_data': ['Process_2_S_N', 'Process_2_DATE', 'Process_2_Rod_Blk', 'Process_2_Rod_Blk_Lot_No',
+                      'Process_2_Df_Blk', 'Process_2_Df_Blk_Lot_No'],
+    'process3_data': ['Process_3_S_N', 'Process_3_DATE', 'P3_Casing_Block', 'P3_Casing_Block_Lot_No'],
+    'process4_data': ['Process_4_S_N', 'Process_4_DATE'],
+}.items()}
+
+ROWS = {
+    'process1_data': [
+        {'Process_1_S_N': 'P100', 'Process_1_Model_Code': 'M1', 'Process_1_DATE': '2025/09/10',
+         'Process_1_Frame': 'FM05000102', 'Process_1_Frame_Lot_No': 'L1', 'Process_1_Em2p': 'EM0580106P',
+         'Process_1_Em2p_Lot_No': 'E1', 'Process_1_Em3p': None, 'Process_1_Em3p_Lot_No': None, 'Date_Match': 1},
+    ],
+    'process2_data': [
+        {'Process_2_S_N': 'P100', 'Process_2_DATE': '2025/09/09', 'Process_2_Rod_Blk': 'RDB5200200',
+         'Process_2_Rod_Blk_Lot_No': 'R9', 'Process_2_Df_Blk': 'DFB6600600', 'Process_2_Df_Blk_Lot_No': 'D9',
+         'Date_Match': 0},
+    ],
+    'process3_data': [
+        {'Process_3_S_N': 'P100', 'Process_3_DATE': '2025/09/10', 'P3_Casing_Block': 'CSB6400802',
+         'P3_Casing_Block_Lot_No': 'C2', 'Date_Match': 1},
+        {'Process_3_S_N': 'P100', 'Process_3_DATE': '2025/09/08', 'P3_Casing_Block': 'CSB6400802',
+         'P3_Casing_Block_Lot_No': 'C1', 'Date_Match': 0},
+    ],
+}
+
+
+def _fetch():
+    schema = FakeSchema(TABLES)
+    server = FakeServer(ROWS)
+    traceability = fetch_unit_traceability({'database': 'fc_1_data_db'}, ['P100'], '2025/09/10',
+                                           connect=server.connect, router=ProcessTableRouter(schema),
+                                           schema=schema, date_formats=FakeDateFormats())
+    return traceability, server
+
+
+def test_one_query_per_process_table():
+    """Every material's columns come from one query per table that holds any of them"""
+    traceability, server = _fetch()
+    assert [sql.split(" FROM ")[1].split()[0] for sql, _ in server.queries] == \
+        ['process1_data', 'process2_data', 'process3_data']
+    process1_sql, params = server.queries[0]
+    for column in ('`Process_1_Frame`', '`Process_1_Em2p_Lot_No`', '`Process_1_Em3p`', 'AS Date_Match'):
+        assert column in process1_sql
+    assert params == ['2025/09/10', 'P100']
+    assert traceability.tables_for('Casing_Block') == ['process3_data']
+    print(f"✓ {len(server.queries)} queries for 6 materials")
+
+
+def test_material_pipelines_share_the_record():
+    """Each module's row selection is served from the same fetch"""
+    traceability, _ = _fetch()
+
+    frame = traceability.process_results(['Frame'], DATED_OR_ANY)
+    assert frame['process1_data'][0]['Materials'] == {'Frame': {'Material_Code': 'FM05000102', 'Lot_Number': 'L1'}}
+    assert all(not rows for table, rows in frame.items() if table != 'process1_data')
+
+    em = traceability.process_results(['Em2p', 'Em3p'], DATED)
+    assert list(em['process1_data'][0]['Materials']) == ['Em2p']
+
+    casing = traceability.process_results(['Casing_Block'], LATEST_DATE)
+    assert [row['Materials']['Casing_Block']['Lot_Number'] for row in casing['process3_data']] == ['C2']
+
+    # Rod_Blk only uses rows on the CSV date; Df_Blk falls back to the S/N alone
+    assert traceability.material_entry('Rod_Blk', 'P100', DATED, require_lot=True) == (None, None)
+    assert traceability.material_entry('Df_Blk', 'P100', DATED_OR_ANY) == ('DFB6600600', 'D9')
+    print("✓ Material pipelines share one traceability record")
+
+
+def test_lookups_run_before_the_connection_is_taken():
+    """Date format lookups (which may check out connections) never run while the fetch holds one"""
+    server = FakeServer(ROWS)
+
+    class CheckingDateFormats(FakeDateFormats):
+        def condition(self, table, column, value):
+            assert not server.held, f"{table} date lookup while holding a connection"
+            return super().condition(table, column, value)
+
+    schema = FakeSchema(TABLES)
+    fetch_unit_traceability({'database': 'fc_1_data_db'}, ['P100'], '2025/09/10', connect=server.connect,
+                            router=ProcessTableRouter(schema), schema=schema, date_formats=CheckingDateFormats())
+    assert len(server.queries) == 3 and not server.held
+    print("✓ Lookups run before the connection is taken")
+
+
+def test_dates_in_a_changed_layout_still_match():
+    """Rows whose stored date no longer has the detected layout are matched here and relearned"""
+    rows = {'process2_data': [
+        {'Process_2_S_N': 'P100', 'Process_2_DATE': '2025-9-10', 'Process_2_Rod_Blk': 'RDB5200200',
+         'Process_2_Rod_Blk_Lot_No': 'R10', 'Date_Match': 0},
+        {'Process_2_S_N': 'P100', 'Process_2_DATE': '2025-9-1', 'Process_2_Rod_Blk': 'RDB5200200',
+         'Process_2_Rod_Blk_Lot_No': 'R1', 'Date_Match': 0},
+    ]}
+    schema = FakeSchema(TABLES)
+    date_formats = FakeDateFormats()
+    traceability = fetch_unit_traceability({'database': 'fc_1_data_db'}, ['P100'], '2025/09/10',
+                                           connect=FakeServer(rows).connect, router=ProcessTableRouter(schema),
+                                           schema=schema, date_formats=date_formats)
+    assert traceability.material_entry('Rod_Blk', 'P100', DATED, require_lot=True) == ('RDB5200200', 'R10')
+    assert date_formats.relearned == [('process2_data', 'Process_2_DATE', ['2025-9-10'])]
+    print("✓ Dates in a changed layout still match")
+
+
+if __name__ == "__main__":
+    test_one_query_per_process_table()
+    test_material_pipelines_share_the_record()
+    test_lookups_run_before_the_connection_is_taken()
+    test_dates_in_a_changed_layout_still_match()
+    print("\nAll unit traceability tests passed")
@@ -0,0 +1,109 @@
+#%%
+import logging
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rows pulled from the server per fetchmany() call
+FETCH_BATCH_SIZE = 500
+
+# MySQL column types converted to float64
+FLOAT_TYPES = ('decimal', 'numeric', 'float', 'double', 'real')
+
+# MySQL integer types; int64 unless the column holds NULLs, then float64 like pandas
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint')
+
+
+def column_kind(column_type):
+    """'float', 'int' or None (kept as Python objects) for a COLUMN_TYPE such as 'decimal(10,3)'"""
+    if not column_type:
+        return None
+    base = column_type.lower().split('(')[0].split()[0]
+    if base in FLOAT_TYPES:
+        return 'float'
+    if base in INTEGER_TYPES:
+        return 'int'
+    return None
+
+
+def _inferred_kind(values):
+    """Columns missing from the schema (computed columns) are floats if they only hold Decimals"""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, Decimal) for value in present):
+        return 'float'
+    return None
+
+
+def _typed_column(name, values, kind):
+    if kind is None:
+        return values
+    try:
+        if kind == 'int' and all(value is not None for value in values):
+            return np.array(values, dtype=np.int64)
+        return np.fromiter((np.nan if value is None else float(value) for value in values),
+                           dtype=np.float64, count=len(values))
+    except (TypeError, ValueError, OverflowError) as e:
+        logger.warning(f"Column {name} is not numeric as its type says, keeping raw values: {e}")
+        return values
+
+
+def typed_frame(names, columns, table_schema=None):
+    """
+    DataFrame from per-column value lists, numeric columns as NumPy arrays.
+
+    Args:
+        names: Column names in result order
+        columns: One list of values per name
+        table_schema: TableSchema of the queried table; its types decide which
+            columns become float64/int64 (default: only all-Decimal columns)
+    """
+    data = {}
+    for index, (name, values) in enumerate(zip(names, columns)):
+        column_type = table_schema.column_type(name) if table_schema is not None else None
+        kind = column_kind(column_type) if column_type else _inferred_kind(values)
+        data[index] = _typed_column(name, values, kind)
+    df = pd.DataFrame(data, columns=range(len(names)))
+    df.columns = list(names)
+    return df
+
+
+def fetch_frame(cursor, table_schema=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Read the result of an executed query into a DataFrame column by column.
+
+    Rows are streamed with fetchmany() and appended to one buffer per
+    column, so no dict is built per row. DECIMAL and other numeric columns
+    are converted to float64 arrays once at the end instead of arriving as
+    object columns of Decimal values.
+
+    Args:
+        cursor: Cursor on which the query was executed (a plain, non-dictionary cursor)
+        table_schema: TableSchema of the queried table, see typed_frame
+        batch_size: Rows per fetchmany() call
+
+    Returns:
+        DataFrame with the result's columns (empty if the query returned no rows)
+    """
+    if cursor.description is None:
+        return pd.DataFrame()
+    names = [description[0] for description in cursor.description]
+    columns = [[] for _ in names]
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        if isinstance(batch[0], dict):
+            batch = [tuple(row[name] for name in names) for row in batch]
+        for column, values in zip(columns, zip(*batch)):
+            column.extend(values)
+    return typed_frame(names, columns, table_schema)
+
+
+def frame_from_rows(rows, table_schema=None):
+    """typed_frame for rows already held as dicts (cached or merged results)"""
+    if not rows:
+        return pd.DataFrame()
+    names = list(rows[0])
+    return typed_frame(names, [[row.get(name) for row in rows] for name in names], table_schema)
@@ -0,0 +1,175 @@
+#%%
+import logging
+import pandas as pd
+from picompiled_reader import get_incremental_reader, locate_last_valid_unit, UNIT_COLUMNS
+from keyword_filter import KeywordFilter
+from ingestion_profile import IngestionProfile, clean_model_code
+
+logger = logging.getLogger(__name__)
+
+# Rows containing any of these keywords are not production units
+CSV_KEYWORDS_TO_REMOVE = ['NG', 'TRIAL', 'MASTER PUMP', 'RUNNING', 'RE PI']
+CSV_ROW_FILTER = KeywordFilter(CSV_KEYWORDS_TO_REMOVE)
+
+# Declared types of the unit columns; MODEL CODE repeats for a whole shift
+UNIT_DTYPES = {'DATE': str, 'MODEL CODE': 'category'}
+
+# Parse only the unit columns, dropping keyword lines before they are parsed
+UNIT_PROFILE = IngestionProfile(UNIT_COLUMNS, UNIT_DTYPES, line_filter=CSV_ROW_FILTER)
+
+
+class UnitContext:
+    """
+    The unit being checked in one processing cycle, built once from the PICompiled CSV
+    and handed to every material module.
+    """
+
+    def __init__(self, date, model_code, process_sn, sn, csv_path=None, byte_offset=None):
+        self.date = date
+        self.model_code = model_code
+        self.process_sn = process_sn
+        self.sn = sn
+        self.csv_path = csv_path
+        # Offset of the unit's line in the CSV file, when known
+        self.byte_offset = byte_offset
+        # Process table rows fetched for this unit, keyed by (host, database)
+        self.traceability = {}
+        # database_data baselines of this cycle, keyed by (host, database, materials)
+        self.baselines = {}
+        # Baseline material names of the modules run this cycle (None: every material)
+        self.materials = None
+        # Units picked by a module's own row filter, keyed by module name
+        self.module_units = {}
+
+    def for_module(self, module_name):
+        """The unit module_name handles: its own filter's unit if that differs, else this one"""
+        return self.module_units.get(module_name, self)
+
+    def same_unit(self, other):
+        return (other is not None and
+                (self.date, self.model_code, self.process_sn, self.sn) ==
+                (other.date, other.model_code, other.process_sn, other.sn))
+
+    @classmethod
+    def from_csv_data(cls, csv_data, csv_path=None):
+        """
+        Build a context from the one-row DataFrame returned by read_csv_with_pandas.
+
+        Returns:
+            UnitContext, or None if csv_data holds no unit
+        """
+        if csv_data is None or csv_data.empty:
+            return None
+        row = csv_data.iloc[-1]
+        byte_offset = csv_data.index[-1] if csv_data.index.name == 'byte_offset' else None
+        return cls(row.get('DATE'), row.get('MODEL CODE'), row.get('PROCESS S/N'), row.get('S/N'),
+                   csv_path, byte_offset)
+
+    def to_frame(self):
+        """Return the unit in the same one-row layout read_csv_with_pandas returns"""
+        index = pd.Index([self.byte_offset], name='byte_offset') if self.byte_offset is not None else None
+        return pd.DataFrame([[self.date, self.model_code, self.process_sn, self.sn]],
+                            columns=UNIT_COLUMNS, index=index)
+
+    def __repr__(self):
+        return (f"UnitContext(DATE={self.date}, MODEL CODE={self.model_code}, "
+                f"PROCESS S/N={self.process_sn}, S/N={self.sn})")
+
+
+def build_unit_context(file_path, profile=UNIT_PROFILE, consumer=__name__):
+    """
+    Read the latest valid unit from the PICompiled CSV.
+
+    Args:
+        file_path: Path of the PICompiled CSV file
+        profile: IngestionProfile whose line_filter decides which rows are units
+        consumer: Reader name; one per profile so each keeps its own last unit
+
+    Returns:
+        UnitContext for the last row that survives the keyword filter, or None
+    """
+    reader = get_incremental_reader(file_path, consumer, profile)
+    if reader.columns is None:
+        # First pass: find the latest valid unit by reading backwards from EOF
+        # instead of parsing the whole day's file
+        prime_reader_from_tail(reader)
+    new_rows = reader.read_new_rows()
+    if new_rows is None or reader.columns is None:
+        logger.warning(f"CSV not readable yet: {file_path}")
+        return None
+
+    if not new_rows.empty:
+        # Keyword lines were already dropped by UNIT_PROFILE
+        new_rows["MODEL CODE"] = clean_model_code(new_rows["MODEL CODE"])
+        logger.info(f"Unit context: {len(new_rows)} new valid CSV rows")
+        reader.state['last_valid_row'] = new_rows[UNIT_COLUMNS].tail(1)
+
+    unit_context = UnitContext.from_csv_data(reader.state.get('last_valid_row'), file_path)
+    if unit_context is None:
+        logger.warning(f"No valid unit found in {file_path}")
+    return unit_context
+
+
+def prime_reader_from_tail(reader, row_filter=None):
+    """
+    Position a fresh reader at the end of its file and remember the last
+    valid unit found by reading backwards, so the next read_new_rows() only
+    parses rows appended from now on. The blocks are parsed with the
+    reader's profile, which may already drop invalid lines.
+
+    Returns:
+        The located one-row unit DataFrame, or None
+    """
+    end_offset = reader.seek_to_end()
+    if end_offset is None:
+        return None
+    last_unit = locate_last_valid_unit(reader.file_path, row_filter, end_offset=end_offset,
+                                       profile=reader.profile)
+    if last_unit is not None:
+        reader.state['last_valid_row'] = last_unit
+    return last_unit
+
+
+def read_new_unit_contexts(file_path, consumer='unit_stream', from_start=False, materials=None):
+    """
+    Read every valid unit appended to the PICompiled CSV since the previous call.
+
+    The first call only positions the reader at the end of the file, so
+    streaming starts with the units produced from then on instead of the
+    whole day's backlog. With from_start the first call reads the file from
+    its first row instead, for a new daily file switched to mid-stream.
+
+    Args:
+        file_path: Path of the PICompiled CSV file
+        consumer: Reader name, separate from build_unit_context's reader
+        from_start: Return the units already in the file on the first call
+        materials: Baseline material names of the active modules, set as each unit's materials
+
+    Returns:
+        List of UnitContext in file order (possibly empty), or None if the
+        file cannot be read
+    """
+    reader = get_incremental_reader(file_path, consumer, UNIT_PROFILE)
+    if reader.columns is None and not from_start:
+        if reader.seek_to_end() is None:
+            logger.warning(f"CSV not readable yet: {file_path}")
+            return None
+        logger.info(f"Streaming units appended to {file_path} from offset {reader.offset}")
+        return []
+
+    new_rows = reader.read_new_rows()
+    if new_rows is None:
+        return None
+    if new_rows.empty:
+        return []
+
+    new_rows["MODEL CODE"] = clean_model_code(new_rows["MODEL CODE"])
+    filtered = new_rows[UNIT_COLUMNS]
+    logger.info(f"Streaming: {len(filtered)} new valid units")
+
+    has_offsets = filtered.index.name == 'byte_offset'
+    units = [UnitContext(date, model_code, process_sn, sn, file_path, offset if has_offsets else None)
+             for offset, date, model_code, process_sn, sn in filtered.itertuples(name=None)]
+    for unit in units:
+        unit.materials = materials
+    return units
@@ -0,0 +1,259 @@
+#%%
+import os
+import hashlib
+import logging
+import threading
+import pandas as pd
+from ingestion_profile import IngestionProfile, clean_model_code
+from picompiled_reader import ANCHOR_SIZE, IncrementalCSVReader, read_row_at
+from unit_context import UnitContext
+
+logger = logging.getLogger(__name__)
+
+# Sidecar file extension, appended to the CSV file name. Sidecar lines are tab separated:
+#   H  <md5 of the CSV header line>
+#   R  <byte offset>  <S/N>  <PROCESS S/N>
+#   E  <indexed up to offset>  <anchor md5>
+INDEX_SUFFIX = ".snidx"
+
+# CSV columns whose values are indexed
+INDEX_KEYS = ['S/N', 'PROCESS S/N']
+
+# Indexing only needs the key columns parsed
+INDEX_PROFILE = IngestionProfile(INDEX_KEYS)
+
+
+def _index_key(value):
+    """Normalize an S/N value so '5000', 5000 and 5000.0 find the same rows"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip().strip('"')
+    return text or None
+
+
+def _anchor_hash(file_path, end):
+    """Hash of the bytes just before end, used to recognise the indexed file generation"""
+    with open(file_path, 'rb') as handle:
+        start = max(0, end - ANCHOR_SIZE)
+        handle.seek(start)
+        return hashlib.md5(handle.read(end - start)).hexdigest()
+
+
+class UnitOffsetIndex:
+    """
+    Sidecar index mapping S/N and PROCESS S/N to the byte offsets of their rows in a
+    PICompiled CSV file, so fetch() reads a unit with a single seek.
+
+    Args:
+        csv_path: Path of the PICompiled CSV file
+        index_path: Path of the sidecar file (default: csv_path + '.snidx')
+    """
+
+    def __init__(self, csv_path, index_path=None):
+        self.csv_path = csv_path
+        self.index_path = index_path or csv_path + INDEX_SUFFIX
+        self.offsets = {key: {} for key in INDEX_KEYS}
+        self.indexed_to = None
+        self.rows_indexed = 0
+        self._reader = IncrementalCSVReader(csv_path, profile=INDEX_PROFILE)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _clear(self):
+        self.offsets = {key: {} for key in INDEX_KEYS}
+        self.indexed_to = None
+        self.rows_indexed = 0
+
+    def _add(self, offset, sn, process_sn):
+        for key, value in (('S/N', sn), ('PROCESS S/N', process_sn)):
+            if value:
+                self.offsets[key].setdefault(value, []).append(offset)
+        self.rows_indexed += 1
+
+    def _load(self):
+        """Load the sidecar file and position the reader where it stopped"""
+        self._loaded = True
+        if not os.path.exists(self.index_path):
+            return
+
+        header_hash = None
+        committed_end = committed_anchor = None
+        pending = []
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as handle:
+                for line in handle:
+                    if not line.endswith('\n'):
+                        break  # torn write at the end
+                    fields = line.rstrip('\n').split('\t')
+                    if fields[0] == 'H':
+                        header_hash = fields[1]
+                    elif fields[0] == 'R' and len(fields) == 4:
+                        pending.append((int(fields[1]), fields[2] or None, fields[3] or None))
+                    elif fields[0] == 'E' and len(fields) == 3:
+                        for entry in pending:
+                            self._add(*entry)
+                        pending = []
+                        committed_end, committed_anchor = int(fields[1]), fields[2]
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable index {self.index_path}: {e}")
+            self._clear()
+            return
+
+        if committed_end is None or self._reader.seek_to(committed_end) is None:
+            self._clear()
+            self._reader.reset()
+            return
+        try:
+            same_file = (hashlib.md5(self._reader.header_bytes).hexdigest() == header_hash and
+                         _anchor_hash(self.csv_path, committed_end) == committed_anchor)
+        except OSError:
+            same_file = False
+        if not same_file:
+            logger.info(f"{os.path.basename(self.csv_path)} changed since it was indexed, rebuilding")
+            self._clear()
+            self._reader.reset()
+            return
+
+        self.indexed_to = committed_end
+        logger.debug(f"Resumed index of {self.csv_path} at offset {committed_end} ({self.rows_indexed} rows)")
+
+    def update(self):
+        """
+        Index the rows appended to the CSV since the last call.
+
+        Returns:
+            Number of rows added to the index, or None if the CSV cannot be read
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            new_rows = self._reader.read_new_rows()
+            if new_rows is None:
+                return None
+            if self._reader.columns is None:
+                return 0
+
+            entries = []
+            if not new_rows.empty and new_rows.index.name == 'byte_offset':
+                sns = new_rows['S/N'] if 'S/N' in new_rows.columns else [None] * len(new_rows)
+                process_sns = new_rows['PROCESS S/N'] if 'PROCESS S/N' in new_rows.columns else [None] * len(new_rows)
+                entries = [(int(offset), _index_key(sn), _index_key(process_sn))
+                           for offset, sn, process_sn in zip(new_rows.index, sns, process_sns)]
+            elif not new_rows.empty:
+                logger.warning(f"Rows of {self.csv_path} have no byte offsets; not indexed")
+
+            end = self._reader.offset
+            if end == self.indexed_to and not self._reader.was_reset:
+                return 0
+
+            try:
+                if self._reader.was_reset:
+                    # Indexing from the first row: start a fresh sidecar
+                    self._clear()
+                    mode = 'w'
+                else:
+                    mode = 'a'
+                lines = []
+                if mode == 'w':
+                    lines.append(f"H\t{hashlib.md5(self._reader.header_bytes).hexdigest()}\n")
+                lines.extend(f"R\t{offset}\t{sn or ''}\t{process_sn or ''}\n" for offset, sn, process_sn in entries)
+                lines.append(f"E\t{end}\t{_anchor_hash(self.csv_path, end)}\n")
+                os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+                with open(self.index_path, mode, encoding='utf-8') as handle:
+                    handle.writelines(lines)
+            except OSError as e:
+                logger.error(f"Error writing index {self.index_path}: {e}")
+
+            for entry in entries:
+                self._add(*entry)
+            self.indexed_to = end
+            return len(entries)
+
+    def lookup(self, sn=None, process_sn=None):
+        """
+        Return the byte offsets of the rows with this S/N or PROCESS S/N, in file order.
+        """
+        if sn is not None:
+            return list(self.offsets['S/N'].get(_index_key(sn), []))
+        if process_sn is not None:
+            return list(self.offsets['PROCESS S/N'].get(_index_key(process_sn), []))
+        return []
+
+    def fetch(self, sn=None, process_sn=None, occurrence=-1):
+        """
+        Read a unit's row from the CSV with one seek.
+
+        Args:
+            sn: S/N to look up
+            process_sn: PROCESS S/N to look up (used when sn is None)
+            occurrence: Which of several matching rows to return (default: the last)
+
+        Returns:
+            One-row DataFrame indexed by byte offset, or None if not found
+        """
+        offsets = self.lookup(sn, process_sn)
+        if not offsets:
+            return None
+        try:
+            offset = offsets[occurrence]
+        except IndexError:
+            return None
+        row = read_row_at(self.csv_path, offset)
+        if row is not None:
+            row["MODEL CODE"] = clean_model_code(row["MODEL CODE"])
+        return row
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_unit_index(csv_path, index_dir=None):
+    """
+    Return the UnitOffsetIndex for csv_path, creating it on first use.
+
+    Args:
+        csv_path: Path of the PICompiled CSV file
+        index_dir: Directory for the sidecar file (default: next to the CSV)
+    """
+    index_path = None
+    if index_dir is not None:
+        index_path = os.path.join(index_dir, os.path.basename(csv_path) + INDEX_SUFFIX)
+    key = (os.path.normcase(os.path.abspath(csv_path)), index_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = UnitOffsetIndex(csv_path, index_path)
+            _indexes[key] = index
+        return index
+
+
+def release_unit_index(csv_path):
+    """Forget the in-memory indexes of csv_path; sidecar files are kept for later lookups"""
+    path_key = os.path.normcase(os.path.abspath(csv_path))
+    with _indexes_lock:
+        for key in [key for key in _indexes if key[0] == path_key]:
+            del _indexes[key]
+
+
+def find_unit(csv_path, sn=None, process_sn=None, index_dir=None, materials=None):
+    """
+    Look up a unit of any day's PICompiled file by S/N or PROCESS S/N.
+
+    The file's index is brought up to date first, so this also works for a
+    file that has never been indexed (it is parsed once). materials becomes
+    the unit's baseline materials (see UnitContext.materials).
+
+    Returns:
+        UnitContext ready for process_material_data_for_unit(), or None
+    """
+    index = get_unit_index(csv_path, index_dir)
+    index.update()
+    row = index.fetch(sn=sn, process_sn=process_sn)
+    unit_context = UnitContext.from_csv_data(row, csv_path)
+    if unit_context is not None:
+        unit_context.materials = materials
+    return unit_context
@@ -0,0 +1,164 @@
+#%%
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Most units waiting to be processed before producers are made to wait
+UNIT_QUEUE_SIZE = 50
+
+# Most units handed to one process_batch call
+UNIT_BATCH_SIZE = 5
+
+
+class UnitStream:
+    """
+    Bounded queue of units with a worker that processes them in batches; a full queue
+    blocks put_units() instead of dropping units.
+
+    Args:
+        process_batch: Callable taking a list of units
+        maxsize: Queue capacity
+        batch_size: Most units per process_batch call
+        name: Name of the worker thread
+    """
+
+    def __init__(self, process_batch, maxsize=UNIT_QUEUE_SIZE, batch_size=UNIT_BATCH_SIZE, name="unit-stream"):
+        self.process_batch = process_batch
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._in_flight = 0
+
+        self.enqueued = 0
+        self.processed = 0
+        self.batches = 0
+        self.failures = 0
+        self.blocked_puts = 0
+        self.last_lag = None
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start the worker thread if it is not running"""
+        with self._cond:
+            self._stopped = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+
+    def put_units(self, units, timeout=None):
+        """
+        Queue units for processing, waiting while the queue is full.
+
+        Args:
+            units: Iterable of units in arrival order
+            timeout: Longest total wait in seconds (None waits as long as needed)
+
+        Returns:
+            Number of units queued; fewer than given only on timeout or stop
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        queued = 0
+        with self._cond:
+            for unit in units:
+                if len(self._queue) >= self.maxsize:
+                    self.blocked_puts += 1
+                    logger.info(f"Unit queue full ({self.maxsize}), waiting for the worker")
+                while len(self._queue) >= self.maxsize and not self._stopped:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return queued
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return queued
+                self._queue.append((time.monotonic(), unit))
+                self.enqueued += 1
+                queued += 1
+                self._cond.notify_all()
+        return queued
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                entries = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(entries)
+                # Room was made for blocked producers
+                self._cond.notify_all()
+
+            try:
+                self.process_batch([unit for _, unit in entries])
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Processing a batch of {len(entries)} units failed: {e}")
+            finally:
+                done = time.monotonic()
+                with self._cond:
+                    lags = [done - enqueued_at for enqueued_at, _ in entries]
+                    self.last_lag = lags[-1]
+                    self.max_lag = max(self.max_lag, max(lags))
+                    self.processed += len(entries)
+                    self.batches += 1
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def depth(self):
+        """Number of units waiting, not counting the batch being processed"""
+        with self._cond:
+            return len(self._queue)
+
+    def oldest_wait(self):
+        """Seconds the oldest waiting unit has been queued, or 0.0 if none is waiting"""
+        with self._cond:
+            if not self._queue:
+                return 0.0
+            return time.monotonic() - self._queue[0][0]
+
+    def wait_empty(self, timeout=None):
+        """
+        Block until every queued unit has been processed.
+
+        Returns:
+            True if the queue drained before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self):
+        """Stop accepting units; the worker exits after processing what is already queued"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return queue counters for status display"""
+        with self._cond:
+            oldest = time.monotonic() - self._queue[0][0] if self._queue else 0.0
+            return {
+                'depth': len(self._queue),
+                'in_flight': self._in_flight,
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'batches': self.batches,
+                'failures': self.failures,
+                'blocked_puts': self.blocked_puts,
+                'last_lag': self.last_lag,
+                'max_lag': self.max_lag,
+                'oldest_wait': oldest,
+            }
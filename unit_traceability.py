@@ -0,0 +1,271 @@
+#%%
+import logging
+import threading
+from db_pool import get_connection
+from schema_cache import get_schema_cache
+from process_routing import get_process_router, STANDARD_PATTERNS, CASING_COLUMN_PATTERNS
+from date_canonical import get_date_formats, parse_date
+
+logger = logging.getLogger(__name__)
+
+# Materials whose code and lot columns are fetched for every unit, with the
+# column naming patterns used to route them to their process tables
+TRACEABILITY_MATERIALS = {
+    'Frame': STANDARD_PATTERNS,
+    'Em2p': STANDARD_PATTERNS,
+    'Em3p': STANDARD_PATTERNS,
+    'Casing_Block': CASING_COLUMN_PATTERNS,
+    'Rod_Blk': STANDARD_PATTERNS,
+    'Df_Blk': STANDARD_PATTERNS,
+}
+
+# Row selections a material pipeline can ask for:
+#   DATED         rows recorded on the unit's CSV DATE
+#   DATED_OR_ANY  dated rows, or every row of the S/N (newest first) if none match
+#   LATEST_DATE   rows of the most recent DATE recorded for the S/N
+DATED = 'dated'
+DATED_OR_ANY = 'dated_or_any'
+LATEST_DATE = 'latest_date'
+
+# Alias of the computed "row is on the CSV DATE" column
+DATE_MATCH = 'Date_Match'
+
+
+def _quote(column):
+    return f"`{column}`"
+
+
+def _process_num(table):
+    """'process3_data' -> '3'"""
+    return table[len('process'):-len('_data')]
+
+
+class UnitTraceability:
+    """
+    Process table rows of one unit with every active material's code and lot columns,
+    fetched with one query per process table.
+
+    Args:
+        process_sn_list: PROCESS S/N values of the unit
+        csv_date: DATE of the unit in the CSV (None: every row counts as dated)
+        routes: Dict of material name to its ProcessRoutes
+        rows: Dict of table name to fetched rows (dicts), newest first
+    """
+
+    def __init__(self, process_sn_list, csv_date, routes, rows):
+        self.process_sn_list = list(process_sn_list)
+        self.csv_date = csv_date
+        self.routes = routes
+        self.rows = rows
+
+    def tables_for(self, material):
+        """Names of the process tables holding material's columns"""
+        return [route.table for route in self.routes.get(material, [])]
+
+    def select(self, table, mode=DATED, process_sn=None):
+        """
+        Rows of table picked by mode, newest first.
+
+        Args:
+            table: Process table name
+            mode: DATED, DATED_OR_ANY or LATEST_DATE
+            process_sn: Only rows of this PROCESS S/N (default: every S/N of the unit)
+        """
+        rows = self.rows.get(table, [])
+        process_num = _process_num(table)
+        if process_sn is not None:
+            sn_column = f"Process_{process_num}_S_N"
+            rows = [row for row in rows if str(row.get(sn_column)) == str(process_sn)]
+        if mode == LATEST_DATE:
+            date_column = f"Process_{process_num}_DATE"
+            latest = max((row[date_column] for row in rows if row.get(date_column) is not None), default=None)
+            return [row for row in rows if row.get(date_column) == latest]
+        dated = [row for row in rows if row.get(DATE_MATCH, 1)]
+        if dated or mode == DATED:
+            return dated
+        return rows
+
+    def process_results(self, materials, mode=DATED):
+        """
+        Material rows in the layout of the modules' get_process_data_for_materials().
+
+        Returns:
+            Dict of process1_data .. process6_data to lists of
+            {'Process_SN', 'Model_Code', 'DateTime', 'Date', 'Source_Table',
+            'Materials': {material: {'Material_Code', 'Lot_Number'}}}
+        """
+        results = {f"process{process_num}_data": [] for process_num in range(1, 7)}
+        tables = []
+        for material in materials:
+            tables += [table for table in self.tables_for(material) if table not in tables]
+
+        for table in tables:
+            process_num = _process_num(table)
+            routes = [(material, route) for material in materials
+                      for route in self.routes.get(material, []) if route.table == table]
+            processed = []
+            for row in self.select(table, mode):
+                materials_found = {}
+                for material, route in routes:
+                    if row.get(route.material_column):
+                        materials_found[material] = {
+                            'Material_Code': row[route.material_column],
+                            'Lot_Number': row.get(route.lot_column, 'N/A') if route.lot_column else 'N/A'
+                        }
+                if materials_found:
+                    processed.append({
+                        'Process_SN': row.get(f"Process_{process_num}_S_N"),
+                        'Model_Code': row.get(f"Process_{process_num}_Model_Code"),
+                        'DateTime': row.get(f"Process_{process_num}_DateTime"),
+                        'Date': row.get(f"Process_{process_num}_DATE"),
+                        'Source_Table': table,
+                        'Materials': materials_found
+                    })
+            results[table] = processed
+        return results
+
+    def material_entry(self, material, process_sn, mode=DATED, require_lot=False):
+        """
+        Code and lot number of material for one PROCESS S/N, from the newest selected row.
+
+        Args:
+            require_lot: Skip rows whose lot number is empty
+
+        Returns:
+            (material_code, lot_number), or (None, None) if no row matches
+        """
+        for route in self.routes.get(material, []):
+            for row in self.select(route.table, mode, process_sn):
+                lot = row.get(route.lot_column) if route.lot_column else None
+                if require_lot and not lot:
+                    continue
+                return row.get(route.material_column), lot
+        return None, None
+
+    def row_count(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+    def __repr__(self):
+        return (f"UnitTraceability(PROCESS S/N={self.process_sn_list}, DATE={self.csv_date}, "
+                f"tables={sorted(table for table, rows in self.rows.items() if rows)})")
+
+
+def _recheck_dates(table, rows, csv_date, date_formats):
+    """
+    When no row of table matched csv_date in the detected layout, compare the
+    stored dates here and relearn the layout from the rows that hold csv_date.
+    """
+    if not rows or DATE_MATCH not in rows[0] or any(row[DATE_MATCH] for row in rows):
+        return
+    day = parse_date(csv_date)
+    date_column = f"Process_{_process_num(table)}_DATE"
+    matched = [row for row in rows if day is not None and parse_date(row.get(date_column)) == day]
+    for row in matched:
+        row[DATE_MATCH] = 1
+    if matched:
+        date_formats.relearn(table, date_column, [row[date_column] for row in matched])
+
+
+def fetch_unit_traceability(config, process_sn_list, csv_date=None, materials=None, connect=None, router=None,
+                            schema=None, date_formats=None):
+    """
+    Fetch every active material's code and lot columns for a unit, one query per process table.
+
+    Args:
+        config: DB_CONFIG of the process tables' database
+        process_sn_list: PROCESS S/N values of the unit
+        csv_date: DATE of the unit in the CSV
+        materials: Dict of material name to naming patterns (default: TRACEABILITY_MATERIALS)
+        connect: Function returning a connection for config (default: the shared pool)
+        router: ProcessTableRouter (default: the shared one for config)
+        schema: SchemaCache (default: the shared one for config)
+        date_formats: DateFormatCache (default: the shared one for config)
+
+    Returns:
+        UnitTraceability
+    """
+    materials = TRACEABILITY_MATERIALS if materials is None else materials
+    router = router or get_process_router(config)
+    schema = schema or get_schema_cache(config)
+    date_formats = date_formats or get_date_formats(config)
+    routes = {material: router.routes(material, patterns) for material, patterns in materials.items()}
+
+    table_columns = {}
+    for material_routes in routes.values():
+        for route in material_routes:
+            columns = table_columns.setdefault(route.table, [])
+            columns += [column for column in (route.material_column, route.lot_column)
+                        if column and column not in columns]
+
+    rows = {}
+    if not table_columns or not process_sn_list:
+        return UnitTraceability(process_sn_list, csv_date, routes, rows)
+
+    # Schema and date representations may need connections of their own, so
+    # every query is built before this function takes its connection
+    queries = []
+    for table, material_columns in sorted(table_columns.items()):
+        process_num = _process_num(table)
+        sn_column = f"Process_{process_num}_S_N"
+        date_column = f"Process_{process_num}_DATE"
+        base_columns = schema.existing_columns(
+            table, [sn_column, f"Process_{process_num}_Model_Code", f"Process_{process_num}_DateTime",
+                    date_column])
+        select_columns = [_quote(column) for column in base_columns + material_columns]
+        params = []
+        if csv_date and date_column in base_columns:
+            date_sql, date_params = date_formats.condition(table, date_column, csv_date)
+            select_columns.append(f"({date_sql}) AS {DATE_MATCH}")
+            params += date_params
+        order = f" ORDER BY {date_column} DESC" if date_column in base_columns else ""
+        placeholders = ', '.join(['%s'] * len(process_sn_list))
+        queries.append((table, f"SELECT {', '.join(select_columns)} FROM {table} "
+                               f"WHERE {sn_column} IN ({placeholders}){order}", params + list(process_sn_list)))
+
+    connection = (connect or get_connection)(config)
+    try:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            for table, query, params in queries:
+                cursor.execute(query, params)
+                rows[table] = cursor.fetchall()
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+
+    if csv_date:
+        for table, table_rows in rows.items():
+            _recheck_dates(table, table_rows, csv_date, date_formats)
+
+    traceability = UnitTraceability(process_sn_list, csv_date, routes, rows)
+    logger.info(f"Fetched {traceability.row_count()} process rows from {len(rows)} table(s) for {process_sn_list}")
+    return traceability
+
+
+# Lock serialising the first fetch of a unit shared by several modules
+_fetch_lock = threading.Lock()
+
+
+def get_unit_traceability(config, unit_context):
+    """
+    Return the traceability record of unit_context, fetching it on first use.
+
+    The record is kept on the UnitContext, so every material module handling
+    the unit in this cycle reuses the same fetch.
+
+    Returns:
+        UnitTraceability, or None if the process tables could not be queried
+    """
+    key = (config.get('host'), config.get('database'))
+    with _fetch_lock:
+        cached = unit_context.traceability.get(key)
+        if cached is not None:
+            return cached
+        try:
+            traceability = fetch_unit_traceability(config, [unit_context.process_sn], unit_context.date)
+        except Exception as e:
+            logger.error(f"Could not fetch process table rows for {unit_context}: {e}")
+            return None
+        unit_context.traceability[key] = traceability
+        return traceability